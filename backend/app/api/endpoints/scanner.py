@@ -1,12 +1,79 @@
-from fastapi import APIRouter, Depends
+import json
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from app.core.config import settings
 from app.scanners.realtime_scanner import RealtimeScanner
 from app.dependencies import get_scanner
 
 router = APIRouter()
 
+def _require_enabled():
+    """未启用实时扫描（SCANNER_ENABLED 为 False）时不启动后台扫描任务"""
+    if not settings.SCANNER_ENABLED:
+        raise HTTPException(status_code=503, detail="实时扫描未启用")
+
 @router.get("/scan/bollinger")
 async def scan_bollinger_stocks(
+    since_version: Optional[int] = Query(None, ge=0, description="只返回该版本之后的信号变化"),
+    if_none_match: Optional[str] = Header(None),
+    scanner: RealtimeScanner = Depends(get_scanner)
+):
+    """获取当天符合布林带策略的股票
+
+    返回后台扫描任务最近一次的结果，不在请求中扫描。ETag 为信号版本号（从进程启动时间开始计数，重启后不重复），
+    If-None-Match 与当前版本一致时返回 304；传入 since_version 时只返回该版本之后的信号变化，
+    所需版本已不在内存中时返回完整结果（full 为 true）。
+    """
+    _require_enabled()
+    scanner.start()
+    if scanner.latest is None and not await scanner.wait_ready(settings.SCANNER_READY_TIMEOUT):
+        raise HTTPException(status_code=503, detail="实时扫描尚未完成，请稍后重试")
+
+    latest, body = scanner.latest, scanner.latest_body
+    etag = f'W/"{latest["version"]}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if if_none_match is not None and etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+
+    if since_version is not None:
+        changes = scanner.changes_since(since_version)
+        if changes is not None:
+            delta = {
+                "date": latest["date"],
+                "version": latest["version"],
+                "since_version": since_version,
+                "full": False,
+                "changes": changes,
+            }
+            return Response(json.dumps(delta, ensure_ascii=False), media_type="application/json", headers=headers)
+        body = json.dumps({**latest, "full": True}, ensure_ascii=False).encode("utf-8")
+
+    return Response(body, media_type="application/json", headers=headers)
+
+@router.get("/scan/bollinger/events")
+async def stream_bollinger_signals(
     scanner: RealtimeScanner = Depends(get_scanner)
 ):
-    """获取当天符合布林带策略的股票"""
-    return await scanner.scan_today_stocks() 
\ No newline at end of file
+    """以 SSE 推送盘中信号变化，首个事件为当前全部信号"""
+    _require_enabled()
+
+    async def events():
+        async for event in scanner.subscribe():
+            yield f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+@router.websocket("/scan/bollinger/ws")
+async def bollinger_signals_websocket(websocket: WebSocket):
+    """以 WebSocket 推送盘中信号变化，内容同 SSE"""
+    if not settings.SCANNER_ENABLED:
+        await websocket.close(code=1013, reason="scanner disabled")
+        return
+    await websocket.accept()
+    try:
+        async for event in get_scanner().subscribe():
+            await websocket.send_json(event)
+    except WebSocketDisconnect:
+        pass
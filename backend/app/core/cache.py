@@ -0,0 +1,97 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Generic, Optional, TypeVar
+
+from .concurrency import get_io_executor
+
+T = TypeVar('T')
+
+
+class TTLSnapshotCache(Generic[T]):
+    """带过期时间的快照缓存
+
+    - 过期或首次访问时在共享 IO 线程池中调用 loader 加载
+    - 加载期间的并发请求（无论来自哪个事件循环或同步线程）共用同一次加载
+    - 加载失败不缓存，异常抛给本次等待的所有调用方
+    - derive() 基于当前快照计算派生结果，快照刷新后自动失效
+    """
+
+    def __init__(self, loader: Callable[[], T], ttl: float):
+        self.loader = loader
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._value: Optional[T] = None
+        self._loaded_at = 0.0
+        self._version = 0
+        self._inflight: Optional[Future] = None
+        self._derived: Dict[str, Any] = {}
+
+    @property
+    def version(self) -> int:
+        """快照版本号，每次成功加载后加一"""
+        return self._version
+
+    @property
+    def age(self) -> float:
+        """当前快照距加载完成的秒数，没有快照时为无穷大"""
+        return time.monotonic() - self._loaded_at if self._version else float('inf')
+
+    def _is_fresh(self, max_age: Optional[float]) -> bool:
+        ttl = self.ttl if max_age is None else max_age
+        return self._version > 0 and time.monotonic() - self._loaded_at < ttl
+
+    def _on_loaded(self, future: Future):
+        with self._lock:
+            self._inflight = None
+            if future.cancelled() or future.exception() is not None:
+                return
+            self._value = future.result()
+            self._loaded_at = time.monotonic()
+            self._version += 1
+            self._derived = {}
+
+    def _load_future(self, max_age: Optional[float]) -> Optional[Future]:
+        """快照新鲜时返回 None，否则返回（可能已在进行中的）加载任务"""
+        with self._lock:
+            if self._is_fresh(max_age):
+                return None
+            if self._inflight is not None:
+                return self._inflight
+            future = self._inflight = get_io_executor().submit(self.loader)
+        # 回调在释放锁之后注册：加载已经完成时 add_done_callback 会在当前线程立即调用 _on_loaded，
+        # 持锁注册会在同一线程重复获取非重入锁而死锁
+        future.add_done_callback(self._on_loaded)
+        return future
+
+    async def get(self, max_age: Optional[float] = None) -> T:
+        """获取快照，max_age 可以临时收紧本次调用允许的快照年龄（秒）"""
+        future = self._load_future(max_age)
+        if future is not None:
+            return await asyncio.wrap_future(future)
+        return self._value
+
+    def get_sync(self, max_age: Optional[float] = None) -> T:
+        """同步线程中获取快照"""
+        future = self._load_future(max_age)
+        if future is not None:
+            return future.result()
+        return self._value
+
+    def derive(self, key: str, func: Callable[[T], Any], value: T) -> Any:
+        """对快照 value 计算派生结果并按 key 缓存到该快照过期为止"""
+        with self._lock:
+            if value is self._value and key in self._derived:
+                return self._derived[key]
+        result = func(value)
+        with self._lock:
+            if value is self._value:
+                self._derived[key] = result
+        return result
+
+    def invalidate(self):
+        """使当前快照立即过期"""
+        with self._lock:
+            self._loaded_at = 0.0
+            self._derived = {}
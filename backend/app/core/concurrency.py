@@ -0,0 +1,66 @@
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+from typing import Callable, Optional, TypeVar
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+_io_executor: Optional[ThreadPoolExecutor] = None
+_io_executor_guard = threading.Lock()
+
+# 进程内同时在途的数据源请求上限，同步调用方和各个事件循环共用
+_network_slots = threading.BoundedSemaphore(settings.MAX_CONCURRENT_REQUESTS)
+
+
+def get_io_executor() -> ThreadPoolExecutor:
+    """获取共享的 IO 线程池，所有阻塞的 akshare/磁盘调用都放到这里执行"""
+    global _io_executor
+    with _io_executor_guard:
+        if _io_executor is None:
+            _io_executor = ThreadPoolExecutor(
+                max_workers=settings.IO_MAX_WORKERS,
+                thread_name_prefix="io"
+            )
+        return _io_executor
+
+
+@contextmanager
+def network_slot():
+    """占用一个数据源请求名额，超过 MAX_CONCURRENT_REQUESTS 时阻塞等待"""
+    _network_slots.acquire()
+    try:
+        yield
+    finally:
+        _network_slots.release()
+
+
+def call_with_retry(func: Callable[..., T], *args, **kwargs) -> T:
+    """在请求名额内调用数据源接口，失败后按指数退避重试
+
+    退避等待期间会释放请求名额，不占用其他请求的并发额度。
+    """
+    retries = settings.FETCH_MAX_RETRIES
+    for attempt in range(retries + 1):
+        try:
+            with network_slot():
+                return func(*args, **kwargs)
+        except Exception as e:
+            if attempt >= retries:
+                raise
+            delay = settings.FETCH_RETRY_BACKOFF * (2 ** attempt)
+            logger.warning(f"{getattr(func, '__name__', func)} 调用失败，{delay:.1f}s 后第 {attempt + 1} 次重试: {e}")
+            time.sleep(delay)
+
+
+async def run_blocking(func: Callable[..., T], *args, **kwargs) -> T:
+    """在共享线程池中执行阻塞函数，不阻塞事件循环"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_io_executor(), partial(func, *args, **kwargs))
@@ -9,25 +9,68 @@ class Settings(BaseSettings):
     MYSQL_PORT: str = "3306"
     MYSQL_DATABASE: str = "quant_web"
     
+    # 数据库连接池
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: int = 30  # 等待空闲连接的秒数
+    DB_POOL_RECYCLE: int = 1800  # 连接最长复用秒数
+    # 直接指定连接 URL（如测试时使用 sqlite:/// 和 sqlite+aiosqlite:///），默认按上面的 MySQL 配置生成
+    DATABASE_URL_OVERRIDE: Optional[str] = None
+    ASYNC_DATABASE_URL_OVERRIDE: Optional[str] = None
+
     # SQLAlchemy URL
     @property
     def DATABASE_URL(self) -> str:
-        return f"mysql://{self.MYSQL_USER}:{self.MYSQL_PASSWORD}@{self.MYSQL_HOST}:{self.MYSQL_PORT}/{self.MYSQL_DATABASE}"
+        return self.DATABASE_URL_OVERRIDE or f"mysql+pymysql://{self.MYSQL_USER}:{self.MYSQL_PASSWORD}@{self.MYSQL_HOST}:{self.MYSQL_PORT}/{self.MYSQL_DATABASE}"
+
+    @property
+    def ASYNC_DATABASE_URL(self) -> str:
+        return self.ASYNC_DATABASE_URL_OVERRIDE or f"mysql+aiomysql://{self.MYSQL_USER}:{self.MYSQL_PASSWORD}@{self.MYSQL_HOST}:{self.MYSQL_PORT}/{self.MYSQL_DATABASE}"
     
     # 股票数据相关配置
     DATA_CACHE_EXPIRE: int = 1800  # 30分钟
-    MAX_CONCURRENT_REQUESTS: int = 5
+    FINANCIAL_RECHECK_TTL: int = 21600  # 缓存的财务数据缺少应有的最新报告期时，至少间隔多少秒重新下载
+    MAX_CONCURRENT_REQUESTS: int = 5  # 同时在途的数据源请求上限
+    IO_MAX_WORKERS: int = 32  # 共享 IO 线程池大小
+    FETCH_MAX_RETRIES: int = 3  # 数据源请求失败后的重试次数
+    FETCH_RETRY_BACKOFF: float = 0.5  # 重试退避基数（秒），每次翻倍
+    DAILY_BAR_DIR: str = "data/daily_bars"  # 本地日线仓库目录
+    MARKET_CLOSE_TIME: str = "15:30"  # 收盘后该时间之后当天K线才写入本地仓库
+    MARKET_OPEN_TIME: str = "09:15"  # 盘中实时扫描的开始时间（含集合竞价）
+    SCANNER_ENABLED: bool = True  # 随 API 服务启动盘中实时扫描
+    SCANNER_POLL_INTERVAL: float = 30.0  # 盘中实时扫描间隔（秒）
+    SCANNER_HISTORY_VERSIONS: int = 500  # 保留多少个版本的信号变化用于增量查询
+    SCANNER_READY_TIMEOUT: float = 60.0  # 首次扫描未完成时请求最多等待的秒数
     
     COMMISSION_RATE: float = 0.0003  # 手续费率
     MIN_COMMISSION: float = 5.0  # 最低手续费
 
     # 回测相关配置
     DEFAULT_INITIAL_CAPITAL: float = 1000000.0
+    SWEEP_DIR: str = "data/sweeps"  # 参数扫描进度与结果目录
+    SWEEP_MAX_WORKERS: int = 0  # 参数扫描进程数，0 表示使用全部 CPU 核心
+    BACKTEST_JOB_WORKERS: int = 2  # 同时运行的回测任务数
+    BACKTEST_RESULT_DIR: str = "data/backtests"  # 回测任务结果缓存目录
+    BACKTEST_JOB_RETENTION: int = 86400  # 已结束的回测任务在内存中保留的秒数
+    BACKTEST_OPEN_RESULT_TTL: int = 600  # 结束日期为今天或之后的回测结果（数据仍会更新）的复用秒数，不写入结果缓存
+    BACKTEST_PERSIST_PERFORMANCE: bool = True  # 回测任务完成后把每日净值和成交写入策略绩效表
     
     # 选股配置
     INCLUDE_CYB: bool = False
     INCLUDE_KCB: bool = False
     TOP_N_STOCKS: int = 10
+    LIVE_STRATEGY_NAME: str = "boll_screener"  # 实盘选股模拟账户在策略表中的名称
+    LIVE_POSITION_SIZE: float = 100000.0  # 模拟账户每个买入信号的买入金额
+
+    # 定时任务配置
+    SCHEDULER_ENABLED: bool = True  # 随 API 服务启动进程内定时任务
+    SCHEDULER_TIMEZONE: str = "Asia/Shanghai"
+    SCHEDULER_WORKERS: int = 2  # 定时任务工作线程数
+    SCHEDULER_MISFIRE_GRACE: int = 600  # 错过触发时间（秒）内仍补跑
+    WARMUP_TIME: str = "08:45"  # 开盘前预热日线仓库和行情快照
+    SCREENER_TIME: str = "15:45"  # 收盘后运行选股，需晚于 MARKET_CLOSE_TIME
+    CALENDAR_UPDATE_TIME: str = "20:00"  # 每周日更新交易日历
+    PERFORMANCE_REFRESH_TIME: str = "16:30"  # 收盘后刷新策略绩效表的滚动指标
     
     class Config:
         env_file = ".env"
@@ -0,0 +1,178 @@
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from apscheduler.executors.pool import ThreadPoolExecutor
+from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.triggers.cron import CronTrigger
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class JobStats:
+    """一个定时任务的运行统计"""
+
+    def __init__(self):
+        self.runs = 0
+        self.failures = 0
+        self.skipped = 0  # 上一次仍在运行或非交易日而跳过的次数
+        self.running = False
+        self.last_status: Optional[str] = None  # success / failed / skipped
+        self.last_started_at: Optional[str] = None
+        self.last_finished_at: Optional[str] = None
+        self.last_duration: Optional[float] = None
+        self.total_duration = 0.0
+        self.max_duration = 0.0
+        self.last_error: Optional[str] = None
+
+    def to_dict(self) -> Dict:
+        return {
+            'runs': self.runs,
+            'failures': self.failures,
+            'skipped': self.skipped,
+            'running': self.running,
+            'last_status': self.last_status,
+            'last_started_at': self.last_started_at,
+            'last_finished_at': self.last_finished_at,
+            'last_duration': round(self.last_duration, 3) if self.last_duration is not None else None,
+            'avg_duration': round(self.total_duration / self.runs, 3) if self.runs else None,
+            'max_duration': round(self.max_duration, 3),
+            'last_error': self.last_error,
+        }
+
+
+class ScheduledJob:
+    def __init__(self, name: str, func: Callable[[], None], trigger: CronTrigger, trading_days_only: bool, description: str):
+        self.name = name
+        self.func = func
+        self.trigger = trigger
+        self.trading_days_only = trading_days_only
+        self.description = description
+        self.lock = threading.Lock()
+        self.stats = JobStats()
+
+
+class TaskScheduler:
+    """进程内定时任务调度
+
+    基于 APScheduler 的 BackgroundScheduler，任务在 SCHEDULER_WORKERS 个工作线程中执行，不占用 API 的事件循环。
+    每个任务持有一把非阻塞锁：上一次还没跑完时（无论是定时触发还是手动触发）本次直接跳过；
+    trading_days_only 的任务在非交易日跳过。每个任务的运行次数、失败次数和耗时记录在 JobStats 中。
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, timezone: Optional[str] = None):
+        self.timezone = timezone or settings.SCHEDULER_TIMEZONE
+        max_workers = max_workers or settings.SCHEDULER_WORKERS
+        self._scheduler = BackgroundScheduler(
+            executors={'default': ThreadPoolExecutor(max_workers)},
+            # 重叠运行由任务锁判断并计入 skipped，APScheduler 自身不再限制实例数
+            job_defaults={'coalesce': True, 'max_instances': max_workers, 'misfire_grace_time': settings.SCHEDULER_MISFIRE_GRACE},
+            timezone=self.timezone
+        )
+        self._jobs: Dict[str, ScheduledJob] = {}
+
+    @property
+    def running(self) -> bool:
+        return self._scheduler.running
+
+    def add_job(
+        self,
+        name: str,
+        func: Callable[[], None],
+        at: str,
+        trading_days_only: bool = True,
+        description: str = '',
+        day_of_week: str = 'mon-fri'
+    ):
+        """注册每天 at（HH:MM）运行的任务"""
+        hour, minute = at.split(':')
+        trigger = CronTrigger(day_of_week=day_of_week, hour=int(hour), minute=int(minute), timezone=self.timezone)
+        job = ScheduledJob(name, func, trigger, trading_days_only, description)
+        self._jobs[name] = job
+        self._scheduler.add_job(self._run, trigger, args=[name], id=name, name=name, replace_existing=True)
+
+    def _run(self, name: str, force: bool = False):
+        job = self._jobs[name]
+        stats = job.stats
+        if job.trading_days_only and not force:
+            # 延迟导入，交易日历首次使用时才从数据库加载
+            from ..utils.trading_calendar import is_trading_day
+            if not is_trading_day(datetime.now()):
+                logger.info(f"定时任务 {name}：今天不是交易日，跳过")
+                stats.skipped += 1
+                stats.last_status = 'skipped'
+                return
+        if not job.lock.acquire(blocking=False):
+            logger.warning(f"定时任务 {name} 上一次仍在运行，本次跳过")
+            stats.skipped += 1
+            stats.last_status = 'skipped'
+            return
+
+        stats.running = True
+        stats.last_started_at = datetime.now().isoformat()
+        start = time.perf_counter()
+        try:
+            job.func()
+            stats.last_status = 'success'
+            stats.last_error = None
+            logger.info(f"定时任务 {name} 完成，耗时 {time.perf_counter() - start:.1f}s")
+        except Exception as e:
+            stats.failures += 1
+            stats.last_status = 'failed'
+            stats.last_error = str(e)
+            logger.exception(f"定时任务 {name} 失败: {e}")
+        finally:
+            duration = time.perf_counter() - start
+            stats.runs += 1
+            stats.last_duration = duration
+            stats.total_duration += duration
+            stats.max_duration = max(stats.max_duration, duration)
+            stats.last_finished_at = datetime.now().isoformat()
+            stats.running = False
+            job.lock.release()
+
+    def run_now(self, name: str):
+        """立即在工作线程中运行一次任务（忽略交易日限制），不影响原有的定时计划"""
+        if name not in self._jobs:
+            raise KeyError(name)
+        self._scheduler.add_job(self._run, args=[name, True], id=f"{name}:manual", name=name, replace_existing=True)
+
+    def jobs(self) -> List[Dict]:
+        """全部任务的计划和运行统计"""
+        result = []
+        for name, job in self._jobs.items():
+            scheduled = self._scheduler.get_job(name)
+            next_run = getattr(scheduled, 'next_run_time', None) if scheduled else None
+            result.append({
+                'name': name,
+                'description': job.description,
+                'trigger': str(job.trigger),
+                'trading_days_only': job.trading_days_only,
+                'next_run_time': next_run.isoformat() if next_run else None,
+                **job.stats.to_dict(),
+            })
+        return result
+
+    def start(self):
+        if not self._scheduler.running:
+            self._scheduler.start()
+            logger.info(f"定时任务调度已启动：{', '.join(self._jobs)}")
+
+    def shutdown(self, wait: bool = False):
+        if self._scheduler.running:
+            self._scheduler.shutdown(wait=wait)
+
+
+_scheduler: Optional[TaskScheduler] = None
+
+
+def get_scheduler() -> TaskScheduler:
+    """进程内共享的任务调度器"""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = TaskScheduler()
+    return _scheduler
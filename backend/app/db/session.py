@@ -1,7 +1,65 @@
+from typing import Dict, Optional
+
 from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import sessionmaker
 
 from app.core.config import settings
 
-engine = create_engine(settings.DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine) 
\ No newline at end of file
+
+def _engine_options(url: str) -> Dict:
+    """连接池参数；SQLite（测试用）使用 SQLAlchemy 默认的连接池"""
+    if url.startswith('sqlite'):
+        return {}
+    return {
+        'pool_size': settings.DB_POOL_SIZE,
+        'max_overflow': settings.DB_MAX_OVERFLOW,
+        'pool_timeout': settings.DB_POOL_TIMEOUT,
+        'pool_recycle': settings.DB_POOL_RECYCLE,  # 早于 MySQL wait_timeout 回收空闲连接
+        'pool_pre_ping': True,
+    }
+
+
+def create_db_engine(url: Optional[str] = None) -> Engine:
+    """同步引擎（定时任务、脚本和线程池中的代码使用）"""
+    url = url or settings.DATABASE_URL
+    return create_engine(url, echo=False, **_engine_options(url))
+
+
+def create_async_db_engine(url: Optional[str] = None):
+    """异步引擎（API 请求使用），驱动为 aiomysql，测试时可用 sqlite+aiosqlite"""
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    url = url or settings.ASYNC_DATABASE_URL
+    return create_async_engine(url, echo=False, **_engine_options(url))
+
+
+# 进程内唯一的同步引擎
+engine = create_db_engine()
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# 异步引擎在第一次使用时创建，未安装异步驱动的脚本和任务不受影响
+_async_engine = None
+_async_sessionmaker = None
+
+
+def get_async_engine():
+    global _async_engine
+    if _async_engine is None:
+        _async_engine = create_async_db_engine()
+    return _async_engine
+
+
+def get_async_sessionmaker():
+    global _async_sessionmaker
+    if _async_sessionmaker is None:
+        from sqlalchemy.ext.asyncio import async_sessionmaker
+        _async_sessionmaker = async_sessionmaker(get_async_engine(), autoflush=False, expire_on_commit=False)
+    return _async_sessionmaker
+
+
+async def dispose_engines():
+    """关闭连接池（服务退出时调用）"""
+    if _async_engine is not None:
+        await _async_engine.dispose()
+    engine.dispose()
@@ -1,4 +1,12 @@
+from typing import Optional
+
 from app.scanners.realtime_scanner import RealtimeScanner
 
-def get_scanner():
-    return RealtimeScanner() 
\ No newline at end of file
+_scanner: Optional[RealtimeScanner] = None
+
+def get_scanner() -> RealtimeScanner:
+    """进程内共享的实时扫描器，所有请求和订阅者共用同一份布林带状态"""
+    global _scanner
+    if _scanner is None:
+        _scanner = RealtimeScanner()
+    return _scanner
@@ -1,16 +1,54 @@
+import asyncio
+import json
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
-from typing import Optional
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from typing import Any, Dict, List, Optional
 from pydantic import BaseModel
 from datetime import datetime, timedelta
-from .strategies.bollinger_bands import BollingerBandsStrategy
-from .services.backtest import BacktestService
+from .services.backtest_jobs import get_job_queue
+from .services.sweep import ParameterSweep
+from .services.portfolio_backtest import PortfolioBacktestService
+from .strategies.registry import create_strategy
+from .core.config import settings
+from .core.concurrency import run_blocking
+from .core.scheduler import get_scheduler
+from .db.session import dispose_engines
+from .tasks.daily_jobs import register_daily_jobs
+from .api.endpoints import scanner
+from .dependencies import get_scanner
+from .routes.strategy import strategy_router
+from .utils.trading_calendar import get_trading_calendar
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 定时任务在独立的工作线程中运行，不占用 API 的事件循环
+    scheduler = get_scheduler()
+    if settings.SCHEDULER_ENABLED:
+        register_daily_jobs(scheduler)
+        scheduler.start()
+    # 交易日历在线程池中从数据库加载，之后的交易日判断都是内存查找
+    await run_blocking(get_trading_calendar)
+    # 盘中实时扫描由唯一的后台任务执行，接口只读取共享的最新结果
+    if settings.SCANNER_ENABLED:
+        get_scanner().start()
+    yield
+    await get_scanner().stop()
+    scheduler.shutdown()
+    get_job_queue().shutdown()
+    await dispose_engines()
 
 app = FastAPI(
     title="量化交易策略平台",
     description="基于 FastAPI 的量化交易策略回测系统",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
+app.include_router(scanner.router, prefix="/api")
+app.include_router(strategy_router, prefix="/strategy")
+
 # 首页路由
 @app.get("/")
 async def root():
@@ -40,31 +78,202 @@ class BacktestRequest(BaseModel):
     volume_factor: Optional[float] = 2.0
     initial_capital: Optional[float] = 1000000.0
 
-# 布林带策略回测接口
+# 布林带策略回测接口：提交为后台任务，立即返回任务 ID；相同的请求直接返回已有任务或缓存结果
 @app.post("/api/backtest/bollinger")
 async def run_bollinger_backtest(request: BacktestRequest):
     try:
-        strategy = BollingerBandsStrategy(
-            window=request.window,
-            std_dev=request.std_dev,
-            volume_factor=request.volume_factor
+        job = get_job_queue().submit(
+            "bollinger",
+            {
+                "window": request.window,
+                "std_dev": request.std_dev,
+                "volume_factor": request.volume_factor
+            },
+            start_date=request.start_date,
+            end_date=request.end_date,
+            initial_capital=request.initial_capital
         )
-        
-        backtest = BacktestService(initial_capital=request.initial_capital)
-        
-        results = await backtest.run_backtest(
-            strategy=strategy,
+
+        return {
+            "status": "success",
+            "data": job.to_dict()
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# 通用回测任务请求模型
+class BacktestJobRequest(BaseModel):
+    strategy: str
+    params: Dict[str, Any] = {}
+    start_date: str
+    end_date: str
+    initial_capital: Optional[float] = 1000000.0
+
+# 提交回测任务
+@app.post("/api/backtest/jobs")
+async def submit_backtest_job(request: BacktestJobRequest):
+    try:
+        job = get_job_queue().submit(
+            request.strategy,
+            request.params,
             start_date=request.start_date,
-            end_date=request.end_date
+            end_date=request.end_date,
+            initial_capital=request.initial_capital
         )
-        
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return {
+        "status": "success",
+        "data": job.to_dict()
+    }
+
+# 查询回测任务进度和结果
+@app.get("/api/backtest/jobs/{job_id}")
+async def get_backtest_job(job_id: str):
+    job = get_job_queue().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="回测任务不存在")
+
+    return {
+        "status": "success",
+        "data": job.to_dict()
+    }
+
+# 以 SSE 推送回测任务进度，任务结束时推送结果并关闭连接
+@app.get("/api/backtest/jobs/{job_id}/events")
+async def stream_backtest_job(job_id: str):
+    if get_job_queue().get(job_id) is None:
+        raise HTTPException(status_code=404, detail="回测任务不存在")
+
+    async def events():
+        async for state in get_job_queue().stream(job_id):
+            yield f"data: {json.dumps(state, default=str, ensure_ascii=False)}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+# 组合回测中的单个策略
+class PortfolioStrategyItem(BaseModel):
+    strategy: str
+    params: Dict[str, Any] = {}
+    allocation: float
+
+# 组合回测请求模型
+class PortfolioBacktestRequest(BaseModel):
+    start_date: str
+    end_date: str
+    strategies: List[PortfolioStrategyItem]
+    initial_capital: Optional[float] = 1000000.0
+
+# 多策略组合回测接口：所有策略共用一次数据加载
+# 回测是 CPU 密集计算，在独立线程的事件循环中运行（与回测任务队列相同），不阻塞服务的事件循环；
+# 不使用共享 IO 线程池，因为回测内部的数据加载本身就在其中排队
+@app.post("/api/backtest/portfolio")
+async def run_portfolio_backtest(request: PortfolioBacktestRequest):
+    try:
+        allocations = [
+            (create_strategy(item.strategy, item.params), item.allocation)
+            for item in request.strategies
+        ]
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        backtest = PortfolioBacktestService(initial_capital=request.initial_capital)
+        results = await run_in_threadpool(lambda: asyncio.run(backtest.run_backtest(
+            allocations,
+            start_date=request.start_date,
+            end_date=request.end_date
+        )))
+
         return {
             "status": "success",
             "data": results
         }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# 参数扫描请求模型
+class SweepRequest(BaseModel):
+    strategy: str = "bollinger"
+    start_date: str
+    end_date: str
+    param_grid: Dict[str, List[Any]]
+    initial_capital: Optional[float] = 1000000.0
+    rank_by: Optional[str] = "sharpe_ratio"
+
+# 进行中和已完成的参数扫描，按 sweep_id 索引
+sweeps: Dict[str, ParameterSweep] = {}
+sweep_tasks: Dict[str, asyncio.Task] = {}
+
+# 参数扫描接口：后台运行，立即返回 sweep_id；相同请求重复提交时从检查点继续
+@app.post("/api/backtest/sweep")
+async def start_parameter_sweep(request: SweepRequest):
+    try:
+        sweep = ParameterSweep(
+            strategy_name=request.strategy,
+            param_grid=request.param_grid,
+            start_date=request.start_date,
+            end_date=request.end_date,
+            initial_capital=request.initial_capital,
+            rank_by=request.rank_by
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    task = sweep_tasks.get(sweep.sweep_id)
+    if task is None or task.done():
+        sweeps[sweep.sweep_id] = sweep
+        task = asyncio.create_task(sweep.run())
+        # 任务异常结束时记录为失败并写日志
+        task.add_done_callback(sweep.on_task_done)
+        sweep_tasks[sweep.sweep_id] = task
+
+    return {
+        "status": "success",
+        "data": sweeps[sweep.sweep_id].progress()
+    }
+
+# 参数扫描进度和当前已完成组合的排名
+@app.get("/api/backtest/sweep/{sweep_id}")
+async def get_parameter_sweep(sweep_id: str):
+    sweep = sweeps.get(sweep_id)
+    if sweep is None:
+        raise HTTPException(status_code=404, detail="参数扫描不存在")
+
+    return {
+        "status": "success",
+        "data": {
+            **sweep.progress(),
+            "results": sweep.ranking()
+        }
+    }
+
+# 定时任务的计划、运行次数、失败次数和耗时
+@app.get("/api/scheduler/jobs")
+async def get_scheduled_jobs():
+    return {
+        "status": "success",
+        "data": {
+            "running": get_scheduler().running,
+            "jobs": get_scheduler().jobs()
+        }
+    }
+
+# 立即运行一次定时任务（在调度器的工作线程中执行，接口立即返回）
+@app.post("/api/scheduler/jobs/{name}/run")
+async def run_scheduled_job(name: str):
+    scheduler = get_scheduler()
+    if not scheduler.running:
+        raise HTTPException(status_code=409, detail="定时任务调度未启动")
+    try:
+        scheduler.run_now(name)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="定时任务不存在")
+    return {"status": "success", "data": {"name": name}}
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -1,6 +1,6 @@
 from .strategy import Strategy, Transaction, Performance
-from .database import Base, engine, get_db
+from .database import Base, engine, get_db, get_async_db
 from .holiday import TradingHoliday
-from .stock import BollSignal
+from .stock import BollSignal, BollReplayCheckpoint
 
-__all__ = ['Strategy', 'Transaction', 'Performance', 'Base', 'engine', 'get_db', 'TradingHoliday', 'BollSignal']
+__all__ = ['Strategy', 'Transaction', 'Performance', 'Base', 'engine', 'get_db', 'get_async_db', 'TradingHoliday', 'BollSignal', 'BollReplayCheckpoint']
@@ -1,23 +1,7 @@
-from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from ..core.config import settings
+from ..db.session import SessionLocal, engine, get_async_sessionmaker
 
-# 使用 PyMySQL 作为数据库驱动
-SQLALCHEMY_DATABASE_URL = f"mysql+pymysql://{settings.MYSQL_USER}:{settings.MYSQL_PASSWORD}@{settings.MYSQL_HOST}:{settings.MYSQL_PORT}/{settings.MYSQL_DATABASE}"
-
-# 创建数据库引擎
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL,
-    pool_size=5,
-    max_overflow=10,
-    pool_timeout=30,
-    pool_recycle=1800,
-    echo=False
-)
-
-# 创建会话工厂
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# 引擎和会话工厂统一由 app.db.session 创建，这里只保留模型基类和 FastAPI 依赖
 
 # 声明基类
 Base = declarative_base()
@@ -27,9 +11,14 @@ def init_db():
     Base.metadata.create_all(bind=engine)
 
 def get_db():
-    """获取数据库会话"""
+    """获取数据库会话（同步，供线程池中执行的代码使用）"""
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    """获取异步数据库会话，每个请求独立一个会话，查询不阻塞事件循环"""
+    async with get_async_sessionmaker()() as db:
+        yield db
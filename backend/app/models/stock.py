@@ -1,6 +1,6 @@
 from datetime import datetime
 from .database import Base
-from sqlalchemy import Column, Integer, String, Float, DateTime, Index
+from sqlalchemy import Column, Integer, String, Float, DateTime, Index, Boolean, JSON
 
 class BollSignal(Base):
     __tablename__ = 'boll_signals'
@@ -29,4 +29,19 @@ class BollSignal(Base):
     __table_args__ = (
         Index('idx_stock_code_date', 'stock_code', 'created_at'),
         Index('idx_trade_dates', 'buy_date', 'sell_date'),
-    ) 
\ No newline at end of file
+        # 历史信号按 (buy_date, id) 键集分页和按买入日期筛选
+        Index('idx_buy_date_id', 'buy_date', 'id'),
+        # 按交易状态的聚合统计和持仓查询，覆盖统计用到的全部列
+        Index('idx_status_stats', 'trade_status', 'score', 'profit_rate', 'holding_period'),
+    ) 
+
+
+class BollReplayCheckpoint(Base):
+    """历史信号回放的断点，与同一批信号在一个事务中提交"""
+    __tablename__ = 'boll_replay_checkpoints'
+
+    key = Column(String(16), primary_key=True)     # 回放参数的哈希
+    params = Column(JSON)
+    last_date = Column(DateTime)                   # 已提交的最后一个信号日期
+    completed = Column(Boolean, default=False)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, JSON, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, JSON, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .database import Base
@@ -32,6 +32,10 @@ class Transaction(Base):
     
     strategy = relationship("Strategy", back_populates="transactions")
 
+    __table_args__ = (
+        Index('idx_transaction_strategy_date', 'strategy_id', 'trade_date'),
+    )
+
 class Performance(Base):
     __tablename__ = "performances"
 
@@ -48,3 +52,8 @@ class Performance(Base):
     created_at = Column(DateTime, default=datetime.now)
     
     strategy = relationship("Strategy", back_populates="performances")
+
+    # 每个策略每天一行；按日期区间读取和查找最后一行都走这个索引
+    __table_args__ = (
+        Index('idx_performance_strategy_date', 'strategy_id', 'date', unique=True),
+    )
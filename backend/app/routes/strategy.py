@@ -1,57 +1,186 @@
-from fastapi import APIRouter, Request
+import os
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+from fastapi import APIRouter, Depends, HTTPException, Request
 from fastapi.templating import Jinja2Templates
-from app.models import BollSignal
-from app.db import session
-from sqlalchemy import func
-import pandas as pd
+from sqlalchemy import and_, case, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models import BollSignal, Performance, Strategy, get_async_db
+from app.services.signal_store import HOLDING, SOLD
 
-templates = Jinja2Templates(directory="templates")
+templates = Jinja2Templates(directory=os.path.join(os.path.dirname(os.path.dirname(__file__)), "templates"))
 strategy_router = APIRouter()
 
+PAGE_SIZE = 100
+
+# 每个请求使用独立的异步会话，数据库查询不阻塞事件循环
+
+
+def encode_cursor(buy_date: datetime, signal_id: int) -> str:
+    return f"{buy_date.strftime('%Y%m%d%H%M%S%f')}-{signal_id}"
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        buy_date, signal_id = cursor.split('-')
+        return datetime.strptime(buy_date, '%Y%m%d%H%M%S%f'), int(signal_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="无效的分页游标")
+
+
 @strategy_router.get('/bollinger')
-async def bollinger_stocks(request: Request):
-    # 获取最新日期的布林带信号
-    latest_date = session.query(func.max(BollSignal.date)).scalar()
-    stocks = session.query(BollSignal)\
-        .filter_by(date=latest_date)\
-        .order_by(BollSignal.score.desc())\
-        .all()
+async def bollinger_stocks(request: Request, db: AsyncSession = Depends(get_async_db)):
+    # 最近一个信号日的买入信号，按得分排序（buy_date 走 idx_trade_dates）
+    latest = (await db.execute(select(func.max(BollSignal.buy_date)))).scalar()
+    stocks = []
+    if latest is not None:
+        day = latest.replace(hour=0, minute=0, second=0, microsecond=0)
+        stocks = (await db.execute(
+            select(BollSignal)
+            .where(BollSignal.buy_date >= day, BollSignal.buy_date < day + timedelta(days=1))
+            .order_by(BollSignal.score.desc())
+        )).scalars().all()
     return templates.TemplateResponse(
+        request,
         "strategy/bollinger_stocks.html",
-        {"request": request, "stocks": stocks}
+        {"stocks": stocks, "signal_date": latest}
     )
 
+
 @strategy_router.get('/history')
-async def trade_history(request: Request):
-    # 获取历史信号数据
-    signals = session.query(BollSignal)\
-        .order_by(BollSignal.date.desc(), BollSignal.score.desc())\
-        .limit(100)\
-        .all()
+async def trade_history(
+    request: Request,
+    cursor: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    # 按信号的买入日期筛选（回放写入的历史信号 created_at 是回放时间，不能用来筛选），
+    # 按 (buy_date, id) 倒序的键集分页：每页从上一页最后一条之后继续，
+    # 沿 idx_buy_date_id 索引扫描 PAGE_SIZE + 1 行，翻到多深都不需要 OFFSET
+    query = select(BollSignal)
+    if start_date:
+        query = query.where(BollSignal.buy_date >= datetime.strptime(start_date, '%Y-%m-%d'))
+    if end_date:
+        query = query.where(BollSignal.buy_date < datetime.strptime(end_date, '%Y-%m-%d') + timedelta(days=1))
+    if cursor:
+        buy_date, signal_id = decode_cursor(cursor)
+        query = query.where(or_(
+            BollSignal.buy_date < buy_date,
+            and_(BollSignal.buy_date == buy_date, BollSignal.id < signal_id)
+        ))
+    rows = (await db.execute(
+        query.order_by(BollSignal.buy_date.desc(), BollSignal.id.desc()).limit(PAGE_SIZE + 1)
+    )).scalars().all()
+
+    signals = rows[:PAGE_SIZE]
+    next_cursor = encode_cursor(signals[-1].buy_date, signals[-1].id) if len(rows) > PAGE_SIZE else None
     return templates.TemplateResponse(
+        request,
         "strategy/trade_history.html",
-        {"request": request, "signals": signals}
+        {
+            "signals": signals,
+            "next_cursor": next_cursor,
+            "start_date": start_date or '',
+            "end_date": end_date or '',
+        }
     )
 
+
 @strategy_router.get('/performance')
-async def strategy_performance(request: Request):
-    # 获取策略绩效统计
-    signals_df = pd.read_sql(
-        session.query(BollSignal).order_by(BollSignal.date).statement,
-        session.bind
-    )
-    
-    performance = calculate_performance(signals_df)
+async def strategy_performance(request: Request, db: AsyncSession = Depends(get_async_db)):
+    performance = await calculate_performance(db)
+    strategy_id = await get_strategy_id(db, settings.LIVE_STRATEGY_NAME)
+    equity = await latest_metrics(db, strategy_id) if strategy_id is not None else None
     return templates.TemplateResponse(
+        request,
         "strategy/performance.html",
-        {"request": request, "performance": performance}
+        {"performance": performance, "equity": equity}
     )
 
-def calculate_performance(df):
-    # 简单的绩效计算示例
+
+@strategy_router.get('/performance/{strategy_name}/daily')
+async def strategy_daily_performance(
+    strategy_name: str,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """策略的每日净值和预计算的滚动指标（沿 idx_performance_strategy_date 按日期区间读取）"""
+    strategy_id = await get_strategy_id(db, strategy_name)
+    if strategy_id is None:
+        raise HTTPException(status_code=404, detail="策略不存在")
+
+    query = select(
+        Performance.date, Performance.total_value, Performance.cash_balance, Performance.daily_return,
+        Performance.cumulative_return, Performance.drawdown, Performance.position_count
+    ).where(Performance.strategy_id == strategy_id)
+    if start_date:
+        query = query.where(Performance.date >= datetime.strptime(start_date, '%Y-%m-%d'))
+    if end_date:
+        query = query.where(Performance.date <= datetime.strptime(end_date, '%Y-%m-%d'))
+    rows = (await db.execute(query.order_by(Performance.date))).all()
+    return {
+        "status": "success",
+        "data": {
+            "strategy": strategy_name,
+            "metrics": await latest_metrics(db, strategy_id),
+            "daily": [row._asdict() for row in rows],
+        }
+    }
+
+
+async def get_strategy_id(db: AsyncSession, name: str) -> Optional[int]:
+    return (await db.execute(select(Strategy.id).where(Strategy.name == name))).scalar()
+
+
+async def latest_metrics(db: AsyncSession, strategy_id: int) -> Optional[dict]:
+    """最近一次刷新写入的指标（不含用于增量刷新的内部状态）"""
+    row = (await db.execute(
+        select(Performance.date, Performance.total_value, Performance.drawdown, Performance.metrics)
+        .where(Performance.strategy_id == strategy_id, Performance.metrics.isnot(None))
+        .order_by(Performance.date.desc())
+        .limit(1)
+    )).first()
+    if row is None:
+        return None
+    metrics = {key: value for key, value in row.metrics.items() if key != 'state'}
+    return {'date': row.date, 'total_value': row.total_value, 'drawdown': row.drawdown, **metrics}
+
+
+async def calculate_performance(db: AsyncSession) -> dict:
+    """在数据库中按交易状态聚合信号统计
+
+    查询只用到 trade_status/score/profit_rate/holding_period，全部包含在 idx_status_stats 中，
+    由覆盖索引完成，不回表、也不把整张表读进内存。
+    """
+    rows = (await db.execute(
+        select(
+            BollSignal.trade_status,
+            func.count(),
+            func.sum(BollSignal.score),
+            func.count(BollSignal.score),
+            func.avg(BollSignal.profit_rate),
+            func.sum(case((BollSignal.profit_rate > 0, 1), else_=0)),
+            func.avg(BollSignal.holding_period),
+        ).group_by(BollSignal.trade_status)
+    )).all()
+
+    by_status = {status: row for status, *row in rows}
+    total = sum(row[0] for row in by_status.values())
+    score_sum = sum(row[1] or 0 for row in by_status.values())
+    score_count = sum(row[2] for row in by_status.values())
+    sold = by_status.get(SOLD)
+    sold_count = sold[0] if sold else 0
     return {
-        'total_signals': len(df),
-        'buy_signals': len(df[df['signal'] == 'buy']),
-        'sell_signals': len(df[df['signal'] == 'sell']),
-        'avg_score': df['score'].mean() if 'score' in df.columns else 0
-    } 
\ No newline at end of file
+        'total_signals': total,
+        'holding_signals': by_status[HOLDING][0] if HOLDING in by_status else 0,
+        'sold_signals': sold_count,
+        'avg_score': float(score_sum) / score_count if score_count else 0,
+        'avg_profit_rate': float(sold[3] or 0) if sold else 0,
+        'win_rate': float(sold[4] or 0) / sold_count * 100 if sold_count else 0,
+        'avg_holding_period': float(sold[5] or 0) if sold else 0,
+    }
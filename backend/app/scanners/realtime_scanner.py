@@ -1,48 +1,214 @@
-from typing import List, Dict
-import pandas as pd
-import akshare as ak
+import asyncio
+import json
+import logging
+import time
+from collections import deque
 from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set
+
+import pandas as pd
+
+from app.core.config import settings
+from app.services.stock_data import StockDataService
 from app.strategies.bollinger_bands import BollingerBandsStrategy
+from app.strategies.indicators import IncrementalBollinger
+from app.utils.trading_calendar import get_trading_calendar
+
+logger = logging.getLogger(__name__)
+
 
 class RealtimeScanner:
-    def __init__(self):
-        self.strategy = BollingerBandsStrategy()
+    """盘中布林带实时扫描
 
-    async def scan_today_stocks(self) -> Dict[str, List[str]]:
-        """
-        扫描今天符合布林带策略的股票
-        返回买入和卖出信号列表
+    每个交易日第一次扫描时，用本地日线仓库中截至上一交易日的历史K线初始化全部股票的布林带状态（IncrementalBollinger）；
+    之后每次扫描只获取一次全市场实时行情快照，把最新价/成交量作为当天K线一次向量运算得到全部股票的布林带和信号。
+    与上一次扫描相比信号发生变化的股票推送给订阅者（SSE / WebSocket）。
+
+    扫描只由一个后台任务（start 启动）按 poll_interval 执行，请求方读取共享的最新结果：
+    信号每变化一次版本号加一，最近 SCANNER_HISTORY_VERSIONS 个版本的变化保留在内存中，
+    客户端可以按版本号做条件请求（ETag）或只取某个版本之后的增量。
+    版本号从进程启动时间（毫秒）开始计数，服务重启后不会与重启前发出的版本号重复。
+    """
+
+    def __init__(self, strategy: Optional[BollingerBandsStrategy] = None, poll_interval: Optional[float] = None):
+        self.strategy = strategy or BollingerBandsStrategy()
+        self.stock_data_service = StockDataService()
+        self.poll_interval = poll_interval or settings.SCANNER_POLL_INTERVAL
+
+        self.bands: Optional[IncrementalBollinger] = None
+        self.trade_date: Optional[pd.Timestamp] = None  # 当前状态对应的当天K线日期
+        self.signals = pd.Series(dtype=object)  # 股票代码 -> 最近一次扫描的信号
+        self.latest: Optional[Dict] = None
+        self.latest_body: Optional[bytes] = None  # latest 的 JSON，每次扫描只序列化一次
+        self.version = int(time.time() * 1000)  # 信号每变化一次加一
+        self._history = deque(maxlen=settings.SCANNER_HISTORY_VERSIONS)  # (版本号, 信号变化)
+
+        self._seed_lock = asyncio.Lock()
+        self._ready = asyncio.Event()
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._producer: Optional[asyncio.Task] = None
+
+    def live_trade_date(self, now: Optional[datetime] = None) -> pd.Timestamp:
+        """实时行情对应的交易日：交易日开盘（MARKET_OPEN_TIME）之后为当天，否则为上一个交易日
+
+        开盘前的行情快照仍是上一交易日的收盘数据，不能当作当天K线计算信号。
         """
-        # 获取当前日期
-        today = datetime.now().strftime('%Y%m%d')
-        thirty_days_ago = (datetime.now() - timedelta(days=30)).strftime('%Y%m%d')
-        
-        # 获取A股股票列表
-        stock_list = ak.stock_zh_a_spot_em()
-        all_signals = {'buy': [], 'sell': [], 'date': today}
-        
-        # 遍历股票获取数据并分析
-        for _, stock in stock_list.iterrows():
+        calendar = get_trading_calendar()
+        now = now or datetime.now()
+        open_time = datetime.strptime(settings.MARKET_OPEN_TIME, '%H:%M').time()
+        opened = now.time() >= open_time
+        return calendar.prev_trading_day(now, inclusive=opened) or pd.Timestamp(now.date())
+
+    async def seed(self, trade_date: pd.Timestamp, codes: List[str]):
+        """用 trade_date 之前的日线初始化布林带状态（每个交易日一次）"""
+        calendar = get_trading_calendar()
+        end = calendar.prev_trading_day(trade_date) or trade_date - timedelta(days=1)
+        start = end - timedelta(days=(self.strategy.window + 1) * 7 // 5 + 15)
+        history = await self.stock_data_service.get_batch_daily_data(
+            codes, start.strftime('%Y%m%d'), end.strftime('%Y%m%d')
+        )
+
+        bands = self.strategy.create_incremental_state()
+        if not history.empty:
+            # 数据源在休市日偶尔会返回K线，只用交易日的K线
+            history = history[history['date'].isin(calendar.range(start, end))]
+            bands.seed(history)
+        self.bands = bands
+        self.trade_date = trade_date
+        self.signals = pd.Series(dtype=object)
+        logger.info(f"实时扫描状态已初始化：{trade_date.date()}，{len(bands)} 只股票")
+
+    async def scan(self) -> Dict:
+        """扫描一次：一次行情快照 + 一次向量运算，返回最新信号并推送发生变化的信号"""
+        # 快照最多复用一个扫描周期，不使用按 DATA_CACHE_EXPIRE 缓存的旧快照
+        spot = await self.stock_data_service.get_stock_list_all(max_age=self.poll_interval)
+        if spot.empty:
+            raise ValueError("未获取到实时行情快照")
+
+        trade_date = self.live_trade_date()
+        async with self._seed_lock:
+            if self.bands is None or self.trade_date != trade_date:
+                await self.seed(trade_date, spot['code'].tolist())
+
+        # 行情快照的成交量单位与日线一致（手）
+        result = self.bands.peek(spot['code'], spot['price'], spot['volume'])
+        result = result.merge(spot[['code', 'name']], on='code', how='left')
+        signals = pd.Series(result['signal'].to_numpy(), index=result['code'].to_numpy())
+
+        previous = self.signals.reindex(signals.index)
+        changed = result[(signals.to_numpy() != previous.to_numpy()) & signals.notna().to_numpy()]
+        self.signals = signals
+        if not changed.empty:
+            self.version += 1
+
+        self.latest = {
+            'date': trade_date.strftime('%Y%m%d'),
+            'version': self.version,
+            'updated_at': datetime.now().isoformat(),
+            'buy': result.loc[result['signal'] == 'buy', 'code'].tolist(),
+            'sell': result.loc[result['signal'] == 'sell', 'code'].tolist(),
+        }
+        self.latest_body = json.dumps(self.latest, ensure_ascii=False).encode('utf-8')
+        self._ready.set()
+        if not changed.empty:
+            records = _signal_records(changed, previous)
+            self._history.append((self.version, records))
+            self._publish({
+                'date': self.latest['date'],
+                'version': self.version,
+                'changes': records,
+            })
+        return self.latest
+
+    def changes_since(self, version: int) -> Optional[List[Dict]]:
+        """version 之后每只股票的最新信号变化；所需版本已不在内存中时返回 None"""
+        if version >= self.version:
+            return []
+        if not self._history or self._history[0][0] > version + 1:
+            return None
+        latest: Dict[str, Dict] = {}
+        for change_version, records in self._history:
+            if change_version > version:
+                for record in records:
+                    latest[record['code']] = record
+        return list(latest.values())
+
+    async def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        """等待后台任务完成第一次扫描"""
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def scan_today_stocks(self) -> Optional[Dict]:
+        """今天符合布林带策略的股票（后台任务最近一次扫描的结果），首次扫描未完成时等待"""
+        self.start()
+        await self.wait_ready(settings.SCANNER_READY_TIMEOUT)
+        return self.latest
+
+    # ---- 订阅 ----
+
+    def _publish(self, event: Dict):
+        for queue in list(self._subscribers):
             try:
-                # 获取单个股票的历史数据
-                stock_code = stock['代码']
-                df = ak.stock_zh_a_hist(symbol=stock_code, 
-                                      start_date=thirty_days_ago,
-                                      end_date=today,
-                                      adjust="qfq")
-                
-                # 生成交易信号
-                signals = self.strategy.generate_signals(df)
-                
-                # 将信号添加到结果中
-                for code, signal in signals.items():
-                    if signal == 'buy':
-                        all_signals['buy'].append(code)
-                    elif signal == 'sell':
-                        all_signals['sell'].append(code)
-                        
-            except Exception as e:
-                print(f"处理股票 {stock_code} 时出错: {str(e)}")
-                continue
-        
-        return all_signals
\ No newline at end of file
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                logger.warning("实时扫描订阅者消费过慢，丢弃一次信号推送")
+
+    async def _produce(self):
+        """后台扫描：启动时扫描一次，之后只在盘中按 poll_interval 扫描"""
+        first = True
+        while True:
+            if first or self.latest is None or is_market_open():
+                try:
+                    await self.scan()
+                except Exception as e:
+                    logger.error(f"实时扫描失败: {e}")
+            first = False
+            await asyncio.sleep(self.poll_interval)
+
+    def start(self):
+        """启动后台扫描任务（需在事件循环中调用，重复调用只会有一个任务）"""
+        if self._producer is None or self._producer.done():
+            self._producer = asyncio.create_task(self._produce())
+
+    async def stop(self):
+        if self._producer is not None:
+            self._producer.cancel()
+            try:
+                await self._producer
+            except asyncio.CancelledError:
+                pass
+            self._producer = None
+
+    async def subscribe(self):
+        """异步生成信号变化事件；首个事件为当前全部信号"""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=100)
+        self._subscribers.add(queue)
+        self.start()
+        try:
+            if self.latest is not None:
+                yield {'snapshot': True, **self.latest}
+            while True:
+                yield await queue.get()
+        finally:
+            self._subscribers.discard(queue)
+
+
+def is_market_open(now: Optional[datetime] = None) -> bool:
+    """当前是否处于交易日的盘中时段（含集合竞价）"""
+    now = now or datetime.now()
+    if not get_trading_calendar().is_trading_day(now):
+        return False
+    open_time = datetime.strptime(settings.MARKET_OPEN_TIME, '%H:%M').time()
+    close_time = datetime.strptime(settings.MARKET_CLOSE_TIME, '%H:%M').time()
+    return open_time <= now.time() <= close_time
+
+
+def _signal_records(changed: pd.DataFrame, previous: pd.Series) -> List[Dict]:
+    """信号变化记录，NaN 转为 None 便于 JSON 序列化"""
+    frame = changed[['code', 'name', 'signal', 'close', 'middle_band', 'upper_band', 'lower_band']]
+    frame = frame.assign(previous=previous.reindex(frame['code']).to_numpy())
+    frame = frame.astype(object).where(frame.notna(), None)
+    return frame.to_dict('records')
@@ -1,75 +1,372 @@
-import pandas as pd
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Optional, Tuple, Union
+
 import numpy as np
-from typing import List, Dict
-from datetime import datetime
+import pandas as pd
+
+TRADING_DAYS_PER_YEAR = 252
+
+
+class EquityStream:
+    """净值序列的单遍流式统计
+
+    净值可以逐段（NumPy 数组）追加，每段只做向量运算，跨段只保留 O(1) 状态：
+    上一个净值、历史最高净值、最大回撤、收益率的 Welford 均值/二阶矩，
+    以及计算滚动夏普所需的最近 rolling_window 个收益率。
+    收益率序列的第一项按 0 计入，与 pct_change().fillna(0) 的口径一致。
+    """
+
+    def __init__(self, rolling_window: int = 63):
+        self.rolling_window = rolling_window
+        self.count = 0
+        self.first_value = np.nan
+        self.last_value = np.nan
+        self.peak = -np.inf
+        self.max_drawdown = 0.0
+        # 收益率的 Welford 统计
+        self._n = 0
+        self._mean = 0.0
+        self._m2 = 0.0
+        self._recent: Deque[float] = deque(maxlen=rolling_window)
+        # 持仓市值占比
+        self._exposure_sum = 0.0
+        self._exposure_n = 0
+        self._value_sum = 0.0
+
+    def update(self, values: Union[np.ndarray, Iterable[float]], invested: Optional[np.ndarray] = None):
+        """追加一段净值；invested 为对应日期的持仓市值，用于计算平均仓位"""
+        values = np.asarray(values, dtype=float)
+        if not len(values):
+            return
+
+        previous = values[0] if self.count == 0 else self.last_value
+        with np.errstate(divide='ignore', invalid='ignore'):
+            returns = np.diff(values, prepend=previous) / np.concatenate([[previous], values[:-1]])
+        returns = np.nan_to_num(returns, nan=0.0, posinf=0.0, neginf=0.0)
+        self._add_returns(returns)
+
+        peaks = np.maximum.accumulate(np.maximum(values, self.peak))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            drawdowns = values / peaks - 1
+        if np.isfinite(drawdowns).any():
+            self.max_drawdown = min(self.max_drawdown, float(np.nanmin(drawdowns)))
+        self.peak = float(peaks[-1])
+
+        if invested is not None:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                exposure = np.asarray(invested, dtype=float) / values
+            exposure = exposure[np.isfinite(exposure)]
+            self._exposure_sum += float(exposure.sum())
+            self._exposure_n += len(exposure)
+
+        if self.count == 0:
+            self.first_value = float(values[0])
+        self.last_value = float(values[-1])
+        self._value_sum += float(values.sum())
+        self.count += len(values)
+
+    def to_state(self) -> Dict:
+        """可 JSON 序列化的内部状态，之后用 from_state 恢复并继续追加净值"""
+        return {
+            'rolling_window': self.rolling_window,
+            'count': self.count,
+            'first_value': self.first_value,
+            'last_value': self.last_value,
+            'peak': self.peak,
+            'max_drawdown': self.max_drawdown,
+            'n': self._n,
+            'mean': self._mean,
+            'm2': self._m2,
+            'recent': list(self._recent),
+            'exposure_sum': self._exposure_sum,
+            'exposure_n': self._exposure_n,
+            'value_sum': self._value_sum,
+        }
+
+    @classmethod
+    def from_state(cls, state: Dict) -> 'EquityStream':
+        stream = cls(state['rolling_window'])
+        stream.count = state['count']
+        stream.first_value = state['first_value']
+        stream.last_value = state['last_value']
+        stream.peak = state['peak']
+        stream.max_drawdown = state['max_drawdown']
+        stream._n = state['n']
+        stream._mean = state['mean']
+        stream._m2 = state['m2']
+        stream._recent.extend(state['recent'])
+        stream._exposure_sum = state['exposure_sum']
+        stream._exposure_n = state['exposure_n']
+        stream._value_sum = state['value_sum']
+        return stream
+
+    def _add_returns(self, returns: np.ndarray):
+        """按 Chan 等人的并行公式把一段收益率合并进 Welford 统计"""
+        n_b = len(returns)
+        mean_b = float(returns.mean())
+        m2_b = float(((returns - mean_b) ** 2).sum())
+        n = self._n + n_b
+        delta = mean_b - self._mean
+        self._mean += delta * n_b / n
+        self._m2 += m2_b + delta * delta * self._n * n_b / n
+        self._n = n
+        self._recent.extend(returns[-self.rolling_window:].tolist())
+
+    @property
+    def mean_value(self) -> float:
+        return self._value_sum / self.count if self.count else np.nan
+
+    @property
+    def return_std(self) -> float:
+        return float(np.sqrt(self._m2 / (self._n - 1))) if self._n > 1 else np.nan
+
+    @property
+    def exposure(self) -> float:
+        return self._exposure_sum / self._exposure_n if self._exposure_n else 0.0
+
+    @staticmethod
+    def _sharpe(mean: float, std: float, risk_free_rate: float) -> float:
+        if not std or np.isnan(std):
+            return np.nan
+        return float(np.sqrt(TRADING_DAYS_PER_YEAR) * (mean - risk_free_rate / TRADING_DAYS_PER_YEAR) / std)
+
+    def sharpe_ratio(self, risk_free_rate: float) -> float:
+        return self._sharpe(self._mean, self.return_std, risk_free_rate)
+
+    def rolling_sharpe_ratio(self, risk_free_rate: float) -> float:
+        """最近 rolling_window 个交易日的夏普比率，数据不足一个窗口时为 NaN"""
+        if len(self._recent) < self.rolling_window:
+            return np.nan
+        recent = np.fromiter(self._recent, dtype=float)
+        return self._sharpe(float(recent.mean()), float(recent.std(ddof=1)), risk_free_rate)
+
+
+class FifoTradeMatcher:
+    """按股票先进先出配对买卖成交
+
+    每只股票只保存尚未平仓的买入批次 [剩余股数, 买入价]，卖出时从最早的批次开始冲销，
+    每笔卖出记一次已实现盈亏。内存只与未平仓批次数有关。
+    """
+
+    def __init__(self):
+        self._lots: Dict[object, Deque[List[float]]] = {}
+        self.closed_trades = 0
+        self.winning_trades = 0
+        self.realized_profit = 0.0
+        self.buy_value = 0.0
+        self.sell_value = 0.0
+
+    def add(self, key, side: str, price: float, shares: float):
+        if side == 'buy':
+            self._lots.setdefault(key, deque()).append([shares, price])
+            self.buy_value += shares * price
+            return
+
+        self.sell_value += shares * price
+        lots = self._lots.get(key)
+        profit, matched = 0.0, False
+        while shares > 0 and lots:
+            lot = lots[0]
+            quantity = min(shares, lot[0])
+            profit += (price - lot[1]) * quantity
+            shares -= quantity
+            lot[0] -= quantity
+            matched = True
+            if lot[0] <= 0:
+                lots.popleft()
+        if lots is not None and not lots:
+            del self._lots[key]
+
+        if matched:
+            self.closed_trades += 1
+            self.winning_trades += profit > 0
+            self.realized_profit += profit
+
+    @property
+    def open_lots(self) -> int:
+        return sum(len(lots) for lots in self._lots.values())
+
+
+def _trade_records(transactions) -> Iterable[Tuple[object, str, float, float, str]]:
+    """统一遍历成交记录，产出 (配对键, 方向, 价格, 股数, 日期)
+
+    支持 list[dict]、DataFrame 和带 code/type/price/shares/date 字段的结构化数组；
+    组合回测的成交带有 strategy 字段，按 (策略, 股票) 分别配对。
+    """
+    if isinstance(transactions, np.ndarray):
+        transactions = pd.DataFrame(transactions)
+    if isinstance(transactions, pd.DataFrame):
+        if transactions.empty:
+            return
+        strategies = transactions['strategy'] if 'strategy' in transactions else [None] * len(transactions)
+        yield from zip(
+            zip(strategies, transactions['code']),
+            transactions['type'],
+            transactions['price'].astype(float),
+            transactions['shares'].astype(float),
+            transactions['date']
+        )
+        return
+    for t in transactions:
+        yield (t.get('strategy'), t['code']), t['type'], float(t['price']), float(t['shares']), t['date']
+
+
+def _trade_commissions(transactions) -> np.ndarray:
+    """与 _trade_records 顺序一致的每笔手续费，没有 commission 字段的成交按 0 计"""
+    if isinstance(transactions, np.ndarray):
+        transactions = pd.DataFrame(transactions)
+    if isinstance(transactions, pd.DataFrame):
+        if 'commission' not in transactions:
+            return np.zeros(len(transactions))
+        return transactions['commission'].astype(float).fillna(0.0).to_numpy()
+    return np.array([float(t.get('commission') or 0.0) for t in transactions], dtype=float)
+
 
 class PerformanceAnalyzer:
-    def __init__(self, initial_capital: float):
+    def __init__(self, initial_capital: float, risk_free_rate: float = 0.03, rolling_window: int = 63):
         self.initial_capital = initial_capital
-    
+        self.risk_free_rate = risk_free_rate
+        self.rolling_window = rolling_window
+
     def calculate_returns(self, daily_values: List[float]) -> pd.Series:
         """计算收益率序列"""
-        values = pd.Series(daily_values)
-        returns = values.pct_change().fillna(0)
-        return returns
-    
+        values = np.asarray(daily_values, dtype=float)
+        returns = np.zeros(len(values))
+        if len(values) > 1:
+            returns[1:] = values[1:] / values[:-1] - 1
+        return pd.Series(returns)
+
     def calculate_drawdown(self, daily_values: List[float]) -> pd.Series:
         """计算回撤序列"""
-        values = pd.Series(daily_values)
-        rolling_max = values.expanding().max()
-        drawdowns = values / rolling_max - 1
-        return drawdowns
-    
+        values = np.asarray(daily_values, dtype=float)
+        return pd.Series(values / np.maximum.accumulate(values) - 1 if len(values) else values)
+
+    def rolling_sharpe(self, daily_values: List[float], window: Optional[int] = None) -> np.ndarray:
+        """滚动夏普比率序列（前 window - 1 个交易日为 NaN），用累加和一次算出"""
+        window = window or self.rolling_window
+        returns = self.calculate_returns(daily_values).to_numpy()
+        result = np.full(len(returns), np.nan)
+        if len(returns) < window:
+            return result
+        s1 = np.concatenate([[0.0], np.cumsum(returns)])
+        s2 = np.concatenate([[0.0], np.cumsum(returns * returns)])
+        sums = s1[window:] - s1[:-window]
+        sumsq = s2[window:] - s2[:-window]
+        mean = sums / window
+        with np.errstate(divide='ignore', invalid='ignore'):
+            std = np.sqrt(np.maximum(sumsq - sums * mean, 0.0) / (window - 1))
+            result[window - 1:] = np.where(
+                std > 0,
+                np.sqrt(TRADING_DAYS_PER_YEAR) * (mean - self.risk_free_rate / TRADING_DAYS_PER_YEAR) / std,
+                np.nan
+            )
+        return result
+
+    def _cash_by_day(self, dates: np.ndarray, transactions) -> Optional[np.ndarray]:
+        """按成交记录还原每天收盘后的现金余额（扣除手续费），日期无法对齐时返回 None"""
+        trade_dates, cash_deltas = [], []
+        for _, side, price, shares, date in _trade_records(transactions):
+            trade_dates.append(date)
+            cash_deltas.append(-price * shares if side == 'buy' else price * shares)
+        if not trade_dates:
+            return np.full(len(dates), float(self.initial_capital))
+        cash_deltas = np.asarray(cash_deltas) - _trade_commissions(transactions)
+
+        try:
+            day_keys = pd.to_datetime(pd.Series(dates)).to_numpy()
+            trade_keys = pd.to_datetime(pd.Series(trade_dates)).to_numpy()
+        except (ValueError, TypeError):
+            return None
+        order = np.argsort(trade_keys, kind='stable')
+        cumulative = np.cumsum(cash_deltas[order])
+        # 每个交易日收盘时已发生的成交笔数
+        executed = np.searchsorted(trade_keys[order], day_keys, side='right')
+        return self.initial_capital + np.where(executed > 0, cumulative[np.maximum(executed - 1, 0)], 0.0)
+
     def calculate_metrics(self, daily_values: List[Dict], transactions: List[Dict]) -> Dict:
-        """计算策略表现指标"""
-        values = [d['value'] for d in daily_values]
-        returns = self.calculate_returns(values)
-        drawdowns = self.calculate_drawdown(values)
-        
-        # 计算总收益率和年化收益率
-        total_days = len(values)
-        total_return = (values[-1] - values[0]) / values[0]
-        annual_return = (1 + total_return) ** (252 / total_days) - 1
-        
-        # 计算最大回撤
-        max_drawdown = drawdowns.min()
-        
-        # 计算夏普比率
-        risk_free_rate = 0.03  # 假设无风险利率为3%
-        excess_returns = returns - risk_free_rate / 252
-        sharpe_ratio = np.sqrt(252) * excess_returns.mean() / returns.std()
-        
-        # 计算交易统计
-        trades_df = pd.DataFrame(transactions)
-        win_rate = 0
-        avg_profit = 0
-        total_trades = len(transactions)
-        
-        if not trades_df.empty:
-            profits = []  # 用于存储每对交易的盈亏
-            
-            for i in range(0, len(trades_df), 2):  # 每两笔交易为一组（买入和卖出）
-                if i + 1 < len(trades_df):  # 确保有配对的交易
-                    buy_trade = trades_df.iloc[i]
-                    sell_trade = trades_df.iloc[i + 1]
-                    
-                    if buy_trade['type'] == 'buy' and sell_trade['type'] == 'sell':
-                        profit = (sell_trade['price'] - buy_trade['price']) * buy_trade['shares']
-                        profits.append(profit)
-                        trades_df.loc[i:i+1, 'profit'] = profit
-            
-            if profits:  # 确保有完成的交易
-                profitable_trades = len([p for p in profits if p > 0])
-                total_pairs = len(profits)
-                win_rate = profitable_trades / total_pairs if total_pairs > 0 else 0
-                avg_profit = sum(profits) / total_pairs if total_pairs > 0 else 0
-        
+        """计算策略表现指标
+
+        daily_values 为 [{'date', 'value'}] 列表或包含 date/value 列的 DataFrame，
+        transactions 为成交记录（格式见 _trade_records）。
+        """
+        if isinstance(daily_values, pd.DataFrame):
+            dates, values = daily_values['date'].to_numpy(), daily_values['value'].to_numpy(dtype=float)
+        else:
+            dates = np.array([d['date'] for d in daily_values])
+            values = np.fromiter((d['value'] for d in daily_values), dtype=float, count=len(daily_values))
+
+        cash = self._cash_by_day(dates, transactions) if len(values) else None
+        invested = values - cash if cash is not None else None
+        return self.calculate_metrics_arrays(values, transactions, invested)
+
+    def calculate_metrics_arrays(
+        self,
+        values: np.ndarray,
+        transactions=(),
+        invested: Optional[np.ndarray] = None,
+        chunk_size: int = 1 << 20
+    ) -> Dict:
+        """直接在净值数组上单遍计算指标，超长序列按 chunk_size 分段流式累计
+
+        Args:
+            values: 每日净值
+            transactions: 成交记录
+            invested: 每日持仓市值，用于计算平均仓位（exposure），为 None 时仓位记为 0
+        """
+        values = np.asarray(values, dtype=float)
+        stream = EquityStream(self.rolling_window)
+        for start in range(0, len(values), chunk_size):
+            stop = start + chunk_size
+            stream.update(values[start:stop], None if invested is None else invested[start:stop])
+
+        matcher = FifoTradeMatcher()
+        total_trades = 0
+        for key, side, price, shares, _ in _trade_records(transactions):
+            matcher.add(key, side, price, shares)
+            total_trades += 1
+
+        return self._summarize(stream, matcher, total_trades)
+
+    def equity_metrics(self, stream: EquityStream) -> Dict:
+        """只依赖净值序列的指标（收益、回撤、夏普、平均仓位）"""
+        total_days = stream.count
+        if total_days == 0:
+            total_return = annual_return = 0.0
+        else:
+            total_return = (stream.last_value - stream.first_value) / stream.first_value
+            annual_return = (1 + total_return) ** (TRADING_DAYS_PER_YEAR / total_days) - 1
+
+        sharpe_ratio = stream.sharpe_ratio(self.risk_free_rate)
+        rolling_sharpe = stream.rolling_sharpe_ratio(self.risk_free_rate)
         return {
             'total_return': total_return,
             'annual_return': annual_return,
-            'max_drawdown': max_drawdown,
-            'sharpe_ratio': sharpe_ratio,
+            'max_drawdown': stream.max_drawdown,
+            # 无法计算（收益率无波动或数据不足）时为 None，便于直接序列化为 JSON
+            'sharpe_ratio': None if np.isnan(sharpe_ratio) else sharpe_ratio,
+            'rolling_sharpe': None if np.isnan(rolling_sharpe) else rolling_sharpe,
+            'exposure': stream.exposure,
+        }
+
+    def _summarize(self, stream: EquityStream, matcher: FifoTradeMatcher, total_trades: int) -> Dict:
+        total_days = stream.count
+        equity = self.equity_metrics(stream)
+
+        # 换手率：买卖成交额均值相对平均净值，按年化口径
+        turnover = 0.0
+        if total_days and stream.mean_value:
+            turnover = (matcher.buy_value + matcher.sell_value) / 2 / stream.mean_value * TRADING_DAYS_PER_YEAR / total_days
+
+        closed = matcher.closed_trades
+        return {
+            'total_return': equity['total_return'],
+            'annual_return': equity['annual_return'],
+            'max_drawdown': equity['max_drawdown'],
+            'sharpe_ratio': equity['sharpe_ratio'],
+            'rolling_sharpe': equity['rolling_sharpe'],
             'total_trades': total_trades,
-            'win_rate': win_rate,
-            'avg_profit': avg_profit
+            'win_rate': matcher.winning_trades / closed if closed else 0,
+            'avg_profit': matcher.realized_profit / closed if closed else 0,
+            'turnover': turnover,
+            'exposure': equity['exposure'],
         }
@@ -1,67 +1,192 @@
 from datetime import datetime, timedelta
-from typing import List, Dict
+from typing import Callable, List, Dict, Optional
+import inspect
+import numpy as np
 import pandas as pd
 from ..strategies.base import BaseStrategy
 from .stock_data import StockDataService
 from .analysis import PerformanceAnalyzer
+from .market_panel import MarketPanel
+from .vectorized_backtest import SignalMatrix, simulate
+from .ledger import Ledger
 from ..models.database import SessionLocal
 from ..models.strategy import Strategy, Transaction, Performance
+from ..utils.trading_calendar import get_trading_calendar
 
 class BacktestService:
-    def __init__(self, initial_capital: float = 1000000):
+    def __init__(
+        self,
+        initial_capital: float = 1000000,
+        progress_callback: Optional[Callable[[float], None]] = None
+    ):
         self.initial_capital = initial_capital
-        self.current_capital = initial_capital
-        self.positions = {}
-        self.transactions = []
-        self.daily_values = []
+        self.progress_callback = progress_callback  # 回测进度回调，参数为 0~1 的完成比例
+        self.ledger = Ledger(initial_capital)
         self.stock_data_service = StockDataService()
         self.analyzer = PerformanceAnalyzer(initial_capital)
-    
+
+    def reset(self):
+        """清空上一次回测的资金、持仓和交易记录"""
+        self.ledger = Ledger(self.initial_capital)
+
+    @property
+    def current_capital(self) -> float:
+        return self.ledger.cash
+
+    @property
+    def positions(self) -> Dict[str, float]:
+        return self.ledger.positions()
+
+    @property
+    def transactions(self) -> List[Dict]:
+        """成交记录（字典列表），每次访问都从账本转换"""
+        return self.ledger.transaction_records()
+
+    @property
+    def daily_values(self) -> List[Dict]:
+        """每日净值（字典列表），每次访问都从账本转换"""
+        return self.ledger.daily_values_records()
+
+    def report_progress(self, fraction: float):
+        if self.progress_callback is not None:
+            self.progress_callback(min(max(fraction, 0.0), 1.0))
+
+    def _report_day(self, index: int, total: int):
+        """逐日回测的进度：数据加载占前 30%，每完成约 1% 的交易日回调一次"""
+        step = max(total // 100, 1)
+        if (index + 1) % step == 0 or index + 1 == total:
+            self.report_progress(0.3 + 0.7 * (index + 1) / total)
+
     async def get_stock_universe(self) -> List[str]:
         """获取股票池"""
         return await self.stock_data_service.get_main_board_stock_list()
-    
+
+    def get_data_start(self, strategy: BaseStrategy, start_date: str) -> str:
+        """包含指标预热区间的数据开始日期
+
+        按每周 5 个交易日把预热K线数换算成自然日，再额外留出长假的余量。
+        """
+        warmup_days = strategy.warmup_bars * 7 // 5 + 15 if strategy.warmup_bars else 0
+        return (pd.Timestamp(start_date) - timedelta(days=warmup_days)).strftime('%Y%m%d')
+
     async def run_backtest(
         self,
         strategy: BaseStrategy,
         start_date: str,
-        end_date: str
+        end_date: str,
+        precompute: bool = True,
+        vectorized: bool = True
     ) -> Dict:
-        """运行回测"""
+        """运行回测
+
+        Args:
+            strategy: 策略
+            start_date: 开始日期
+            end_date: 结束日期
+            precompute: 策略支持时一次性预计算整段历史的信号，按交易日查表；
+                为 False 时逐日截取最近 30 天数据调用 generate_signals
+            vectorized: 对无状态策略（strategy.stateless）直接用信号矩阵向量化撮合，
+                交易规则与逐日执行 execute_trades 相同
+        """
         # 获取股票池
         universe = await self.get_stock_universe()
         selected_stocks = strategy.select_stocks("ss", universe)
+        self.report_progress(0.05)
 
-        # 获取回测区间的所有交易日
-        trading_days = pd.date_range(start_date, end_date, freq='B')
-        
-        # 一次性获取所有历史数据
+        # 一次性获取所有历史数据（包含指标预热区间）
         all_stock_data = await self.stock_data_service.get_batch_daily_data(
             selected_stocks,
-            start_date,
+            self.get_data_start(strategy, start_date),
             end_date
         )
-        
-        for date in trading_days:
+        self.report_progress(0.3)
+
+        return await self.run_on_data(strategy, all_stock_data, start_date, end_date, precompute, vectorized)
+
+    async def run_on_data(
+        self,
+        strategy: BaseStrategy,
+        all_stock_data: pd.DataFrame,
+        start_date: str,
+        end_date: str,
+        precompute: bool = True,
+        vectorized: bool = True,
+        trading_days: Optional[pd.DatetimeIndex] = None
+    ) -> Dict:
+        """在已经加载好的日线数据上回测，数据需要覆盖 get_data_start 开始的预热区间
+
+        参数扫描、组合回测等场景复用同一份数据时直接调用此方法，参数含义同 run_backtest；
+        trading_days 为预先计算好的回测交易日，多个回测共用同一份日期索引时传入。
+        """
+        self.reset()
+
+        # 获取回测区间的所有交易日（排除周末和节假日）
+        if trading_days is None:
+            trading_days = get_trading_calendar().range(start_date, end_date)
+
+        signal_panel = strategy.prepare_signals(all_stock_data) if precompute and not all_stock_data.empty else None
+        if signal_panel is not None and vectorized and strategy.stateless:
+            self._run_vectorized(strategy, signal_panel, trading_days)
+        elif signal_panel is not None:
+            await self._run_precomputed(strategy, MarketPanel(signal_panel), trading_days)
+        else:
+            await self._run_daily(strategy, MarketPanel(all_stock_data), trading_days)
+
+        # 计算回测结果
+        metrics = self.analyzer.calculate_metrics_arrays(
+            self.ledger.values, self.ledger.trades_frame(), self.ledger.invested
+        )
+        self.report_progress(1.0)
+        return metrics
+
+    def _run_vectorized(self, strategy: BaseStrategy, signal_panel: pd.DataFrame, trading_days: pd.DatetimeIndex):
+        """把整段信号转换为 交易日 × 股票 矩阵，一次性撮合出成交和净值曲线"""
+        self.ledger = simulate(
+            SignalMatrix(signal_panel, trading_days),
+            self.current_capital,
+            strategy.calculate_position_size
+        )
+
+    async def _run_precomputed(self, strategy: BaseStrategy, panel: MarketPanel, trading_days: pd.DatetimeIndex):
+        """按交易日直接读取预计算的信号，每天只处理当天的行"""
+        for i, date in enumerate(trading_days):
             date_str = date.strftime('%Y%m%d')
-            # 选股
-            
+            day_data = panel.day(date)
+
+            with_signal = day_data[day_data['signal'].notna()]
+            signals = dict(zip(with_signal['code'], with_signal['signal']))
+
+            # 执行交易
+            await self.execute_trades(signals, day_data, strategy, date_str)
+
+            # 更新每日市值
+            self.update_daily_value(date_str, day_data)
+            self._report_day(i, len(trading_days))
+
+    async def _run_daily(self, strategy: BaseStrategy, panel: MarketPanel, trading_days: pd.DatetimeIndex):
+        """逐日截取最近 30 天数据调用策略生成信号"""
+        for i, date in enumerate(trading_days):
+            date_str = date.strftime('%Y%m%d')
+
             # 从历史数据中筛选出当前日期之前的30天数据
-            mask = (all_stock_data['date'] <= date_str) & (all_stock_data['date'] >= (date - timedelta(days=30)).strftime('%Y%m%d'))
-            stock_data = all_stock_data[mask].copy()
-            
-            # 生成交易信号
-            signals = await strategy.generate_signals(stock_data)
-            
+            stock_data = panel.between(date - timedelta(days=30), date).copy()
+            if stock_data.empty:
+                self.update_daily_value(date_str, stock_data)
+                self._report_day(i, len(trading_days))
+                continue
+
+            # 生成交易信号（兼容同步和异步的 generate_signals）
+            signals = strategy.generate_signals(stock_data)
+            if inspect.isawaitable(signals):
+                signals = await signals
+
             # 执行交易
             await self.execute_trades(signals, stock_data, strategy, date_str)
-            
+
             # 更新每日市值
             self.update_daily_value(date_str, stock_data)
-        
-        # 计算回测结果
-        return self.analyzer.calculate_metrics(self.daily_values, self.transactions)
-    
+            self._report_day(i, len(trading_days))
+
     async def execute_trades(
         self,
         signals: Dict[str, str],
@@ -70,48 +195,29 @@ class BacktestService:
         date: str
     ):
         """执行交易"""
-        for stock_code, signal in signals.items():
-            latest_price = stock_data[stock_data['code'] == stock_code]['close'].iloc[-1]
-            
-            if signal == 'buy' and stock_code not in self.positions:
+        if not signals:
+            return
+
+        latest_prices = stock_data.groupby('code', sort=False)['close'].last()
+        latest_prices = latest_prices.reindex(list(signals))
+        symbols = self.ledger.symbol_ids(latest_prices.index)
+        for symbol, signal, latest_price in zip(symbols, signals.values(), latest_prices.to_numpy()):
+            if np.isnan(latest_price):
+                continue
+
+            if signal == 'buy' and not self.ledger.holds(symbol):
                 shares = strategy.calculate_position_size(self.current_capital, latest_price)
-                cost = shares * latest_price
-                if cost <= self.current_capital:
-                    self.positions[stock_code] = shares
-                    self.current_capital -= cost
-                    self.transactions.append({
-                        'date': date,
-                        'code': stock_code,
-                        'type': 'buy',
-                        'price': latest_price,
-                        'shares': shares,
-                        'cost': cost
-                    })
-            
-            elif signal == 'sell' and stock_code in self.positions:
-                shares = self.positions[stock_code]
-                revenue = shares * latest_price
-                self.current_capital += revenue
-                del self.positions[stock_code]
-                self.transactions.append({
-                    'date': date,
-                    'code': stock_code,
-                    'type': 'sell',
-                    'price': latest_price,
-                    'shares': shares,
-                    'revenue': revenue
-                })
-    
+                if self.ledger.buy_cost(latest_price, shares) <= self.current_capital:
+                    self.ledger.buy(symbol, latest_price, shares)
+
+            elif signal == 'sell' and self.ledger.holds(symbol):
+                self.ledger.sell(symbol, latest_price)
+
     def update_daily_value(self, date: str, stock_data: pd.DataFrame):
-        """更新每日市值"""
-        total_value = self.current_capital
-        
-        for stock_code, shares in self.positions.items():
-            if stock_code in stock_data['code'].values:
-                latest_price = stock_data[stock_data['code'] == stock_code]['close'].iloc[-1]
-                total_value += shares * latest_price
-        
-        self.daily_values.append({
-            'date': date,
-            'value': total_value
-        })
+        """更新每日市值（停牌或当天无数据的持仓按最近一次收盘价计算）"""
+        if not stock_data.empty:
+            self.ledger.update_prices(
+                self.ledger.symbol_ids(stock_data['code']),
+                stock_data['close'].to_numpy(dtype=float)
+            )
+        self.ledger.record_value(date)
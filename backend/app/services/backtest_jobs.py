@@ -0,0 +1,280 @@
+import asyncio
+import hashlib
+import inspect
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from enum import Enum
+from typing import Any, Dict, Optional
+
+import pandas as pd
+
+from ..core.config import settings
+from ..strategies.registry import get_strategy_class
+from ..db.session import SessionLocal
+from .backtest import BacktestService
+from .performance_store import persist_backtest
+
+logger = logging.getLogger(__name__)
+
+
+def _json_default(value):
+    """numpy 标量转为 Python 标量，其他无法序列化的值转为字符串"""
+    return value.item() if hasattr(value, 'item') else str(value)
+
+
+def normalize_params(strategy_name: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    """补全策略构造参数的默认值，显式传入默认值和省略该参数得到相同的任务
+
+    枚举参数转换为它的值（如 ModelComplexity.MEDIUM -> "medium"），与直接传入值得到相同的任务。
+    """
+    signature = inspect.signature(get_strategy_class(strategy_name).__init__)
+    bound = signature.bind(None, **params)
+    bound.apply_defaults()
+    arguments = dict(bound.arguments)
+    arguments.pop(next(iter(signature.parameters)))  # self
+    return {name: value.value if isinstance(value, Enum) else value for name, value in arguments.items()}
+
+
+def make_job_id(
+    strategy_name: str,
+    params: Dict[str, Any],
+    start_date: str,
+    end_date: str,
+    initial_capital: float
+) -> str:
+    """策略类 + 参数 + 回测区间 + 初始资金的哈希"""
+    strategy_class = get_strategy_class(strategy_name)
+    payload = json.dumps(
+        [f"{strategy_class.__module__}.{strategy_class.__qualname__}", params, start_date, end_date, initial_capital],
+        sort_keys=True, default=str, ensure_ascii=False
+    )
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:16]
+
+
+class BacktestJob:
+    """一个回测任务的状态、进度和结果"""
+
+    def __init__(self, job_id: str, strategy_name: str, params: Dict[str, Any],
+                 start_date: str, end_date: str, initial_capital: float):
+        self.job_id = job_id
+        self.strategy_name = strategy_name
+        self.params = params
+        self.start_date = start_date
+        self.end_date = end_date
+        self.initial_capital = initial_capital
+        self.status = 'pending'  # pending / running / completed / failed
+        self.progress = 0.0
+        self.result: Optional[Dict] = None
+        self.error: Optional[str] = None
+        self.submitted_at = datetime.now().isoformat()
+        self.finished_at: Optional[str] = None
+        self.version = 0  # 状态或进度每变化一次加一，用于推送进度
+
+    @property
+    def open_ended(self) -> bool:
+        """回测区间结束于今天或之后：行情还会更新，结果只是阶段性的"""
+        return pd.Timestamp(self.end_date).date() >= date.today()
+
+    def finished_seconds_ago(self) -> Optional[float]:
+        if self.finished_at is None:
+            return None
+        return (datetime.now() - datetime.fromisoformat(self.finished_at)).total_seconds()
+
+    def update(self, **changes):
+        for key, value in changes.items():
+            setattr(self, key, value)
+        self.version += 1
+
+    def to_dict(self, include_result: bool = True) -> Dict:
+        data = {
+            'job_id': self.job_id,
+            'strategy': self.strategy_name,
+            'params': self.params,
+            'start_date': self.start_date,
+            'end_date': self.end_date,
+            'initial_capital': self.initial_capital,
+            'status': self.status,
+            'progress': self.progress,
+            'error': self.error,
+            'submitted_at': self.submitted_at,
+            'finished_at': self.finished_at,
+        }
+        if include_result:
+            data['result'] = self.result
+        return data
+
+
+class BacktestJobQueue:
+    """本地回测任务队列
+
+    回测提交后在 BACKTEST_JOB_WORKERS 个工作线程中运行（每个任务使用独立的事件循环），
+    请求立即返回任务 ID，客户端通过轮询或 SSE 获取进度和结果。
+    任务 ID 由策略类、参数、回测区间和初始资金决定；相同的提交直接返回已有任务，
+    已完成的结果同时写入 BACKTEST_RESULT_DIR，服务重启后仍可直接命中。
+    结束日期为今天或之后的任务不写结果缓存，内存中的结果只复用 BACKTEST_OPEN_RESULT_TTL 秒；
+    已结束的任务在内存中保留 BACKTEST_JOB_RETENTION 秒。
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, result_dir: Optional[str] = None):
+        self.result_dir = result_dir or settings.BACKTEST_RESULT_DIR
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or settings.BACKTEST_JOB_WORKERS,
+            thread_name_prefix="backtest"
+        )
+        self._jobs: Dict[str, BacktestJob] = {}
+        self._lock = threading.Lock()
+
+    def _result_path(self, job_id: str) -> str:
+        return os.path.join(self.result_dir, f"{job_id}.json")
+
+    def _load_cached(self, job: BacktestJob) -> bool:
+        """从结果缓存文件恢复任务（文件 IO，不在 self._lock 内调用）"""
+        if job.open_ended:
+            return False
+        path = self._result_path(job.job_id)
+        if not os.path.exists(path):
+            return False
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取回测结果缓存 {path} 失败: {e}")
+            return False
+        job.update(status='completed', progress=1.0, result=cached['result'], finished_at=cached['finished_at'])
+        return True
+
+    @staticmethod
+    def _reusable(job: BacktestJob) -> bool:
+        if job.status in ('pending', 'running'):
+            return True
+        if job.status == 'failed':
+            return False
+        return not job.open_ended or job.finished_seconds_ago() < settings.BACKTEST_OPEN_RESULT_TTL
+
+    def _evict_finished(self):
+        """移除结束超过 BACKTEST_JOB_RETENTION 秒的任务（调用方持有 self._lock）"""
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.status in ('completed', 'failed') and job.finished_seconds_ago() > settings.BACKTEST_JOB_RETENTION
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def _save_result(self, job: BacktestJob):
+        os.makedirs(self.result_dir, exist_ok=True)
+        path = self._result_path(job.job_id)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({**job.to_dict(include_result=False), 'result': job.result}, f, default=_json_default, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def submit(
+        self,
+        strategy_name: str,
+        params: Dict[str, Any],
+        start_date: str,
+        end_date: str,
+        initial_capital: float = settings.DEFAULT_INITIAL_CAPITAL
+    ) -> BacktestJob:
+        """提交回测任务；相同任务正在运行或已有结果时直接返回该任务"""
+        params = normalize_params(strategy_name, params)
+        job_id = make_job_id(strategy_name, params, start_date, end_date, initial_capital)
+
+        with self._lock:
+            self._evict_finished()
+            job = self._jobs.get(job_id)
+            if job is not None and self._reusable(job):
+                return job
+
+            # 新任务先以 pending 状态登记，同时到达的相同提交直接返回它
+            job = BacktestJob(job_id, strategy_name, params, start_date, end_date, initial_capital)
+            self._jobs[job_id] = job
+
+        if self._load_cached(job):
+            return job
+
+        self._executor.submit(self._run, job)
+        logger.info(f"回测任务 {job_id} 已提交: {strategy_name} {params} {start_date}~{end_date}")
+        return job
+
+    def get(self, job_id: str) -> Optional[BacktestJob]:
+        with self._lock:
+            self._evict_finished()
+            return self._jobs.get(job_id)
+
+    def _run(self, job: BacktestJob):
+        """在工作线程中运行回测"""
+        job.update(status='running')
+        try:
+            strategy = get_strategy_class(job.strategy_name)(**job.params)
+            backtest = BacktestService(
+                initial_capital=job.initial_capital,
+                progress_callback=lambda fraction: job.update(progress=fraction)
+            )
+            metrics = asyncio.run(backtest.run_backtest(strategy, job.start_date, job.end_date))
+            result = {
+                'metrics': metrics,
+                'daily_values': backtest.daily_values,
+                'transactions': backtest.transactions,
+            }
+            job.update(status='completed', progress=1.0, result=result, finished_at=datetime.now().isoformat())
+            if not job.open_ended:
+                self._save_result(job)
+            logger.info(f"回测任务 {job.job_id} 完成")
+        except Exception as e:
+            job.update(status='failed', error=str(e), finished_at=datetime.now().isoformat())
+            logger.error(f"回测任务 {job.job_id} 失败: {e}")
+            return
+
+        if settings.BACKTEST_PERSIST_PERFORMANCE:
+            self._persist(job, backtest)
+
+    def _persist(self, job: BacktestJob, backtest: BacktestService):
+        """每日净值和成交写入策略绩效表（策略名 backtest:<任务 ID>），写库失败不影响任务结果"""
+        db = SessionLocal()
+        try:
+            persist_backtest(db, f"backtest:{job.job_id}", backtest.ledger, {
+                'strategy': job.strategy_name,
+                'params': job.params,
+                'start_date': job.start_date,
+                'end_date': job.end_date,
+                'initial_capital': job.initial_capital,
+            })
+        except Exception as e:
+            db.rollback()
+            logger.warning(f"回测任务 {job.job_id} 写入绩效表失败: {e}")
+        finally:
+            db.close()
+
+    async def stream(self, job_id: str, interval: float = 0.5):
+        """异步生成任务状态，直到任务完成或失败；状态没有变化时不重复发送"""
+        last_version = -1
+        while True:
+            job = self.get(job_id)
+            if job is None:
+                return
+            if job.version != last_version:
+                last_version = job.version
+                finished = job.status in ('completed', 'failed')
+                yield job.to_dict(include_result=finished)
+                if finished:
+                    return
+            await asyncio.sleep(interval)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+_job_queue: Optional[BacktestJobQueue] = None
+
+
+def get_job_queue() -> BacktestJobQueue:
+    """进程内共享的回测任务队列"""
+    global _job_queue
+    if _job_queue is None:
+        _job_queue = BacktestJobQueue()
+    return _job_queue
@@ -0,0 +1,205 @@
+import json
+import os
+import threading
+from collections import defaultdict
+from typing import List, Optional, Tuple
+import logging
+
+import numpy as np
+import pandas as pd
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 日线数据在磁盘上的存储格式（NumPy 结构化数组，可内存映射读取）
+BAR_DTYPE = np.dtype([
+    ('date', 'datetime64[D]'),
+    ('open', 'f8'),
+    ('close', 'f8'),
+    ('high', 'f8'),
+    ('low', 'f8'),
+    ('volume', 'f8'),
+    ('amount', 'f8'),
+])
+
+BAR_COLUMNS = [name for name in BAR_DTYPE.names if name != 'date']
+
+
+class DailyBarStore:
+    """本地日线数据仓库
+
+    每只股票对应两个文件：
+        - {code}.npy: 按日期升序排列的结构化数组，读取时使用内存映射，只加载需要的区间
+        - {code}.json: 已经从数据源完整同步过的日期区间 {"start": ..., "end": ...}
+
+    覆盖区间与实际K线分开记录，这样停牌、节假日等没有K线的日期也不会被重复请求。
+    """
+
+    def __init__(self, root_dir: str):
+        self.root_dir = root_dir
+        os.makedirs(root_dir, exist_ok=True)
+        self._locks = defaultdict(threading.Lock)
+        self._locks_guard = threading.Lock()
+
+    def _bar_path(self, stock_code: str) -> str:
+        return os.path.join(self.root_dir, f"{stock_code}.npy")
+
+    def _meta_path(self, stock_code: str) -> str:
+        return os.path.join(self.root_dir, f"{stock_code}.json")
+
+    def lock(self, stock_code: str) -> threading.Lock:
+        """获取单只股票的读写锁，避免并发补数时重复请求或互相覆盖"""
+        with self._locks_guard:
+            return self._locks[stock_code]
+
+    def coverage(self, stock_code: str) -> Optional[Tuple[pd.Timestamp, pd.Timestamp]]:
+        """返回已同步的日期区间，没有本地数据时返回 None"""
+        try:
+            with open(self._meta_path(stock_code), 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            return pd.Timestamp(meta['start']), pd.Timestamp(meta['end'])
+        except FileNotFoundError:
+            return None
+        except (ValueError, KeyError) as e:
+            logger.warning(f"股票 {stock_code} 的本地覆盖区间文件损坏，将重新下载: {e}")
+            return None
+
+    def missing_ranges(
+        self,
+        stock_code: str,
+        start: pd.Timestamp,
+        end: pd.Timestamp
+    ) -> List[Tuple[pd.Timestamp, pd.Timestamp]]:
+        """计算 [start, end] 中尚未同步的日期区间
+
+        补齐后本地覆盖区间始终是一个连续区间，因此最多返回头、尾两段。
+        """
+        if start > end:
+            return []
+
+        covered = self.coverage(stock_code)
+        if covered is None:
+            return [(start, end)]
+
+        covered_start, covered_end = covered
+        one_day = pd.Timedelta(days=1)
+        ranges = []
+        if start < covered_start:
+            ranges.append((start, covered_start - one_day))
+        if end > covered_end:
+            ranges.append((covered_end + one_day, end))
+        return ranges
+
+    def _load(self, stock_code: str) -> Optional[np.ndarray]:
+        path = self._bar_path(stock_code)
+        if not os.path.exists(path):
+            return None
+        return np.load(path, mmap_mode='r')
+
+    def read_bars(self, stock_code: str, start: pd.Timestamp, end: pd.Timestamp) -> np.ndarray:
+        """读取 [start, end] 区间内的K线，返回结构化数组副本"""
+        bars = self._load(stock_code)
+        if bars is None or len(bars) == 0:
+            return np.empty(0, dtype=BAR_DTYPE)
+
+        dates = bars['date']
+        lo = np.searchsorted(dates, np.datetime64(start.date(), 'D'), side='left')
+        hi = np.searchsorted(dates, np.datetime64(end.date(), 'D'), side='right')
+        result = np.array(bars[lo:hi])
+        del bars
+        return result
+
+    def read(self, stock_code: str, start: pd.Timestamp, end: pd.Timestamp) -> pd.DataFrame:
+        """读取 [start, end] 区间内的K线，返回与 akshare 重命名后一致的 DataFrame"""
+        return bars_to_frame(stock_code, self.read_bars(stock_code, start, end))
+
+    def edge_bars(self, stock_code: str) -> np.ndarray:
+        """返回本地第一根和最后一根K线，用于校验复权价格是否发生变化"""
+        bars = self._load(stock_code)
+        if bars is None or len(bars) == 0:
+            return np.empty(0, dtype=BAR_DTYPE)
+        result = np.array(bars[[0, -1]])
+        del bars
+        return result
+
+    def write(
+        self,
+        stock_code: str,
+        df: pd.DataFrame,
+        start: pd.Timestamp,
+        end: pd.Timestamp,
+        replace: bool = False
+    ) -> None:
+        """把 [start, end] 区间内下载到的K线合并进本地仓库并扩展覆盖区间
+
+        Args:
+            stock_code: 股票代码
+            df: 新下载的K线（英文列名）
+            start: 本次同步的开始日期
+            end: 本次同步的结束日期
+            replace: 为 True 时丢弃本地已有数据（复权基准变化后全量重建）
+        """
+        new_bars = frame_to_bars(df)
+
+        old_bars = None if replace else self._load(stock_code)
+        if old_bars is not None and len(old_bars) > 0:
+            # 新数据优先：先放新数据，按日期去重时保留第一次出现的记录
+            merged = np.concatenate([new_bars, np.array(old_bars)])
+            del old_bars
+            _, first_idx = np.unique(merged['date'], return_index=True)
+            merged = merged[first_idx]
+        else:
+            merged = np.sort(new_bars, order='date')
+
+        covered = None if replace else self.coverage(stock_code)
+        if covered is not None:
+            start, end = min(start, covered[0]), max(end, covered[1])
+
+        # 先写临时文件再原子替换，读者不会看到写了一半的文件
+        bar_path = self._bar_path(stock_code)
+        tmp_path = f"{bar_path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.save(f, merged)
+        os.replace(tmp_path, bar_path)
+
+        meta_path = self._meta_path(stock_code)
+        tmp_path = f"{meta_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'start': start.strftime('%Y-%m-%d'), 'end': end.strftime('%Y-%m-%d')}, f)
+        os.replace(tmp_path, meta_path)
+
+
+def frame_to_bars(df: pd.DataFrame) -> np.ndarray:
+    """把英文列名的日线 DataFrame 转换为存储用的结构化数组"""
+    bars = np.empty(len(df), dtype=BAR_DTYPE)
+    if len(df) == 0:
+        return bars
+    bars['date'] = pd.to_datetime(df['date']).values.astype('datetime64[D]')
+    for column in BAR_COLUMNS:
+        bars[column] = pd.to_numeric(df[column], errors='coerce').values if column in df else np.nan
+    return bars
+
+
+def bars_to_frame(stock_code: str, bars: np.ndarray) -> pd.DataFrame:
+    """把结构化数组转换回 DataFrame，列与 StockDataService.get_daily_data 的返回值一致"""
+    if len(bars) == 0:
+        return pd.DataFrame()
+    df = pd.DataFrame({'date': bars['date'].astype('datetime64[ns]')})
+    for column in BAR_COLUMNS:
+        df[column] = bars[column]
+    df['code'] = stock_code
+    return df
+
+
+_default_store: Optional[DailyBarStore] = None
+_default_store_guard = threading.Lock()
+
+
+def get_bar_store() -> DailyBarStore:
+    """获取进程内共享的日线仓库（所有 StockDataService 实例共用同一组文件锁）"""
+    global _default_store
+    with _default_store_guard:
+        if _default_store is None:
+            _default_store = DailyBarStore(settings.DAILY_BAR_DIR)
+        return _default_store
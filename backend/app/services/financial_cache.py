@@ -0,0 +1,145 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Optional, Tuple
+import logging
+
+import akshare as ak
+import pandas as pd
+
+from ..core.config import settings
+from ..core.concurrency import call_with_retry, get_io_executor
+
+logger = logging.getLogger(__name__)
+
+
+def latest_report_period(date: Optional[datetime] = None) -> str:
+    """返回 date 之前最近一个已经结束的报告期（季度末），格式 YYYY-MM-DD"""
+    date = pd.Timestamp(date or datetime.now()).normalize()
+    quarter_end = date - pd.offsets.QuarterEnd(0)
+    if quarter_end >= date:
+        quarter_end = date - pd.offsets.QuarterEnd(1)
+    return quarter_end.strftime('%Y-%m-%d')
+
+
+# 各报告期的法定披露截止日（月, 日, 跨年）：一季报 4/30，半年报 8/31，三季报 10/31，年报次年 4/30
+_DISCLOSURE_DEADLINES = {3: (4, 30, 0), 6: (8, 31, 0), 9: (10, 31, 0), 12: (4, 30, 1)}
+
+
+def disclosure_deadlines(periods: pd.Series) -> pd.Series:
+    """报告期（季度末）对应的披露截止日，非季度末的日期为 NaT"""
+    periods = pd.to_datetime(periods, errors='coerce')
+    deadlines = pd.Series(pd.NaT, index=periods.index, dtype='datetime64[ns]')
+    for month, (deadline_month, day, years) in _DISCLOSURE_DEADLINES.items():
+        mask = periods.dt.month == month
+        deadlines[mask] = pd.to_datetime({
+            'year': periods[mask].dt.year + years, 'month': deadline_month, 'day': day
+        })
+    return deadlines
+
+
+class ReportPeriodCache:
+    """按股票代码缓存的财务数据（包含全部历史报告期）
+
+    每只股票只保留最近一次下载的数据，期间不再重复下载：请求日期对应的最近报告期已经在数据中时直接使用；
+    数据中最新的报告期早于应有的报告期（公司可能已经披露）时，距上次下载超过 recheck_ttl 秒才重新下载，
+    新数据替换旧数据。下载在共享 IO 线程池中执行并占用数据源请求名额，同一只股票的并发请求共用一次下载。
+
+    as_of 只返回在指定日期已经可以获得的报告期：日期不早于下载当天时可以使用下载到的全部报告期，
+    更早的历史日期只使用披露截止日不晚于该日期的报告期，避免历史回放用到当时尚未公布的财报。
+    """
+
+    def __init__(self, loader: Callable[[str], pd.DataFrame], name: str, period_column: str,
+                 recheck_ttl: Optional[float] = None):
+        self.loader = loader
+        self.name = name
+        self.period_column = period_column
+        self.recheck_ttl = settings.FINANCIAL_RECHECK_TTL if recheck_ttl is None else recheck_ttl
+        self._lock = threading.Lock()
+        # 股票代码 -> (下载任务, 提交时的 monotonic 时间, 提交时间)
+        self._entries: Dict[str, Tuple[Future, float, datetime]] = {}
+
+    def _latest_period(self, frame: pd.DataFrame) -> pd.Timestamp:
+        if frame is None or frame.empty or self.period_column not in frame.columns:
+            return pd.NaT
+        return pd.to_datetime(frame[self.period_column], errors='coerce').max()
+
+    def _stale(self, entry: Tuple[Future, float, datetime], date: Optional[datetime]) -> bool:
+        future, submitted, _ = entry
+        if not future.done():
+            return False
+        if future.exception() is not None:
+            return True
+        latest = self._latest_period(future.result())
+        expected = pd.Timestamp(latest_report_period(date))
+        if pd.notna(latest) and latest >= expected:
+            return False
+        return time.monotonic() - submitted >= self.recheck_ttl
+
+    def _entry(self, stock_code: str, date: Optional[datetime]) -> Tuple[Future, float, datetime]:
+        with self._lock:
+            entry = self._entries.get(stock_code)
+            if entry is None or self._stale(entry, date):
+                future = get_io_executor().submit(call_with_retry, self.loader, stock_code)
+                entry = (future, time.monotonic(), datetime.now())
+                self._entries[stock_code] = entry
+            return entry
+
+    def _future(self, stock_code: str, date: Optional[datetime]) -> Future:
+        return self._entry(stock_code, date)[0]
+
+    def prefetch(self, stock_codes: Iterable[str], date: Optional[datetime] = None):
+        """为一批股票提交下载（不等待），之后的 get 直接取结果"""
+        for stock_code in stock_codes:
+            self._future(stock_code, date)
+
+    def get(self, stock_code: str, date: Optional[datetime] = None) -> pd.DataFrame:
+        """同步获取下载到的全部报告期，date 用于判断缓存是否缺少应有的报告期，默认为当前时间"""
+        return self._future(stock_code, date).result()
+
+    async def aget(self, stock_code: str, date: Optional[datetime] = None) -> pd.DataFrame:
+        """异步获取，不阻塞事件循环"""
+        return await asyncio.wrap_future(self._future(stock_code, date))
+
+    def _available(self, frame: pd.DataFrame, date: Optional[datetime], fetched_at: datetime) -> pd.DataFrame:
+        if frame is None or frame.empty or self.period_column not in frame.columns:
+            return pd.DataFrame() if frame is None else frame.iloc[:0]
+        date = pd.Timestamp(date or datetime.now()).normalize()
+        periods = pd.to_datetime(frame[self.period_column], errors='coerce')
+        if date >= pd.Timestamp(fetched_at).normalize():
+            available = periods.notna() & (periods < date)
+        else:
+            available = disclosure_deadlines(periods) <= date
+        return frame[available.to_numpy()].assign(**{self.period_column: periods[available]}).sort_values(
+            self.period_column, ascending=False, ignore_index=True
+        )
+
+    def as_of(self, stock_code: str, date: Optional[datetime] = None) -> pd.DataFrame:
+        """date 当天已经可以获得的报告期，按报告期从新到旧排列"""
+        future, _, fetched_at = self._entry(stock_code, date)
+        return self._available(future.result(), date, fetched_at)
+
+    async def aas_of(self, stock_code: str, date: Optional[datetime] = None) -> pd.DataFrame:
+        future, _, fetched_at = self._entry(stock_code, date)
+        return self._available(await asyncio.wrap_future(future), date, fetched_at)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# 同花顺财务摘要（按报告期）
+financial_abstract_cache = ReportPeriodCache(
+    lambda stock_code: ak.stock_financial_abstract_ths(symbol=stock_code, indicator="按报告期"),
+    name="stock_financial_abstract_ths",
+    period_column="报告期"
+)
+
+# 新浪财务分析指标
+financial_indicator_cache = ReportPeriodCache(
+    lambda stock_code: ak.stock_financial_analysis_indicator(stock=stock_code),
+    name="stock_financial_analysis_indicator",
+    period_column="日期"
+)
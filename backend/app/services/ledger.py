@@ -0,0 +1,221 @@
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+SIDE_BUY = 1
+SIDE_SELL = -1
+
+TRADE_DTYPE = np.dtype([
+    ('day', np.int32),      # 成交日在 dates 中的下标
+    ('symbol', np.int32),   # 股票整数编号
+    ('side', np.int8),      # 1 买入，-1 卖出
+    ('price', np.float64),
+    ('shares', np.float64),
+    ('amount', np.float64),  # 买入为成本，卖出为收入（不含手续费）
+    ('commission', np.float64),
+])
+
+
+def commission(amount: float, rate: float, minimum: float) -> float:
+    """成交金额对应的手续费：按费率计算且不低于最低手续费，没有成交金额时为 0"""
+    if amount <= 0:
+        return 0.0
+    return max(amount * rate, minimum)
+
+
+class Ledger:
+    """回测账户的数组化持仓与成交账本
+
+    股票代码在首次出现时分配连续的整数编号，持仓股数、持仓成本和最新价都存放在按编号索引的 NumPy 数组中；
+    成交追加到预分配（容量不足时翻倍）的结构化数组，每日净值写入预分配的浮点数组。
+    逐日盯市是一次 shares · last_price 点积，只在回测结束时才转换为 DataFrame 或字典列表。
+    每笔买卖按 commission 从资金中扣除手续费；费率和最低手续费默认为 0，回测结果与不计手续费时一致。
+    """
+
+    def __init__(self, initial_capital: float, capacity: int = 1024,
+                 commission_rate: float = 0.0, min_commission: float = 0.0):
+        self.initial_capital = initial_capital
+        self.cash = initial_capital
+        self.commission_rate = commission_rate
+        self.min_commission = min_commission
+
+        self.codes: List[str] = []
+        self._code_index = pd.Index([], dtype=object)
+        self.held = np.zeros(0, dtype=bool)  # 买入后到卖出前为 True（买入 0 股也算持仓）
+        self.shares = np.zeros(0)
+        self.cost_basis = np.zeros(0)
+        self.last_price = np.zeros(0)  # 没有已知价格的股票为 0，盯市时不计入
+
+        self._trades = np.empty(capacity, dtype=TRADE_DTYPE)
+        self._n_trades = 0
+
+        self.dates: List[str] = []
+        self._values = np.empty(capacity)
+        self._invested = np.empty(capacity)
+
+    # ---- 股票编号 ----
+
+    def symbol_ids(self, codes: Iterable[str]) -> np.ndarray:
+        """股票代码转换为整数编号，新代码自动分配编号"""
+        codes = np.asarray(list(codes), dtype=object)
+        ids = self._code_index.get_indexer(codes)
+        missing = ids < 0
+        if missing.any():
+            new_codes = pd.unique(codes[missing])
+            self.codes.extend(new_codes)
+            self._code_index = pd.Index(self.codes, dtype=object)
+            extra = len(new_codes)
+            self.held = np.concatenate([self.held, np.zeros(extra, dtype=bool)])
+            self.shares = np.concatenate([self.shares, np.zeros(extra)])
+            self.cost_basis = np.concatenate([self.cost_basis, np.zeros(extra)])
+            self.last_price = np.concatenate([self.last_price, np.zeros(extra)])
+            ids = self._code_index.get_indexer(codes)
+        return ids
+
+    def symbol_id(self, code: str) -> int:
+        return int(self.symbol_ids([code])[0])
+
+    # ---- 成交 ----
+
+    @property
+    def current_day(self) -> int:
+        """尚未记录净值的当前交易日下标"""
+        return len(self.dates)
+
+    def holds(self, symbol: int) -> bool:
+        return bool(self.held[symbol])
+
+    def _append_trade(self, day: int, symbol: int, side: int, price: float, shares: float, amount: float, fee: float):
+        if self._n_trades == len(self._trades):
+            self._trades = np.resize(self._trades, 2 * len(self._trades))
+        self._trades[self._n_trades] = (day, symbol, side, price, shares, amount, fee)
+        self._n_trades += 1
+
+    def commission(self, amount: float) -> float:
+        return commission(amount, self.commission_rate, self.min_commission)
+
+    def buy_cost(self, price: float, shares: float) -> float:
+        """买入需要的资金（成交金额 + 手续费），用于判断资金是否足够"""
+        amount = shares * price
+        return amount + self.commission(amount)
+
+    def buy(self, symbol: int, price: float, shares: float, day: Optional[int] = None) -> float:
+        """买入并返回成交金额（不含手续费），持仓成本包含手续费"""
+        cost = shares * price
+        fee = self.commission(cost)
+        self.cash -= cost + fee
+        self.held[symbol] = True
+        self.shares[symbol] += shares
+        self.cost_basis[symbol] += cost + fee
+        self._append_trade(self.current_day if day is None else day, symbol, SIDE_BUY, price, shares, cost, fee)
+        return cost
+
+    def sell(self, symbol: int, price: float, day: Optional[int] = None) -> float:
+        """卖出全部持仓并返回成交金额（不含手续费）"""
+        shares = self.shares[symbol]
+        revenue = shares * price
+        fee = self.commission(revenue)
+        self.cash += revenue - fee
+        self.held[symbol] = False
+        self.shares[symbol] = 0.0
+        self.cost_basis[symbol] = 0.0
+        self._append_trade(self.current_day if day is None else day, symbol, SIDE_SELL, price, shares, revenue, fee)
+        return revenue
+
+    # ---- 盯市 ----
+
+    def update_prices(self, symbols: np.ndarray, prices: np.ndarray):
+        """更新最新价；同一只股票出现多次时以最后一次为准"""
+        symbols = np.asarray(symbols)
+        prices = np.asarray(prices, dtype=float)
+        if len(symbols) and len(np.unique(symbols)) != len(symbols):
+            reversed_symbols = symbols[::-1]
+            _, last = np.unique(reversed_symbols, return_index=True)
+            symbols, prices = reversed_symbols[last], prices[::-1][last]
+        self.last_price[symbols] = prices
+
+    def market_value(self) -> float:
+        return float(np.dot(self.shares, self.last_price))
+
+    def _reserve_days(self, size: int):
+        if size > len(self._values):
+            capacity = max(size, 2 * len(self._values))
+            self._values = np.resize(self._values, capacity)
+            self._invested = np.resize(self._invested, capacity)
+
+    def record_value(self, date: str) -> float:
+        """记录当天收盘后的净值"""
+        day = self.current_day
+        self._reserve_days(day + 1)
+        invested = self.market_value()
+        self._invested[day] = invested
+        self._values[day] = self.cash + invested
+        self.dates.append(date)
+        return self._values[day]
+
+    def record_values(self, dates: Iterable[str], values: np.ndarray, invested: np.ndarray):
+        """批量写入净值（向量化回测一次性算出整段净值时使用）"""
+        dates = list(dates)
+        start = self.current_day
+        self._reserve_days(start + len(dates))
+        self._values[start:start + len(dates)] = values
+        self._invested[start:start + len(dates)] = invested
+        self.dates.extend(dates)
+
+    # ---- 结果转换 ----
+
+    @property
+    def values(self) -> np.ndarray:
+        return self._values[:self.current_day]
+
+    @property
+    def invested(self) -> np.ndarray:
+        return self._invested[:self.current_day]
+
+    @property
+    def trades(self) -> np.ndarray:
+        return self._trades[:self._n_trades]
+
+    def positions(self) -> Dict[str, float]:
+        held = np.flatnonzero(self.held)
+        return {self.codes[i]: self.shares[i] for i in held}
+
+    def daily_values_frame(self) -> pd.DataFrame:
+        return pd.DataFrame({'date': self.dates, 'value': self.values})
+
+    def trades_frame(self) -> pd.DataFrame:
+        trades = self.trades
+        codes = np.asarray(self.codes, dtype=object)
+        dates = np.asarray(self.dates + [None], dtype=object)  # 未记录净值的当天成交
+        return pd.DataFrame({
+            'date': dates[np.minimum(trades['day'], len(self.dates))],
+            'code': codes[trades['symbol']] if len(trades) else np.array([], dtype=object),
+            'type': np.where(trades['side'] == SIDE_BUY, 'buy', 'sell'),
+            'price': trades['price'],
+            'shares': trades['shares'],
+            'amount': trades['amount'],
+            'commission': trades['commission'],
+        })
+
+    def daily_values_records(self) -> List[Dict]:
+        return [{'date': d, 'value': v} for d, v in zip(self.dates, self.values.tolist())]
+
+    def transaction_records(self) -> List[Dict]:
+        """成交记录转换为字典列表，买入带 cost、卖出带 revenue 字段（均不含手续费），另带 commission 字段"""
+        frame = self.trades_frame()
+        records = []
+        for date, code, side, price, shares, amount, fee in zip(
+            frame['date'], frame['code'], frame['type'],
+            frame['price'].tolist(), frame['shares'].tolist(), frame['amount'].tolist(), frame['commission'].tolist()
+        ):
+            records.append({
+                'date': date,
+                'code': code,
+                'type': side,
+                'price': price,
+                'shares': shares,
+                'cost' if side == 'buy' else 'revenue': amount,
+                'commission': fee
+            })
+        return records
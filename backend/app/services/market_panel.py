@@ -0,0 +1,42 @@
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+
+
+class MarketPanel:
+    """按日期排序的多股票日线面板
+
+    构造时对整段数据做一次稳定排序（同一天内保持原有股票顺序），
+    之后按交易日或日期区间取数都是对排序后日期数组的二分查找加连续切片，
+    不再需要每天对全表做布尔筛选。
+    """
+
+    def __init__(self, data: pd.DataFrame):
+        if data.empty:
+            data = pd.DataFrame(columns=['date', 'code', 'close', 'volume'])
+        data = data.assign(date=pd.to_datetime(data['date']))
+        self.data = data.sort_values('date', kind='stable').reset_index(drop=True)
+        self.dates = self.data['date'].to_numpy(dtype='datetime64[ns]')
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def bounds(self, start, end) -> Tuple[int, int]:
+        """[start, end] 日期区间对应的行号范围"""
+        lo = np.searchsorted(self.dates, np.datetime64(pd.Timestamp(start), 'ns'), side='left')
+        hi = np.searchsorted(self.dates, np.datetime64(pd.Timestamp(end), 'ns'), side='right')
+        return int(lo), int(hi)
+
+    def between(self, start, end) -> pd.DataFrame:
+        """[start, end] 日期区间内的全部行"""
+        lo, hi = self.bounds(start, end)
+        return self.data.iloc[lo:hi]
+
+    def day(self, date) -> pd.DataFrame:
+        """某一天的全部行"""
+        return self.between(date, date)
+
+    def trading_dates(self) -> pd.DatetimeIndex:
+        """面板中出现过的所有日期"""
+        return pd.DatetimeIndex(np.unique(self.dates))
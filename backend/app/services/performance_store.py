@@ -0,0 +1,280 @@
+import logging
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import bindparam, case, delete, func, insert, select, update
+
+from ..models.strategy import Performance, Strategy, Transaction
+from ..core.config import settings
+from .analysis import EquityStream, PerformanceAnalyzer
+from .ledger import commission
+
+logger = logging.getLogger(__name__)
+
+
+class PerformanceStore:
+    """策略每日净值和成交的物化存储
+
+    回测和实盘选股只批量写入原始数据（每天的总资产、现金、持仓数和当天成交），
+    refresh 再从最后一个已计算的交易日继续，向量化算出之后每一行的 daily_return、cumulative_return 和 drawdown。
+    最后一行的 metrics 保存截至当天的指标和 EquityStream 的状态（检查点），
+    下一次 refresh 从检查点恢复，不再读取和重算更早的净值。看板直接读取这些预计算的行。
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    def get_or_create_strategy(self, name: str, type: str, description: str = '', parameters: Optional[Dict] = None) -> int:
+        strategy_id = self.db.execute(select(Strategy.id).where(Strategy.name == name)).scalar()
+        if strategy_id is None:
+            strategy = Strategy(name=name, type=type, description=description, parameters=parameters)
+            self.db.add(strategy)
+            self.db.flush()
+            strategy_id = strategy.id
+        return strategy_id
+
+    def write_daily(self, strategy_id: int, rows: List[Dict]):
+        """批量写入每日净值（date/total_value/cash_balance/position_count）
+
+        rows 按日期升序；数据库中同一策略从第一行日期起的旧记录先删除，重复写入同一段日期结果不变。
+        """
+        if not rows:
+            return
+        self.db.execute(delete(Performance).where(
+            Performance.strategy_id == strategy_id, Performance.date >= rows[0]['date']
+        ))
+        now = datetime.now()
+        self.db.execute(insert(Performance.__table__), [
+            {
+                'strategy_id': strategy_id,
+                'date': row['date'],
+                'total_value': float(row['total_value']),
+                'cash_balance': float(row['cash_balance']),
+                'position_count': int(row['position_count']),
+                'created_at': now,
+            }
+            for row in rows
+        ])
+
+    def write_transactions(self, strategy_id: int, trades: List[Dict], since: Optional[datetime] = None):
+        """批量写入成交（date/code/type/price/shares/amount），since 之后的旧成交先删除"""
+        since = since or (trades[0]['date'] if trades else None)
+        if since is None:
+            return
+        self.db.execute(delete(Transaction).where(
+            Transaction.strategy_id == strategy_id, Transaction.trade_date >= since
+        ))
+        if trades:
+            self.db.execute(insert(Transaction.__table__), [
+                {
+                    'strategy_id': strategy_id,
+                    'stock_code': trade['code'],
+                    'trade_type': trade['type'],
+                    'price': float(trade['price']),
+                    'shares': int(trade['shares']),
+                    'amount': float(trade['amount']),
+                    'trade_date': trade['date'],
+                }
+                for trade in trades
+            ])
+
+    def _checkpoint(self, strategy_id: int):
+        """最后一个保存了 metrics 的交易日及其 EquityStream 状态"""
+        return self.db.execute(
+            select(Performance.date, Performance.metrics)
+            .where(Performance.strategy_id == strategy_id, Performance.metrics.isnot(None))
+            .order_by(Performance.date.desc())
+            .limit(1)
+        ).first()
+
+    def refresh(self, strategy_id: int, risk_free_rate: float = 0.03, rolling_window: int = 63) -> int:
+        """从检查点之后继续计算滚动指标，返回更新的行数"""
+        checkpoint = self._checkpoint(strategy_id)
+        query = select(Performance.id, Performance.date, Performance.total_value, Performance.cash_balance).where(
+            Performance.strategy_id == strategy_id
+        )
+        if checkpoint is not None and checkpoint.metrics.get('state'):
+            stream = EquityStream.from_state(checkpoint.metrics['state'])
+            query = query.where(Performance.date > checkpoint.date)
+        else:
+            stream = EquityStream(rolling_window)
+        rows = self.db.execute(query.order_by(Performance.date)).all()
+        if not rows:
+            return 0
+
+        ids = np.fromiter((row.id for row in rows), dtype=np.int64, count=len(rows))
+        values = np.fromiter((row.total_value for row in rows), dtype=float, count=len(rows))
+        cash = np.fromiter((row.cash_balance for row in rows), dtype=float, count=len(rows))
+
+        # 与 EquityStream 同一口径：第一天收益率为 0，回撤相对包括检查点之前的历史最高净值
+        previous = values[0] if stream.count == 0 else stream.last_value
+        with np.errstate(divide='ignore', invalid='ignore'):
+            daily_returns = values / np.concatenate([[previous], values[:-1]]) - 1
+            peaks = np.maximum.accumulate(np.maximum(values, stream.peak))
+            drawdowns = values / peaks - 1
+        first_value = values[0] if stream.count == 0 else stream.first_value
+        cumulative_returns = values / first_value - 1
+        stream.update(values, values - cash)
+
+        self.db.execute(
+            update(Performance.__table__).where(Performance.__table__.c.id == bindparam('b_id')),
+            [
+                {'b_id': int(i), 'daily_return': _finite(r), 'cumulative_return': _finite(c), 'drawdown': _finite(d)}
+                for i, r, c, d in zip(ids, daily_returns, cumulative_returns, drawdowns)
+            ]
+        )
+
+        last_date = rows[-1].date
+        total_trades = self.db.execute(
+            select(func.count()).select_from(Transaction)
+            .where(Transaction.strategy_id == strategy_id, Transaction.trade_date <= last_date)
+        ).scalar()
+        analyzer = PerformanceAnalyzer(initial_capital=first_value, risk_free_rate=risk_free_rate, rolling_window=stream.rolling_window)
+        metrics = {
+            **analyzer.equity_metrics(stream),
+            'total_trades': total_trades,
+            'state': stream.to_state(),
+        }
+        self.db.execute(update(Performance).where(Performance.id == int(ids[-1])).values(metrics=metrics))
+        return len(rows)
+
+    def refresh_all(self) -> Dict[int, int]:
+        """刷新全部有新净值的策略"""
+        updated = {}
+        for strategy_id in self.db.execute(select(Performance.strategy_id).distinct()).scalars().all():
+            updated[strategy_id] = self.refresh(strategy_id)
+        return updated
+
+
+def _finite(value: float) -> Optional[float]:
+    value = float(value)
+    return value if np.isfinite(value) else None
+
+
+def daily_rows_from_ledger(ledger) -> List[Dict]:
+    """回测账本转换为每日净值行：现金 = 净值 - 持仓市值，持仓数按成交逐日累计"""
+    trades = ledger.trades
+    n_days = ledger.current_day
+    delta = np.zeros(n_days + 1, dtype=np.int64)
+    held = np.zeros(len(ledger.codes), dtype=bool)
+    for day, symbol, side in zip(trades['day'].tolist(), trades['symbol'].tolist(), trades['side'].tolist()):
+        if side > 0 and not held[symbol]:
+            held[symbol] = True
+            delta[day] += 1
+        elif side < 0 and held[symbol]:
+            held[symbol] = False
+            delta[day] -= 1
+    positions = np.cumsum(delta)[:n_days]
+
+    values = ledger.values
+    invested = ledger.invested
+    dates = pd.to_datetime(ledger.dates).to_pydatetime()
+    return [
+        {'date': date, 'total_value': value, 'cash_balance': value - market_value, 'position_count': count}
+        for date, value, market_value, count in zip(dates, values.tolist(), invested.tolist(), positions.tolist())
+    ]
+
+
+def trades_from_ledger(ledger) -> List[Dict]:
+    """回测账本中已记录净值的交易日上的成交"""
+    frame = ledger.trades_frame()
+    frame = frame[frame['date'].notna()]
+    return [
+        {'date': date, 'code': code, 'type': side, 'price': price, 'shares': shares, 'amount': amount}
+        for date, code, side, price, shares, amount in zip(
+            pd.DatetimeIndex(frame['date']).to_pydatetime(), frame['code'], frame['type'],
+            frame['price'].tolist(), frame['shares'].tolist(), frame['amount'].tolist()
+        )
+    ]
+
+
+def persist_backtest(db, name: str, ledger, parameters: Dict) -> int:
+    """保存一次回测的每日净值和成交并计算滚动指标，返回策略 ID"""
+    store = PerformanceStore(db)
+    strategy_id = store.get_or_create_strategy(name, 'backtest', parameters=parameters)
+    daily = daily_rows_from_ledger(ledger)
+    if daily:
+        store.write_transactions(strategy_id, trades_from_ledger(ledger), since=daily[0]['date'])
+        store.write_daily(strategy_id, daily)
+        store.refresh(strategy_id)
+    db.commit()
+    return strategy_id
+
+
+def _live_commission(amount: float) -> float:
+    return commission(amount, settings.COMMISSION_RATE, settings.MIN_COMMISSION)
+
+
+def record_live_day(db, name: str, trade_date: datetime, trades: Iterable[Dict], prices: Dict[str, float],
+                    initial_capital: float, position_size: float) -> Dict:
+    """把实盘选股当天的信号按模拟账户记账，写入当天的成交和净值并刷新指标
+
+    账户从 initial_capital 开始，每个买入信号按 position_size 买入整手，卖出信号卖出该股票全部持仓；
+    每笔成交按 commission（COMMISSION_RATE / MIN_COMMISSION）从资金中扣除手续费，
+    与回测账本（Ledger）一样，资金不足以支付成交金额和手续费时放弃买入；
+    持仓由之前的成交汇总得到，按 prices（当天收盘价/最新价）盯市，缺少价格时用该股票最近一次成交价。
+    同一天重复运行时先删除当天已写入的成交和净值。
+    """
+    store = PerformanceStore(db)
+    strategy_id = store.get_or_create_strategy(name, 'live', description='布林带实盘选股模拟账户')
+    day = datetime(trade_date.year, trade_date.month, trade_date.day)
+
+    previous_cash = db.execute(
+        select(Performance.cash_balance)
+        .where(Performance.strategy_id == strategy_id, Performance.date < day)
+        .order_by(Performance.date.desc())
+        .limit(1)
+    ).scalar()
+    cash = initial_capital if previous_cash is None else previous_cash
+
+    signed_shares = func.sum(case((Transaction.trade_type == 'buy', Transaction.shares), else_=-Transaction.shares))
+    holdings = dict(db.execute(
+        select(Transaction.stock_code, signed_shares)
+        .where(Transaction.strategy_id == strategy_id, Transaction.trade_date < day)
+        .group_by(Transaction.stock_code)
+        .having(signed_shares > 0)
+    ).all())
+
+    records = []
+    for trade in trades:
+        code, price = trade['code'], float(trade['price'])
+        if trade['type'] == 'sell':
+            shares = holdings.pop(code, 0)
+            if not shares:
+                continue
+            amount = shares * price
+            cash += amount - _live_commission(amount)
+        else:
+            shares = int(position_size / price / 100) * 100 if price > 0 else 0
+            if not shares:
+                continue
+            amount = shares * price
+            fee = _live_commission(amount)
+            if amount + fee > cash:
+                logger.info(f"{name} {day.date()} 资金不足，放弃买入 {code}：需要 {amount + fee:.2f}，可用 {cash:.2f}")
+                continue
+            cash -= amount + fee
+            holdings[code] = holdings.get(code, 0) + shares
+        records.append({'date': day, 'code': code, 'type': trade['type'], 'price': price, 'shares': shares, 'amount': amount})
+
+    last_prices = {record['code']: record['price'] for record in records}
+    missing = [code for code in holdings if code not in prices and code not in last_prices]
+    if missing:
+        logger.warning(f"{name} {day.date()} 行情中缺少 {len(missing)} 只持仓股票的价格，按最近一次成交价估值: {missing}")
+    for code in missing:
+        last_prices[code] = db.execute(
+            select(Transaction.price)
+            .where(Transaction.strategy_id == strategy_id, Transaction.stock_code == code)
+            .order_by(Transaction.trade_date.desc())
+            .limit(1)
+        ).scalar() or 0.0
+    invested = sum(shares * prices.get(code, last_prices.get(code, 0.0)) for code, shares in holdings.items())
+
+    row = {'date': day, 'total_value': cash + invested, 'cash_balance': cash, 'position_count': len(holdings)}
+    store.write_transactions(strategy_id, records, since=day)
+    store.write_daily(strategy_id, [row])
+    store.refresh(strategy_id)
+    db.commit()
+    return row
@@ -0,0 +1,125 @@
+import logging
+from typing import Dict, List, Sequence, Tuple
+
+import pandas as pd
+
+from ..strategies.base import BaseStrategy
+from .analysis import PerformanceAnalyzer
+from .backtest import BacktestService
+from .stock_data import StockDataService
+from ..utils.trading_calendar import get_trading_calendar
+
+logger = logging.getLogger(__name__)
+
+
+class PortfolioBacktestService:
+    """多策略组合回测
+
+    所有策略共用一次股票池获取、一次日线加载（各策略股票池的并集，预热区间取最长）
+    和同一份回测交易日索引。每个策略按分配的资金在独立的账户中运行，
+    输入的数据与单独运行该策略时完全相同，因此单个策略的结果和单独回测一致；
+    组合净值为各策略净值与未分配资金之和。
+    """
+
+    def __init__(self, initial_capital: float = 1000000):
+        self.initial_capital = initial_capital
+        self.stock_data_service = StockDataService()
+        self.analyzer = PerformanceAnalyzer(initial_capital)
+
+    @staticmethod
+    def _strategy_names(strategies: Sequence[BaseStrategy]) -> List[str]:
+        """策略名称，重名时追加序号区分"""
+        names, seen = [], {}
+        for strategy in strategies:
+            seen[strategy.name] = seen.get(strategy.name, 0) + 1
+            names.append(strategy.name if seen[strategy.name] == 1 else f"{strategy.name}#{seen[strategy.name]}")
+        return names
+
+    async def run_backtest(
+        self,
+        allocations: Sequence[Tuple[BaseStrategy, float]],
+        start_date: str,
+        end_date: str,
+        precompute: bool = True,
+        vectorized: bool = True
+    ) -> Dict:
+        """运行组合回测
+
+        Args:
+            allocations: (策略, 资金占比) 列表，占比之和不能超过 1，剩余部分作为现金
+            start_date: 开始日期
+            end_date: 结束日期
+            precompute, vectorized: 同 BacktestService.run_backtest
+
+        Returns:
+            {'metrics', 'daily_values', 'strategies'}，strategies 中每项包含
+            name/allocation/initial_capital/metrics/daily_values/transactions
+        """
+        if not allocations:
+            raise ValueError("至少需要一个策略")
+        weights = [weight for _, weight in allocations]
+        if any(weight <= 0 for weight in weights) or sum(weights) > 1 + 1e-9:
+            raise ValueError("资金占比必须为正数且总和不超过 1")
+
+        strategies = [strategy for strategy, _ in allocations]
+        accounts = []
+        for strategy, weight in allocations:
+            account = BacktestService(initial_capital=self.initial_capital * weight)
+            account.stock_data_service = self.stock_data_service
+            accounts.append(account)
+
+        # 股票池和日线数据只加载一次
+        universe = await self.stock_data_service.get_main_board_stock_list()
+        selections = [strategy.select_stocks("ss", universe) for strategy in strategies]
+        data_starts = [account.get_data_start(strategy, start_date) for account, strategy in zip(accounts, strategies)]
+
+        all_codes = list(dict.fromkeys(code for codes in selections for code in codes))
+        all_stock_data = await self.stock_data_service.get_batch_daily_data(
+            all_codes,
+            min(data_starts, key=pd.Timestamp),
+            end_date
+        )
+        by_code = {code: frame for code, frame in all_stock_data.groupby('code', sort=False)} if not all_stock_data.empty else {}
+
+        # 所有策略共用同一份交易日索引
+        trading_days = get_trading_calendar().range(start_date, end_date)
+
+        results = []
+        for name, account, strategy, weight, codes, data_start in zip(
+            self._strategy_names(strategies), accounts, strategies, weights, selections, data_starts
+        ):
+            # 按该策略自己的股票顺序和预热区间切出数据，与单独回测时加载的数据一致
+            frames = [by_code[code] for code in codes if code in by_code]
+            stock_data = pd.concat(frames, ignore_index=True) if frames else all_stock_data.iloc[0:0]
+            stock_data = stock_data[stock_data['date'] >= pd.Timestamp(data_start)].reset_index(drop=True)
+
+            metrics = await account.run_on_data(
+                strategy, stock_data, start_date, end_date,
+                precompute=precompute, vectorized=vectorized, trading_days=trading_days
+            )
+            results.append({
+                'name': name,
+                'allocation': weight,
+                'initial_capital': account.initial_capital,
+                'metrics': metrics,
+                'daily_values': account.daily_values,
+                'transactions': account.transactions,
+            })
+            logger.info(f"组合回测：策略 {name} 完成，总收益率 {metrics['total_return']:.2%}")
+
+        # 组合净值 = 各策略净值 + 未分配的现金
+        idle_cash = self.initial_capital * (1 - sum(weights))
+        combined_values = [
+            {'date': day[0]['date'], 'value': idle_cash + sum(d['value'] for d in day)}
+            for day in zip(*(result['daily_values'] for result in results))
+        ]
+        combined_transactions = sorted(
+            (dict(t, strategy=result['name']) for result in results for t in result['transactions']),
+            key=lambda t: t['date']
+        )
+
+        return {
+            'metrics': self.analyzer.calculate_metrics(combined_values, combined_transactions),
+            'daily_values': combined_values,
+            'strategies': results,
+        }
@@ -0,0 +1,180 @@
+import logging
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import and_, bindparam, insert, select, update
+
+from ..models.stock import BollSignal
+
+logger = logging.getLogger(__name__)
+
+HOLDING = '持仓中'
+SOLD = '已卖出'
+
+_table = BollSignal.__table__
+
+# 按 (股票代码, 买入时间) 定位一条持仓中的记录，一次 executemany 更新全部卖出
+_sell_statement = (
+    update(_table)
+    .where(and_(
+        _table.c.stock_code == bindparam('b_stock_code'),
+        _table.c.buy_date == bindparam('b_buy_date'),
+        _table.c.trade_status == HOLDING,
+    ))
+    .values(
+        sell_date=bindparam('sell_date'),
+        sell_price=bindparam('sell_price'),
+        profit_rate=bindparam('profit_rate'),
+        holding_period=bindparam('holding_period'),
+        trade_status=SOLD,
+    )
+)
+
+
+def _close_position(buy_date: datetime, buy_price: float, sell_date: datetime, sell_price: float) -> Dict:
+    """卖出一笔持仓时需要写入的字段"""
+    return {
+        'sell_date': sell_date,
+        'sell_price': sell_price,
+        'profit_rate': (sell_price - buy_price) / buy_price * 100,
+        'holding_period': (sell_date - buy_date).days,
+    }
+
+
+class BollSignalWriter:
+    """布林带选股信号的批量写入器
+
+    持仓中的记录在内存中按股票代码索引（每个代码首次出现时用一条 IN 查询从数据库补齐），
+    卖出信号直接按代码查字典配对：尚未写入数据库的买入记录就地补上卖出字段，
+    已写入的持仓汇总成一次 executemany UPDATE；买入记录汇总成一条多行 INSERT。
+    每处理 commit_every 个交易日写库并提交一次，历史回放时可以把一整段区间合并成少数几次提交；
+    on_commit(db, 最后一个信号日期) 在每次提交前、写入信号之后调用，与这批信号在同一个事务中提交，
+    用于记录断点：信号和断点要么一起提交，要么一起回滚，中断后不会重复写入同一天的信号。
+    每笔模拟买卖同时记入 trades（买入价、卖出价和对应的买入价），供写入策略成交表使用。
+    """
+
+    def __init__(self, db, commit_every: int = 1, on_commit: Optional[Callable[[object, datetime], None]] = None):
+        self.db = db
+        self.commit_every = max(commit_every, 1)
+        self.on_commit = on_commit
+        self.last_signal_date: Optional[datetime] = None
+
+        # 已写入数据库的持仓：股票代码 -> [(买入时间, 买入价)]
+        self._open: Dict[str, List[Tuple[datetime, float]]] = {}
+        self._loaded_codes: Set[str] = set()
+        self._all_loaded = False
+
+        # 尚未写入数据库的买入记录（其中仍持仓的也按代码索引）和卖出更新
+        self._pending_inserts: List[Dict] = []
+        self._pending_open: Dict[str, List[Dict]] = {}
+        self._pending_updates: List[Dict] = []
+        self._pending_days = 0
+
+        self.bought = 0
+        self.sold = 0
+        self.trades: List[Dict] = []
+
+    def preload_open_positions(self):
+        """一次性加载数据库中全部持仓，之后不再按代码查询"""
+        self._open = {}
+        for code, buy_date, buy_price in self.db.execute(
+            select(_table.c.stock_code, _table.c.buy_date, _table.c.buy_price)
+            .where(_table.c.trade_status == HOLDING)
+        ):
+            self._open.setdefault(code, []).append((buy_date, buy_price))
+        self._all_loaded = True
+
+    def _load_open_positions(self, codes: Iterable[str]):
+        """为首次出现的股票代码补齐数据库中的持仓记录"""
+        if self._all_loaded:
+            return
+        missing = set(codes) - self._loaded_codes
+        if not missing:
+            return
+        for code, buy_date, buy_price in self.db.execute(
+            select(_table.c.stock_code, _table.c.buy_date, _table.c.buy_price)
+            .where(and_(_table.c.stock_code.in_(missing), _table.c.trade_status == HOLDING))
+        ):
+            self._open.setdefault(code, []).append((buy_date, buy_price))
+        self._loaded_codes |= missing
+
+    def write_day(self, buy_signals: List[Dict], sell_signals: List[Dict], signal_date: datetime) -> Tuple[int, int]:
+        """记录一个交易日的信号：先卖出已有持仓，再登记买入
+
+        Returns:
+            (买入条数, 卖出条数)
+        """
+        # MySQL DATETIME 不保存微秒，统一到秒，保证之后能按买入时间精确定位到这条记录
+        signal_date = signal_date.replace(microsecond=0)
+        sell_prices = {signal['stock_code']: signal['close_price'] for signal in sell_signals}
+        self._load_open_positions(list(sell_prices) + [signal['stock_code'] for signal in buy_signals])
+
+        sold = 0
+        for code, sell_price in sell_prices.items():
+            for row in self._pending_open.pop(code, []):
+                row.update(_close_position(row['buy_date'], row['buy_price'], signal_date, sell_price), trade_status=SOLD)
+                self._record_trade(signal_date, code, 'sell', sell_price, row['buy_price'])
+                sold += 1
+            for buy_date, buy_price in self._open.pop(code, []):
+                self._pending_updates.append({
+                    'b_stock_code': code,
+                    'b_buy_date': buy_date,
+                    **_close_position(buy_date, buy_price, signal_date, sell_price),
+                })
+                self._record_trade(signal_date, code, 'sell', sell_price, buy_price)
+                sold += 1
+
+        for signal in buy_signals:
+            row = {
+                'stock_code': signal['stock_code'],
+                'stock_name': signal['stock_name'],
+                'score': signal.get('score'),
+                'roe': signal.get('roe'),
+                'profit_growth': signal.get('profit_growth'),
+                'gross_margin': signal.get('gross_margin'),
+                'debt_ratio': signal.get('debt_ratio'),
+                'cash_ratio': signal.get('cash_ratio'),
+                'revenue_growth': signal.get('revenue_growth'),
+                'buy_date': signal_date,
+                'buy_price': signal['close_price'],
+                'sell_date': None,
+                'sell_price': None,
+                'profit_rate': None,
+                'holding_period': None,
+                'trade_status': HOLDING,
+            }
+            self._pending_inserts.append(row)
+            self._pending_open.setdefault(row['stock_code'], []).append(row)
+            self._record_trade(signal_date, row['stock_code'], 'buy', row['buy_price'], row['buy_price'])
+
+        self.bought += len(buy_signals)
+        self.sold += sold
+        self.last_signal_date = signal_date
+        self._pending_days += 1
+        if self._pending_days >= self.commit_every:
+            self.commit()
+        return len(buy_signals), sold
+
+    def _record_trade(self, date: datetime, code: str, side: str, price: float, buy_price: float):
+        self.trades.append({'date': date, 'code': code, 'type': side, 'price': price, 'buy_price': buy_price})
+
+    def flush(self):
+        """把缓冲的卖出更新和买入记录写入数据库（不提交）"""
+        if self._pending_updates:
+            self.db.execute(_sell_statement, self._pending_updates)
+        if self._pending_inserts:
+            self.db.execute(insert(_table), self._pending_inserts)
+
+        # 写入后仍在持仓的买入记录转入已写入持仓
+        for code, rows in self._pending_open.items():
+            self._open.setdefault(code, []).extend((row['buy_date'], row['buy_price']) for row in rows)
+        self._pending_updates = []
+        self._pending_inserts = []
+        self._pending_open = {}
+
+    def commit(self):
+        self.flush()
+        if self.on_commit is not None and self.last_signal_date is not None:
+            self.on_commit(self.db, self.last_signal_date)
+        self.db.commit()
+        self._pending_days = 0
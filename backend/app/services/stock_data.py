@@ -1,47 +1,205 @@
 import akshare as ak
+import numpy as np
 import pandas as pd
-from typing import List, Optional, Tuple, Dict
-from datetime import datetime, timedelta
+from typing import AsyncIterator, List, Optional, Tuple, Dict
+from datetime import datetime
+from zoneinfo import ZoneInfo
 import asyncio
-from functools import lru_cache
+import time
 import logging
 
+from ..core.config import settings
+from ..core.cache import TTLSnapshotCache
+from ..core.concurrency import call_with_retry, run_blocking
+from ..utils.trading_calendar import get_trading_calendar
+from .bar_store import get_bar_store
+
 logger = logging.getLogger(__name__)
 
+
+class BatchFetchStats:
+    """一次批量获取的统计信息：耗时分位数、失败列表"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.latencies: List[float] = []
+        self.failures: Dict[str, str] = {}
+
+    def record(self, stock_code: str, latency: float, error: Optional[Exception] = None):
+        self.latencies.append(latency)
+        if error is not None:
+            self.failures[stock_code] = str(error)
+
+    def summary(self) -> Dict:
+        latencies = np.asarray(self.latencies)
+        p50, p90, p99 = np.percentile(latencies, [50, 90, 99]) if len(latencies) else (0.0, 0.0, 0.0)
+        return {
+            'total': len(latencies),
+            'succeeded': len(latencies) - len(self.failures),
+            'failed': len(self.failures),
+            'failed_codes': list(self.failures),
+            'elapsed': round(time.perf_counter() - self.started, 3),
+            'latency_p50': round(float(p50), 3),
+            'latency_p90': round(float(p90), 3),
+            'latency_p99': round(float(p99), 3),
+            'latency_max': round(float(latencies.max()), 3) if len(latencies) else 0.0,
+        }
+
+
 class StockDataService:
     def __init__(self):
-        self.cache_time = timedelta(minutes=30)
+        self.bar_store = get_bar_store()
+        self.last_batch_stats: Optional[Dict] = None
+        self._spot_cache = _spot_cache
     
-    @lru_cache(maxsize=100)
-    async def get_stock_list_all(self) -> List[str]:
-        """获取A股股票列表"""
+    async def get_stock_list_all(self, max_age: Optional[float] = None) -> pd.DataFrame:
+        """获取A股股票列表（不包含ST、退市），max_age 同 get_stock_spot_data"""
         try:
-            stock_info_df = await self.get_stock_spot_data()
-            stock_list = stock_info_df[
-                ~stock_info_df['name'].str.contains('ST|退')]
-            return stock_list
+            stock_info_df = await self._spot_cache.get(max_age)
+            return self._spot_cache.derive('all', _filter_stock_list_all, stock_info_df).copy(deep=False)
         except Exception as e:
             logger.error(f"获取股票列表失败: {e}")
             return pd.DataFrame()
     
-    @lru_cache(maxsize=100)
-    async def get_main_board_stock_list(self) -> List[str]:
-        """获取主板A股股票列表（不包含ST、退市、创业板和科创板）"""
+    async def get_main_board_stock_list(self, max_age: Optional[float] = None) -> pd.DataFrame:
+        """获取主板A股股票列表（不包含ST、退市、创业板和科创板），max_age 同 get_stock_spot_data"""
         try:
-            stock_info_df = await self.get_stock_spot_data()
-            # 过滤ST和退市股票
-            # 过滤创业板（以3开头的股票）和科创板（以688开头的股票）
-            stock_list = stock_info_df[
-                (~stock_info_df['name'].str.contains('ST|退')) & 
-                (~stock_info_df['code'].str.startswith('3')) &
-                (~stock_info_df['code'].str.startswith('688'))
-            ]
-            return stock_list
+            stock_info_df = await self._spot_cache.get(max_age)
+            return self._spot_cache.derive('main_board', _filter_main_board, stock_info_df).copy(deep=False)
         except Exception as e:
             logger.error(f"获取主板股票列表失败: {e}")
             return pd.DataFrame()
-    
 
+    def _fetch_daily_data(
+        self,
+        stock_code: str,
+        start_date: pd.Timestamp,
+        end_date: pd.Timestamp
+    ) -> pd.DataFrame:
+        """从 akshare 下载单个股票的日线数据（阻塞网络请求）"""
+        df = call_with_retry(
+            ak.stock_zh_a_hist,
+            symbol=stock_code,
+            period="daily",
+            start_date=start_date.strftime('%Y%m%d'),
+            end_date=end_date.strftime('%Y%m%d'),
+            adjust="qfq"  # 前复权
+        )
+        if df is None or df.empty:
+            return pd.DataFrame()
+
+        df = df.rename(columns={
+            '日期': 'date',
+            '开盘': 'open',
+            '收盘': 'close',
+            '最高': 'high',
+            '最低': 'low',
+            '成交量': 'volume',
+            '成交额': 'amount'
+        })
+
+        df['code'] = stock_code
+        df['date'] = pd.to_datetime(df['date'])
+        return df
+
+    def _last_complete_day(self) -> pd.Timestamp:
+        """最近一个K线已经收盘定型的日期（按 SCHEDULER_TIMEZONE 的交易所时间），盘中的当天K线不写入本地仓库"""
+        now = datetime.now(ZoneInfo(settings.SCHEDULER_TIMEZONE))
+        close_time = datetime.strptime(settings.MARKET_CLOSE_TIME, '%H:%M').time()
+        today = pd.Timestamp(now.date())
+        return today if now.time() >= close_time else today - pd.Timedelta(days=1)
+
+    def _synced_end(self, df: pd.DataFrame, gap_start: pd.Timestamp, gap_end: pd.Timestamp) -> Optional[pd.Timestamp]:
+        """[gap_start, gap_end] 补数后可以标记为已同步的最后日期，没有可标记的日期时返回 None
+
+        区间早于最近收盘日时，没有K线的日期是停牌或休市，整段标记为已同步；
+        区间包含最近收盘日时，数据源可能还没发布最后一个交易日的K线（或临时缺数），
+        只有返回了该交易日的K线才标记到 gap_end，否则只标记到返回的最后一根K线，缺少的部分下次重新请求。
+        """
+        if gap_end < self._last_complete_day():
+            return gap_end
+        if df.empty:
+            return None
+        last_bar = df['date'].max()
+        last_session = get_trading_calendar().prev_trading_day(gap_end, inclusive=True)
+        if last_session is not None and last_bar >= last_session:
+            return gap_end
+        return last_bar if last_bar >= gap_start else None
+
+    def _sync_daily_data(self, stock_code: str, start: pd.Timestamp, end: pd.Timestamp) -> None:
+        """把 [start, end] 中本地缺失的区间从 akshare 补齐到日线仓库
+
+        前复权价格会随除权除息整体变化，因此每次补数都多取一根本地已有的K线做比对，
+        不一致时说明复权基准已变，整段重新下载。
+        """
+        store = self.bar_store
+        for gap_start, gap_end in store.missing_ranges(stock_code, start, end):
+            edges = store.edge_bars(stock_code)
+            if len(edges) == 0:
+                df = self._fetch_daily_data(stock_code, gap_start, gap_end)
+                synced_end = self._synced_end(df, gap_start, gap_end)
+                if synced_end is not None:
+                    store.write(stock_code, df, gap_start, synced_end)
+                continue
+
+            first_date = pd.Timestamp(edges['date'][0])
+            last_date = pd.Timestamp(edges['date'][1])
+            if gap_end < first_date:
+                anchor = edges[0]
+                df = self._fetch_daily_data(stock_code, gap_start, first_date)
+            else:
+                anchor = edges[1]
+                df = self._fetch_daily_data(stock_code, min(gap_start, last_date), gap_end)
+
+            if df.empty:
+                # 校验用的K线一定落在请求区间内，返回为空只能是数据源异常，不能标记为已同步
+                raise ValueError(f"akshare 未返回股票 {stock_code} 的K线数据")
+
+            anchor_rows = df[df['date'] == pd.Timestamp(anchor['date'])]
+            if not anchor_rows.empty and np.isclose(anchor_rows['close'].iloc[0], anchor['close'], rtol=1e-6):
+                synced_end = self._synced_end(df, gap_start, gap_end)
+                if synced_end is not None:
+                    store.write(stock_code, df, gap_start, synced_end)
+                continue
+
+            # 复权基准变化：按本地覆盖区间与本次请求区间的并集全量重建
+            covered_start, covered_end = store.coverage(stock_code)
+            full_start, full_end = min(start, covered_start), max(end, covered_end)
+            logger.info(f"股票 {stock_code} 复权价格已变化，重新下载 {full_start.date()} ~ {full_end.date()}")
+            df = self._fetch_daily_data(stock_code, full_start, full_end)
+            if df.empty:
+                raise ValueError(f"akshare 未返回股票 {stock_code} 的K线数据")
+            store.write(stock_code, df, full_start, self._synced_end(df, full_start, full_end), replace=True)
+            return
+
+    def load_daily_data(
+        self,
+        stock_code: str,
+        start_date: str,
+        end_date: str
+    ) -> pd.DataFrame:
+        """优先从本地日线仓库读取，只对缺失区间请求 akshare（阻塞调用）
+
+        Args:
+            stock_code: 股票代码
+            start_date: 开始日期 (YYYYMMDD 或 YYYY-MM-DD)
+            end_date: 结束日期 (YYYYMMDD 或 YYYY-MM-DD)
+        """
+        start, end = pd.Timestamp(start_date), pd.Timestamp(end_date)
+        sync_end = min(end, self._last_complete_day())
+
+        with self.bar_store.lock(stock_code):
+            self._sync_daily_data(stock_code, start, sync_end)
+            df = self.bar_store.read(stock_code, start, sync_end)
+
+        if end > sync_end:
+            # 盘中尚未收盘的K线直接从 akshare 获取，不落盘
+            live = self._fetch_daily_data(stock_code, max(start, sync_end + pd.Timedelta(days=1)), end)
+            if not live.empty:
+                live = live[['date', 'open', 'close', 'high', 'low', 'volume', 'amount', 'code']]
+                df = live if df.empty else pd.concat([df, live], ignore_index=True)
+
+        return df
 
     async def get_daily_data(
         self,
@@ -51,34 +209,55 @@ class StockDataService:
     ) -> pd.DataFrame:
         """获取单个股票的日线数据"""
         try:
-            df = ak.stock_zh_a_hist(
-                symbol=stock_code,
-                period="daily",
-                start_date=start_date,
-                end_date=end_date,
-                adjust="qfq"  # 前复权
-            )
-            
-            df = df.rename(columns={
-                '日期': 'date',
-                '开盘': 'open',
-                '收盘': 'close',
-                '最高': 'high',
-                '最低': 'low',
-                '成交量': 'volume',
-                '成交额': 'amount'
-            })
-            
-            df['code'] = stock_code
-            df['date'] = pd.to_datetime(df['date'])
-            df = df.copy()
-            
-            return df
-            
+            return await run_blocking(self.load_daily_data, stock_code, start_date, end_date)
         except Exception as e:
             logger.error(f"获取股票 {stock_code} 数据失败: {e}")
             return pd.DataFrame()
 
+    async def iter_batch_daily_data(
+        self,
+        stock_codes: List[str],
+        start_date: str,
+        end_date: str,
+        stats: Optional['BatchFetchStats'] = None
+    ) -> AsyncIterator[Tuple[str, pd.DataFrame]]:
+        """并发获取多只股票的日线数据，按完成顺序逐个返回
+
+        阻塞调用在共享线程池中执行，同时在途的 akshare 请求数受 MAX_CONCURRENT_REQUESTS 限制。
+        获取失败（重试后仍失败）的股票不会返回，只记录在 stats 中。
+
+        Args:
+            stock_codes: 股票代码列表
+            start_date: 开始日期 (YYYYMMDD 或 YYYY-MM-DD)
+            end_date: 结束日期 (YYYYMMDD 或 YYYY-MM-DD)
+            stats: 批次统计，传入时记录每只股票的耗时和失败情况
+
+        Yields:
+            (股票代码, 日线数据)
+        """
+        stats = stats if stats is not None else BatchFetchStats()
+
+        async def fetch_one(stock_code: str) -> Tuple[str, Optional[pd.DataFrame]]:
+            started = time.perf_counter()
+            try:
+                data = await run_blocking(self.load_daily_data, stock_code, start_date, end_date)
+                stats.record(stock_code, time.perf_counter() - started)
+                return stock_code, data
+            except Exception as e:
+                stats.record(stock_code, time.perf_counter() - started, error=e)
+                logger.error(f"获取股票 {stock_code} 数据失败: {e}")
+                return stock_code, None
+
+        tasks = [asyncio.ensure_future(fetch_one(code)) for code in dict.fromkeys(stock_codes)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                stock_code, data = await next_done
+                if data is not None:
+                    yield stock_code, data
+        finally:
+            for task in tasks:
+                task.cancel()
+
     async def get_batch_daily_data(
         self,
         stock_codes: List[str],
@@ -93,23 +272,34 @@ class StockDataService:
             end_date: 结束日期 (YYYY-MM-DD)
             
         Returns:
-            包含所有请求股票数据的 DataFrame
+            包含所有请求股票数据的 DataFrame，股票顺序与 stock_codes 一致
         """
-        all_data = []
-        for stock_code in stock_codes:
-            data = await self.get_daily_data(stock_code, start_date, end_date)
+        stats = BatchFetchStats()
+        results = {}
+        async for stock_code, data in self.iter_batch_daily_data(stock_codes, start_date, end_date, stats):
             if not data.empty:
                 data['code'] = stock_code  # 添加股票代码列
-                all_data.append(data)
-        
+                results[stock_code] = data
+
+        self.last_batch_stats = stats.summary()
+        logger.info(f"批量获取日线数据完成: {self.last_batch_stats}")
+
+        # 按请求顺序拼接，保证下游信号遍历顺序稳定
+        all_data = [results[code] for code in dict.fromkeys(stock_codes) if code in results]
         if not all_data:
             return pd.DataFrame()
         
         return pd.concat(all_data, ignore_index=True)
 
-    async def get_stock_spot_data(self) -> pd.DataFrame:
+    async def get_stock_spot_data(self, max_age: Optional[float] = None) -> pd.DataFrame:
         """获取A股实时行情数据
         
+        全市场快照在进程内按 DATA_CACHE_EXPIRE 缓存，并发调用只会触发一次下载。
+        返回的是共享快照的浅拷贝视图，可以增删列，但不要原地修改已有数据。
+
+        Args:
+            max_age: 本次调用可接受的快照最大年龄（秒），默认使用 DATA_CACHE_EXPIRE
+
         Returns:
             DataFrame: 包含以下字段的数据框
                 - code: 股票代码
@@ -132,34 +322,63 @@ class StockDataService:
                 - pb: 市净率
         """
         try:
-            df = ak.stock_zh_a_spot_em()
-            
-            # 重命名列为英文
-            df = df.rename(columns={
-                '代码': 'code',
-                '名称': 'name',
-                '最新价': 'price',
-                '涨跌幅': 'change_percent',
-                '涨跌额': 'change_amount',
-                '成交量': 'volume',
-                '成交额': 'amount',
-                '振幅': 'amplitude',
-                '最高': 'high',
-                '最低': 'low',
-                '今开': 'open',
-                '昨收': 'pre_close',
-                '量比': 'volume_ratio',
-                '总市值': 'market_value',
-                '流通市值': 'circulating_value',
-                '换手率': 'turnover_rate',
-                '市盈率-动态': 'pe_ttm',
-                '市净率': 'pb'
-            })
-            
-            return df
-            
+            return (await self._spot_cache.get(max_age)).copy(deep=False)
         except Exception as e:
             logger.error(f"获取实时行情数据失败: {e}")
             return pd.DataFrame()
 
+    def load_stock_spot_data(self, max_age: Optional[float] = None) -> pd.DataFrame:
+        """同步获取A股实时行情快照，供不在事件循环中的任务使用，返回值同 get_stock_spot_data"""
+        try:
+            return self._spot_cache.get_sync(max_age).copy(deep=False)
+        except Exception as e:
+            logger.error(f"获取实时行情数据失败: {e}")
+            return pd.DataFrame()
+
+
+def _fetch_stock_spot_data() -> pd.DataFrame:
+    """从 akshare 下载全市场实时行情并转换为英文列名（阻塞网络请求）"""
+    df = call_with_retry(ak.stock_zh_a_spot_em)
+    if df is None or df.empty:
+        raise ValueError("akshare 未返回实时行情数据")
+
+    # 重命名列为英文
+    return df.rename(columns={
+        '代码': 'code',
+        '名称': 'name',
+        '最新价': 'price',
+        '涨跌幅': 'change_percent',
+        '涨跌额': 'change_amount',
+        '成交量': 'volume',
+        '成交额': 'amount',
+        '振幅': 'amplitude',
+        '最高': 'high',
+        '最低': 'low',
+        '今开': 'open',
+        '昨收': 'pre_close',
+        '量比': 'volume_ratio',
+        '总市值': 'market_value',
+        '流通市值': 'circulating_value',
+        '换手率': 'turnover_rate',
+        '市盈率-动态': 'pe_ttm',
+        '市净率': 'pb'
+    })
+
+
+def _filter_stock_list_all(stock_info_df: pd.DataFrame) -> pd.DataFrame:
+    # 过滤ST和退市股票
+    return stock_info_df[~stock_info_df['name'].str.contains('ST|退')]
+
+
+def _filter_main_board(stock_info_df: pd.DataFrame) -> pd.DataFrame:
+    # 过滤ST和退市股票
+    # 过滤创业板（以3开头的股票）和科创板（以688开头的股票）
+    return stock_info_df[
+        (~stock_info_df['name'].str.contains('ST|退')) &
+        (~stock_info_df['code'].str.startswith('3')) &
+        (~stock_info_df['code'].str.startswith('688'))
+    ]
+
 
+# 全市场实时行情快照，进程内所有 StockDataService 实例共享
+_spot_cache = TTLSnapshotCache(_fetch_stock_spot_data, ttl=settings.DATA_CACHE_EXPIRE)
@@ -0,0 +1,274 @@
+import asyncio
+import hashlib
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import shared_memory
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from ..core.config import settings
+from ..strategies.registry import create_strategy, get_strategy_class
+from .backtest import BacktestService
+
+logger = logging.getLogger(__name__)
+
+
+class SharedFrame:
+    """把日线 DataFrame 的各列放进共享内存，子进程按名称挂载后零拷贝读取
+
+    code 列编码为整数下标，date 列存为 int64 纳秒时间戳，其余数值列原样存放。
+    空 DataFrame（包括没有任何列的）得到只有 code/date 两个空列的共享数据。
+    """
+
+    def __init__(self, spec: Dict, blocks: List[shared_memory.SharedMemory]):
+        self.spec = spec
+        self._blocks = blocks
+
+    @classmethod
+    def create(cls, df: pd.DataFrame) -> 'SharedFrame':
+        if df.empty or 'code' not in df.columns or 'date' not in df.columns:
+            df = pd.DataFrame({'code': pd.Series([], dtype=object), 'date': pd.Series([], dtype='datetime64[ns]')})
+        codes, categories = pd.factorize(df['code'])
+        arrays = {
+            'code': codes.astype(np.int32),
+            'date': pd.to_datetime(df['date']).to_numpy(dtype='datetime64[ns]').view(np.int64),
+        }
+        for column in df.columns:
+            if column not in arrays and pd.api.types.is_numeric_dtype(df[column]):
+                arrays[column] = df[column].to_numpy(dtype=float)
+
+        blocks, columns = [], []
+        for column, array in arrays.items():
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[:] = array
+            blocks.append(block)
+            columns.append((column, block.name, array.dtype.str, len(array)))
+
+        return cls({'columns': columns, 'categories': list(categories)}, blocks)
+
+    @classmethod
+    def attach(cls, spec: Dict) -> 'SharedFrame':
+        blocks = [shared_memory.SharedMemory(name=name) for _, name, _, _ in spec['columns']]
+        return cls(spec, blocks)
+
+    def frame(self) -> pd.DataFrame:
+        data = {}
+        for (column, _, dtype, length), block in zip(self.spec['columns'], self._blocks):
+            data[column] = np.ndarray((length,), dtype=np.dtype(dtype), buffer=block.buf)
+        df = pd.DataFrame(data, copy=False)
+        df['code'] = pd.Categorical.from_codes(df['code'], categories=self.spec['categories']).astype(object)
+        df['date'] = pd.to_datetime(df['date'].to_numpy().view('datetime64[ns]'))
+        return df
+
+    def close(self):
+        for block in self._blocks:
+            block.close()
+
+    def unlink(self):
+        for block in self._blocks:
+            block.unlink()
+
+
+# 子进程内挂载的共享行情数据
+_worker_data: Optional[pd.DataFrame] = None
+_worker_shared: Optional[SharedFrame] = None
+
+
+def _init_worker(spec: Dict):
+    global _worker_data, _worker_shared
+    _worker_shared = SharedFrame.attach(spec)
+    _worker_data = _worker_shared.frame()
+
+
+def _run_combination(
+    strategy_name: str,
+    params: Dict[str, Any],
+    stock_codes: List[str],
+    start_date: str,
+    end_date: str,
+    initial_capital: float
+) -> Dict:
+    """子进程中用共享数据回测一组参数"""
+    strategy = create_strategy(strategy_name, params)
+    stock_data = _worker_data[_worker_data['code'].isin(stock_codes)]
+    backtest = BacktestService(initial_capital=initial_capital)
+    return asyncio.run(backtest.run_on_data(strategy, stock_data, start_date, end_date))
+
+
+def expand_grid(param_grid: Dict[str, List[Any]]) -> List[Dict[str, Any]]:
+    """参数网格展开为参数组合列表"""
+    names = list(param_grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(param_grid[name] for name in names))]
+
+
+def _params_key(params: Dict[str, Any]) -> str:
+    return json.dumps(params, sort_keys=True, default=str, ensure_ascii=False)
+
+
+class ParameterSweep:
+    """策略参数网格扫描
+
+    行情数据只加载一次并放入共享内存，参数组合分发到进程池并行回测。
+    每完成一组参数立即追加写入 {SWEEP_DIR}/{sweep_id}.jsonl，
+    相同的扫描请求（策略、网格、区间、资金相同）得到相同的 sweep_id，重新运行时跳过已完成的组合。
+    """
+
+    def __init__(
+        self,
+        strategy_name: str,
+        param_grid: Dict[str, List[Any]],
+        start_date: str,
+        end_date: str,
+        initial_capital: float = settings.DEFAULT_INITIAL_CAPITAL,
+        rank_by: str = 'sharpe_ratio',
+        max_workers: Optional[int] = None
+    ):
+        get_strategy_class(strategy_name)
+        self.strategy_name = strategy_name
+        self.param_grid = param_grid
+        self.start_date = start_date
+        self.end_date = end_date
+        self.initial_capital = initial_capital
+        self.rank_by = rank_by
+        self.max_workers = max_workers or settings.SWEEP_MAX_WORKERS or os.cpu_count()
+
+        self.combinations = expand_grid(param_grid)
+        self.sweep_id = self.make_sweep_id(strategy_name, param_grid, start_date, end_date, initial_capital)
+        self.status = 'pending'
+        self.error: Optional[str] = None
+        self.completed = 0
+        self.total = len(self.combinations)
+
+    @staticmethod
+    def make_sweep_id(strategy_name, param_grid, start_date, end_date, initial_capital) -> str:
+        payload = json.dumps(
+            [strategy_name, param_grid, start_date, end_date, initial_capital],
+            sort_keys=True, default=str, ensure_ascii=False
+        )
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:16]
+
+    @property
+    def results_path(self) -> str:
+        return os.path.join(settings.SWEEP_DIR, f"{self.sweep_id}.jsonl")
+
+    def load_results(self) -> List[Dict]:
+        """读取已完成的参数组合结果"""
+        if not os.path.exists(self.results_path):
+            return []
+        with open(self.results_path, 'r', encoding='utf-8') as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def _append_result(self, params: Dict[str, Any], metrics: Dict):
+        with open(self.results_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({
+                'params': params,
+                'metrics': metrics,
+                'finished_at': datetime.now().isoformat()
+            }, default=str, ensure_ascii=False) + '\n')
+
+    def ranking(self) -> List[Dict]:
+        """按 rank_by 指标从高到低排序的结果表"""
+        rows = [{**result['params'], **result['metrics']} for result in self.load_results()]
+        if not rows:
+            return []
+        table = pd.DataFrame(rows)
+        if self.rank_by in table.columns:
+            table = table.sort_values(self.rank_by, ascending=False, na_position='last')
+        return table.replace({np.nan: None}).to_dict('records')
+
+    def progress(self) -> Dict:
+        return {
+            'sweep_id': self.sweep_id,
+            'status': self.status,
+            'completed': self.completed,
+            'total': self.total,
+            'error': self.error,
+        }
+
+    async def _load_data(self, combinations: List[Dict[str, Any]]):
+        """为待运行的参数组合加载一次数据：股票池取并集，预热区间取最长"""
+        backtest = BacktestService(initial_capital=self.initial_capital)
+        universe = await backtest.get_stock_universe()
+
+        codes_by_combination, all_codes, data_start = [], {}, self.start_date
+        for params in combinations:
+            strategy = create_strategy(self.strategy_name, params)
+            codes = strategy.select_stocks("ss", universe)
+            codes_by_combination.append(codes)
+            all_codes.update(dict.fromkeys(codes))
+            data_start = min(data_start, backtest.get_data_start(strategy, self.start_date), key=pd.Timestamp)
+
+        stock_data = await backtest.stock_data_service.get_batch_daily_data(list(all_codes), data_start, self.end_date)
+        return stock_data, codes_by_combination
+
+    async def run(self, progress_callback: Optional[Callable[[Dict], None]] = None) -> List[Dict]:
+        """运行（或继续运行）扫描，返回排序后的结果表"""
+        os.makedirs(settings.SWEEP_DIR, exist_ok=True)
+        done = {_params_key(result['params']) for result in self.load_results()}
+        pending = [params for params in self.combinations if _params_key(params) not in done]
+        self.completed = self.total - len(pending)
+        self.status = 'running'
+        logger.info(f"参数扫描 {self.sweep_id} 开始：共 {self.total} 组，已完成 {self.completed} 组")
+
+        shared = None
+        try:
+            stock_data, codes_by_combination = await self._load_data(pending) if pending else (None, [])
+            if pending and stock_data.empty:
+                logger.warning(f"参数扫描 {self.sweep_id}：回测区间内没有行情数据，结果为空")
+            elif pending:
+                shared = SharedFrame.create(stock_data)
+                # API 服务进程中有多个线程，fork 出的子进程可能继承被其他线程持有的锁，改用 spawn 启动
+                with ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_worker,
+                    initargs=(shared.spec,)
+                ) as pool:
+                    async def run_one(params, codes):
+                        metrics = await asyncio.wrap_future(pool.submit(
+                            _run_combination, self.strategy_name, params, codes,
+                            self.start_date, self.end_date, self.initial_capital
+                        ))
+                        return params, metrics
+
+                    tasks = [run_one(params, codes) for params, codes in zip(pending, codes_by_combination)]
+                    for next_done in asyncio.as_completed(tasks):
+                        params, metrics = await next_done
+                        self._finish(params, metrics, progress_callback)
+            self.status = 'completed'
+        except Exception as e:
+            self.status = 'failed'
+            self.error = str(e)
+            logger.error(f"参数扫描 {self.sweep_id} 失败: {e}")
+            raise
+        finally:
+            if shared is not None:
+                shared.close()
+                shared.unlink()
+
+        return self.ranking()
+
+    def on_task_done(self, task: asyncio.Task):
+        """后台运行 run() 的 asyncio 任务结束时调用：取出异常并记录为失败，避免异常无人获取"""
+        if task.cancelled():
+            self.status = 'failed'
+            self.error = '参数扫描已取消'
+            return
+        error = task.exception()
+        if error is not None:
+            self.status = 'failed'
+            self.error = self.error or str(error)
+            logger.error(f"参数扫描 {self.sweep_id} 后台任务异常结束: {error!r}")
+
+    def _finish(self, params, metrics, progress_callback):
+        self._append_result(params, metrics)
+        self.completed += 1
+        if progress_callback is not None:
+            progress_callback(self.progress())
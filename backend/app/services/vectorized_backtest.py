@@ -0,0 +1,127 @@
+import heapq
+from typing import Callable, List
+
+import numpy as np
+import pandas as pd
+
+from .ledger import Ledger
+
+SIGNAL_CODES = {'buy': 1, 'sell': -1}
+
+
+class SignalMatrix:
+    """交易日 × 股票 的信号矩阵和收盘价矩阵
+
+    信号编码：1 买入，-1 卖出，0 持有或无信号；当天没有K线的股票收盘价为 NaN。
+    股票列的顺序与数据中首次出现的顺序一致，也就是同一天内逐只执行交易的顺序。
+    """
+
+    def __init__(self, signal_panel: pd.DataFrame, trading_days: pd.DatetimeIndex):
+        self.trading_days = pd.DatetimeIndex(trading_days)
+        self.codes = pd.unique(signal_panel['code']) if not signal_panel.empty else np.array([], dtype=object)
+        code_index = {code: i for i, code in enumerate(self.codes)}
+
+        shape = (len(self.trading_days), len(self.codes))
+        self.signals = np.zeros(shape, dtype=np.int8)
+        self.prices = np.full(shape, np.nan)
+        if signal_panel.empty or not len(self.trading_days):
+            return
+
+        dates = pd.to_datetime(signal_panel['date']).to_numpy(dtype='datetime64[ns]')
+        day_idx = np.searchsorted(self.trading_days.to_numpy(dtype='datetime64[ns]'), dates)
+        in_range = day_idx < len(self.trading_days)
+        in_range[in_range] = self.trading_days[day_idx[in_range]].to_numpy(dtype='datetime64[ns]') == dates[in_range]
+
+        rows = day_idx[in_range]
+        cols = signal_panel['code'].map(code_index).to_numpy()[in_range]
+        self.prices[rows, cols] = signal_panel['close'].to_numpy(dtype=float)[in_range]
+        self.signals[rows, cols] = signal_panel['signal'].map(SIGNAL_CODES).fillna(0).to_numpy(dtype=np.int8)[in_range]
+
+
+def _next_sell_days(signals: np.ndarray) -> np.ndarray:
+    """next_sell[d, j]: 第 d 天之后（不含当天）股票 j 第一次出现卖出信号的交易日，没有则为天数"""
+    n_days = signals.shape[0]
+    sell_days = np.where(signals == -1, np.arange(n_days)[:, None], n_days)
+    next_at_or_after = np.minimum.accumulate(sell_days[::-1], axis=0)[::-1]
+    return np.vstack([next_at_or_after[1:], np.full((1, signals.shape[1]), n_days)])
+
+
+def simulate(
+    matrix: SignalMatrix,
+    initial_capital: float,
+    position_size: Callable[[float, float], float],
+    commission_rate: float = 0.0,
+    min_commission: float = 0.0
+) -> Ledger:
+    """按 BacktestService.execute_trades 的规则把信号矩阵转换为成交、持仓、资金和净值曲线
+
+    规则：已持仓不再买入；买入股数由 position_size(当前资金, 价格) 决定，资金不足以支付成交金额和手续费时放弃；
+    卖出信号一次卖出全部持仓；同一天内按股票列顺序依次成交。
+
+    持仓状态只在买入成功时改变，而买入后对应的卖出日可以由 next_sell 直接查表，
+    因此只需要按 (交易日, 股票) 顺序遍历稀疏的买入信号和已确定的卖出事件，
+    不需要逐日循环；持仓矩阵、资金和净值曲线最后用累加一次性算出。
+
+    Args:
+        commission_rate / min_commission: 手续费率和最低手续费，默认不收取（见 Ledger）
+
+    Returns:
+        记录了全部成交和每日净值的 Ledger，股票编号与信号矩阵的列一致
+    """
+    n_days, n_codes = matrix.signals.shape
+    next_sell = _next_sell_days(matrix.signals)
+    dates = matrix.trading_days.strftime('%Y%m%d')
+
+    ledger = Ledger(initial_capital, commission_rate=commission_rate, min_commission=min_commission)
+    ledger.symbol_ids(matrix.codes)
+    pending_sells: List = []  # (卖出日, 股票列) 小顶堆
+    share_deltas = np.zeros((n_days, n_codes))
+    cash_events_day, cash_events_value = [], []
+
+    def process_sell(day: int, col: int):
+        share_deltas[day, col] -= ledger.shares[col]
+        ledger.sell(col, matrix.prices[day, col], day)
+        cash_events_day.append(day)
+        cash_events_value.append(ledger.cash)
+
+    buy_days, buy_cols = np.nonzero(matrix.signals == 1)
+    for day, col in zip(buy_days.tolist(), buy_cols.tolist()):
+        while pending_sells and pending_sells[0] < (day, col):
+            process_sell(*heapq.heappop(pending_sells))
+        if ledger.holds(col):
+            continue
+
+        price = matrix.prices[day, col]
+        shares = position_size(ledger.cash, price)
+        if ledger.buy_cost(price, shares) > ledger.cash:
+            continue
+
+        ledger.buy(col, price, shares, day)
+        share_deltas[day, col] += shares
+        cash_events_day.append(day)
+        cash_events_value.append(ledger.cash)
+        sell_day = int(next_sell[day, col])
+        if sell_day < n_days:
+            heapq.heappush(pending_sells, (sell_day, col))
+
+    while pending_sells:
+        process_sell(*heapq.heappop(pending_sells))
+
+    # 每天收盘后的资金：当天最后一笔成交后的余额，没有成交的日子沿用前一天
+    cash_by_day = (
+        pd.Series(cash_events_value, index=cash_events_day, dtype=float)
+        .groupby(level=0).last()
+        .reindex(range(n_days)).ffill().fillna(initial_capital)
+        .to_numpy()
+    )
+
+    holdings = np.cumsum(share_deltas, axis=0)
+    mark_prices = pd.DataFrame(matrix.prices).ffill().to_numpy()
+    position_values = np.nansum(np.where(holdings != 0, holdings * mark_prices, 0.0), axis=1)
+    ledger.record_values(dates, cash_by_day + position_values, position_values)
+
+    # 最新价为整段最后一个已知收盘价，与逐日回测结束时的状态一致
+    if n_days:
+        last_known = np.flatnonzero(~np.isnan(mark_prices[-1]))
+        ledger.update_prices(last_known, mark_prices[-1][last_known])
+    return ledger
@@ -1,8 +1,11 @@
 from abc import ABC, abstractmethod
-from typing import List, Dict
+from typing import List, Dict, Optional
 import pandas as pd
 
 class BaseStrategy(ABC):
+    # 信号只依赖历史价格、不依赖持仓等运行状态的策略可以使用向量化回测
+    stateless: bool = False
+
     def __init__(self, name: str, description: str):
         self.name = name
         self.description = description
@@ -18,6 +21,20 @@ class BaseStrategy(ABC):
         """生成交易信号"""
         pass
     
+    @property
+    def warmup_bars(self) -> int:
+        """计算指标需要在回测开始前预先加载的K线数"""
+        return 0
+    
+    def prepare_signals(self, stock_data: pd.DataFrame) -> Optional[pd.DataFrame]:
+        """对整段历史一次性计算逐行信号
+        
+        支持的策略返回包含 date/code/close/signal 列的 DataFrame，signal 表示以该行为最新K线时的信号
+        （None 表示不产生信号）；回测时按交易日直接查表，不再逐日调用 generate_signals。
+        默认返回 None，回测退回逐日调用 generate_signals。
+        """
+        return None
+    
     def calculate_position_size(self, capital: float, price: float) -> float:
         """计算仓位大小"""
         position = capital * 0.01  # 默认每个股票使用10%资金
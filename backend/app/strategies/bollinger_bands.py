@@ -2,8 +2,11 @@ from typing import List, Dict
 import pandas as pd
 import numpy as np
 from .base import BaseStrategy
+from .indicators import IncrementalBollinger
 
 class BollingerBandsStrategy(BaseStrategy):
+    stateless = True
+
     def __init__(
         self,
         name: str = "布林带策略",
@@ -30,35 +33,70 @@ class BollingerBandsStrategy(BaseStrategy):
         avg_volume = df['volume'].rolling(window=self.window).mean().iloc[-1]
         return current_volume > avg_volume * self.volume_factor
     
+    @property
+    def warmup_bars(self) -> int:
+        # 第一个回测日需要完整的 window 根K线，判断下轨穿越还需要前一根
+        return self.window + 1
+    
+    def prepare_signals(self, stock_data: pd.DataFrame) -> pd.DataFrame:
+        return self.calculate_signal_panel(stock_data)
+    
+    def create_incremental_state(self) -> IncrementalBollinger:
+        """创建与本策略参数一致的增量布林带状态，用于实时行情逐笔更新"""
+        return IncrementalBollinger(window=self.window, std_dev=self.std_dev, volume_factor=self.volume_factor)
+    
     def select_stocks(self, date: str, df: pd.DataFrame) -> List[str]:
         # Sort stocks by circulating_market_value and return top 300 stock codes
         sorted_df = df.sort_values('circulating_value', ascending=False)
         return sorted_df['code'].head(300).tolist()
     
+    def calculate_signal_panel(self, stock_data: pd.DataFrame) -> pd.DataFrame:
+        """对多只股票一次性计算布林带、成交量均线和信号
+
+        按股票分组滚动计算（窗口不跨股票、按K线条数计），每一行的 signal 表示以该行为最新K线时的信号，
+        K线不足 window 根的行为 None。结果与逐只股票调用 calculate_bollinger_bands 完全一致。
+        """
+        df = stock_data.reset_index(drop=True)
+        codes = df['code']
+        grouped = df.groupby(codes, sort=False)
+
+        rolling_close = grouped['close'].rolling(window=self.window)
+        df['middle_band'] = rolling_close.mean().reset_index(level=0, drop=True)
+        df['std'] = rolling_close.std().reset_index(level=0, drop=True)
+        df['upper_band'] = df['middle_band'] + (df['std'] * self.std_dev)
+        df['lower_band'] = df['middle_band'] - (df['std'] * self.std_dev)
+        df['volume_ma'] = grouped['volume'].rolling(window=self.window).mean().reset_index(level=0, drop=True)
+
+        close = df['close'].to_numpy()
+        prev_close = grouped['close'].shift(1).to_numpy()
+        prev_lower = df['lower_band'].groupby(codes, sort=False).shift(1).to_numpy()
+        lower = df['lower_band'].to_numpy()
+        upper = df['upper_band'].to_numpy()
+        middle = df['middle_band'].to_numpy()
+
+        buy = (
+            (close <= lower) &
+            (prev_close > prev_lower) &
+            (df['volume'].to_numpy() > df['volume_ma'].to_numpy() * self.volume_factor)
+        )
+        sell = (close >= upper) | (close < middle)
+        signal = np.where(buy, 'buy', np.where(sell, 'sell', 'hold')).astype(object)
+        signal[(grouped.cumcount() + 1).to_numpy() < self.window] = None
+        df['signal'] = signal
+        return df
+
     def generate_signals(self, stock_data: pd.DataFrame) -> Dict[str, str]:
-        signals = {}
-        
-        for stock_code in stock_data['code'].unique():
-            df = stock_data[stock_data['code'] == stock_code].copy()
-            if len(df) < self.window:
-                continue
-            
-            df = self.calculate_bollinger_bands(df)
-            latest = df.iloc[-1]
-            prev = df.iloc[-2]
-            
-            if (
-                latest['close'] <= latest['lower_band'] and
-                prev['close'] > prev['lower_band'] and 
-                self.check_volume_surge(df)
-            ):
-                signals[stock_code] = 'buy'
-            elif (
-                latest['close'] >= latest['upper_band'] or
-                latest['close'] < latest['middle_band']
-            ):
-                signals[stock_code] = 'sell'
-            else:
-                signals[stock_code] = 'hold'
-        
-        return signals
+        if stock_data.empty:
+            return {}
+
+        panel = self.calculate_signal_panel(stock_data)
+        is_latest = panel.groupby('code', sort=False).cumcount(ascending=False).to_numpy() == 0
+        latest = panel.loc[is_latest & panel['signal'].notna().to_numpy()]
+        latest_signals = dict(zip(latest['code'], latest['signal']))
+
+        # 保持与股票在输入数据中首次出现的顺序一致
+        return {
+            stock_code: latest_signals[stock_code]
+            for stock_code in stock_data['code'].unique()
+            if stock_code in latest_signals
+        }
@@ -1,8 +1,12 @@
 from typing import Dict, List
+import asyncio
+from datetime import datetime
 import pandas as pd
-import akshare as ak
 from enum import Enum
 from .base import BaseStrategy
+from .scoring import weighted_scores
+from ..services.financial_cache import financial_abstract_cache
+from ..services.stock_data import StockDataService
 import traceback  # Add this import
 
 class ModelComplexity(Enum):
@@ -18,20 +22,26 @@ class FundamentalStrategy(BaseStrategy):
         complexity: ModelComplexity = ModelComplexity.MEDIUM,
         buy_threshold: float = 0.7,
         sell_threshold: float = 0.3,
-        holding_period: int = 20  # 添加持仓天数参数，默认20天
+        holding_period: int = 20,  # 添加持仓天数参数，默认20天
+        normalizer: str = 'min_max',  # 指标标准化方法：min_max/rank/zscore
+        universe_size: int = 10  # 参与打分的股票数量（按流通市值排序）
     ):
         super().__init__(name, description)
-        self.complexity = complexity
+        self.complexity = ModelComplexity(complexity)  # 也接受 "simple"/"medium"/"complex"
         self.buy_threshold = buy_threshold
         self.sell_threshold = sell_threshold
         self.holding_period = holding_period
+        self.normalizer = normalizer
+        self.universe_size = universe_size
         self._define_indicators()
         self.position_start_dates = {}  # 记录每个股票的建仓日期
+        self.stock_data_service = StockDataService()
+        self._market_snapshot = None  # (交易日, 按代码索引的全市场行情快照)
 
     def select_stocks(self, date: str, df: pd.DataFrame) -> List[str]:
-        # 选择市值前300的股票
+        # 选择流通市值前 universe_size 的股票
         sorted_df = df.sort_values('circulating_value', ascending=False)
-        return sorted_df['code'].head(10).tolist()
+        return sorted_df['code'].head(self.universe_size).tolist()
 
     async def generate_signals(self, stock_data: pd.DataFrame) -> Dict[str, str]:
         """
@@ -41,12 +51,12 @@ class FundamentalStrategy(BaseStrategy):
         Returns:
             Dict[str, str]: 股票代码到交易信号的映射
         """
-        # 获取当前日期
-        current_date = pd.to_datetime(stock_data['date'].iloc[0])
+        # 获取当前日期（传入的是截至当日的历史窗口，取最后一天）
+        current_date = pd.to_datetime(stock_data['date'].max())
         stock_codes = stock_data['code'].unique().tolist()
         
         # 获取基本面数据
-        fundamental_data = await self.get_fundamental_data(stock_codes)
+        fundamental_data = await self.get_fundamental_data(stock_codes, current_date)
         if fundamental_data.empty:
             return {}
             
@@ -108,16 +118,6 @@ class FundamentalStrategy(BaseStrategy):
             'quick_ratio': 0.05,         # 速动比率（越大越好）
         }
 
-    def _normalize_data(self, df: pd.DataFrame, column: str) -> pd.Series:
-        """
-        使用Min-Max标准化将数据归一化到[0,1]区间
-        """
-        min_val = df[column].min()
-        max_val = df[column].max()
-        if max_val == min_val:
-            return pd.Series(0.5, index=df.index)
-        return (df[column] - min_val) / (max_val - min_val)
-
     def _get_current_indicators(self) -> Dict[str, float]:
         """
         根据复杂度返回当前使用的指标和权重
@@ -131,33 +131,10 @@ class FundamentalStrategy(BaseStrategy):
 
     def calculate_score(self, stock_data: pd.DataFrame) -> Dict[str, float]:
         """
-        计算每只股票的综合得分
+        计算每只股票的综合得分（横截面向量化计算）
         """
         indicators = self._get_current_indicators()
-        scores = {}
-
-        for stock_code in stock_data.index:
-            stock = stock_data.loc[stock_code]
-            score = 0
-            valid_weights_sum = 0
-
-            for indicator, weight in indicators.items():
-                if indicator in stock and pd.notna(stock[indicator]):
-                    normalized_value = self._normalize_data(stock_data, indicator).loc[stock_code]
-                    # 如果权重为负，则将归一化值反转
-                    if weight < 0:
-                        normalized_value = 1 - normalized_value
-                        weight = abs(weight)
-                    score += normalized_value * weight
-                    valid_weights_sum += abs(weight)
-
-            # 根据有效权重重新归一化得分
-            if valid_weights_sum > 0:
-                scores[stock_code] = score / valid_weights_sum
-            else:
-                scores[stock_code] = 0
-
-        return scores
+        return weighted_scores(stock_data, indicators, self.normalizer).to_dict()
 
     def _process_numeric_value(self, value: str) -> float:
         """
@@ -198,35 +175,40 @@ class FundamentalStrategy(BaseStrategy):
         except (ValueError, TypeError):
             return 0.0  # 转换失败时返回0
 
-    async def get_fundamental_data(self, stock_codes: List[str]) -> pd.DataFrame:
+    async def _get_market_snapshot(self, trade_date: pd.Timestamp) -> pd.DataFrame:
+        """获取当日全市场行情快照（按股票代码索引），同一交易日只获取一次"""
+        if self._market_snapshot is None or self._market_snapshot[0] != trade_date:
+            spot_data = await self.stock_data_service.get_stock_spot_data()
+            if not spot_data.empty:
+                spot_data = spot_data.drop_duplicates('code').set_index('code')
+            self._market_snapshot = (trade_date, spot_data)
+        return self._market_snapshot[1]
+
+    async def get_fundamental_data(self, stock_codes: List[str], trade_date: pd.Timestamp = None) -> pd.DataFrame:
         """
         获取股票的基本面数据，使用异步并行处理
+        - 行情指标（市盈率、市净率）来自当日全市场快照，每个交易日只下载一次
+        - 财务摘要通过共享线程池并发获取，按股票缓存，只使用 trade_date 当天已经公布的报告期
         """
-        from concurrent.futures import ThreadPoolExecutor
-        import asyncio
+        trade_date = pd.Timestamp(trade_date if trade_date is not None else datetime.now()).normalize()
+        realtime_data = await self._get_market_snapshot(trade_date)
+        if realtime_data.empty:
+            return pd.DataFrame()
         
         async def get_single_stock_data(stock_code: str) -> tuple[str, dict]:
             try:
-                # 使用 ThreadPoolExecutor 处理同步调用
-                with ThreadPoolExecutor() as executor:
-                    financial_data = await asyncio.get_event_loop().run_in_executor(
-                        executor,
-                        lambda: ak.stock_financial_abstract_ths(symbol=stock_code, indicator="按报告期")
-                    )
-                    realtime_data = await asyncio.get_event_loop().run_in_executor(
-                        executor,
-                        lambda: ak.stock_zh_a_spot_em()
-                    )
+                # 只使用 trade_date 当天已经公布的报告期，最新一期在最前
+                financial_data = await financial_abstract_cache.aas_of(stock_code, trade_date)
                 
-                if financial_data.empty or realtime_data.empty:
+                if financial_data.empty or stock_code not in realtime_data.index:
                     raise ValueError("无法获取数据")
                     
                 latest_data = financial_data.iloc[0]
-                stock_data = realtime_data[realtime_data['代码'] == stock_code].iloc[0]
+                stock_data = realtime_data.loc[stock_code]
                 
                 return stock_code, {
-                    'pe_ratio': self._process_numeric_value(stock_data.get('市盈率-动态')),
-                    'pb_ratio': self._process_numeric_value(stock_data.get('市净率')),
+                    'pe_ratio': self._process_numeric_value(stock_data.get('pe_ttm')),
+                    'pb_ratio': self._process_numeric_value(stock_data.get('pb')),
                     'roe': self._process_numeric_value(latest_data.get('净资产收益率')),
                     'retained_earnings': self._process_numeric_value(latest_data.get('每股未分配利润')),
                     'debt_ratio': self._process_numeric_value(latest_data.get('资产负债率')),
@@ -254,4 +236,4 @@ class FundamentalStrategy(BaseStrategy):
         if not valid_data:
             return pd.DataFrame()
             
-        return pd.DataFrame.from_dict(valid_data, orient='index') 
\ No newline at end of file
+        return pd.DataFrame.from_dict(valid_data, orient='index')
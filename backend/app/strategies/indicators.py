@@ -0,0 +1,194 @@
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+class IncrementalBollinger:
+    """可增量更新的多股票布林带状态
+
+    每只股票维护最近 window 根K线的环形缓冲区，以及收盘价之和、平方和与成交量之和。
+    新K线（update）或盘中最新价（peek）到达时只需 O(1) 计算即可得到最新布林带和信号，
+    全部股票的更新都是一次向量运算，不需要重新滚动整段历史。
+
+    信号规则与 BollingerBandsStrategy 相同：
+        - buy: 收盘价触及下轨、前一根K线在下轨之上，且成交量超过均量的 volume_factor 倍
+        - sell: 收盘价触及上轨或跌破中轨
+        - hold: 其他情况；K线不足 window 根时为 None
+    """
+
+    # 每累计更新这么多次，用缓冲区重新求和，消除浮点累积误差
+    RESYNC_INTERVAL = 1000
+
+    def __init__(self, window: int = 20, std_dev: float = 2.0, volume_factor: float = 2.0):
+        self.window = window
+        self.std_dev = std_dev
+        self.volume_factor = volume_factor
+
+        self.codes: List[str] = []
+        self._index: Dict[str, int] = {}
+        self._close_buf = np.empty((0, window))
+        self._volume_buf = np.empty((0, window))
+        self._pos = np.zeros(0, dtype=np.int64)
+        self._count = np.zeros(0, dtype=np.int64)
+        self._close_sum = np.zeros(0)
+        self._close_sumsq = np.zeros(0)
+        self._volume_sum = np.zeros(0)
+        self._last_close = np.zeros(0)
+        self._last_lower = np.zeros(0)
+        self._updates = 0
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def _grow(self, size: int):
+        extra = size - len(self._pos)
+        if extra <= 0:
+            return
+        self._close_buf = np.vstack([self._close_buf, np.zeros((extra, self.window))])
+        self._volume_buf = np.vstack([self._volume_buf, np.zeros((extra, self.window))])
+        self._pos = np.concatenate([self._pos, np.zeros(extra, dtype=np.int64)])
+        self._count = np.concatenate([self._count, np.zeros(extra, dtype=np.int64)])
+        self._close_sum = np.concatenate([self._close_sum, np.zeros(extra)])
+        self._close_sumsq = np.concatenate([self._close_sumsq, np.zeros(extra)])
+        self._volume_sum = np.concatenate([self._volume_sum, np.zeros(extra)])
+        self._last_close = np.concatenate([self._last_close, np.full(extra, np.nan)])
+        self._last_lower = np.concatenate([self._last_lower, np.full(extra, np.nan)])
+
+    def _indices(self, codes: Iterable[str]) -> np.ndarray:
+        """股票代码转换为状态数组下标，新股票自动分配位置"""
+        idx = []
+        for code in codes:
+            i = self._index.get(code)
+            if i is None:
+                i = self._index[code] = len(self.codes)
+                self.codes.append(code)
+            idx.append(i)
+        self._grow(len(self.codes))
+        idx = np.asarray(idx, dtype=np.int64)
+        if len(np.unique(idx)) != len(idx):
+            raise ValueError("同一次更新中股票代码不能重复")
+        return idx
+
+    def _prepare(self, codes, closes, volumes) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        codes = np.asarray(list(codes), dtype=object)
+        closes = np.asarray(closes, dtype=float)
+        volumes = np.asarray(volumes, dtype=float)
+        valid = ~(np.isnan(closes) | np.isnan(volumes))
+        return codes[valid], self._indices(codes[valid]), closes[valid], volumes[valid]
+
+    def _window_after(self, idx: np.ndarray, closes: np.ndarray, volumes: np.ndarray):
+        """加入一根新K线后窗口内的 (K线数, 收盘价和, 平方和, 成交量和)"""
+        full = self._count[idx] >= self.window
+        oldest_close = np.where(full, self._close_buf[idx, self._pos[idx]], 0.0)
+        oldest_volume = np.where(full, self._volume_buf[idx, self._pos[idx]], 0.0)
+        count = np.minimum(self._count[idx] + 1, self.window)
+        close_sum = self._close_sum[idx] + closes - oldest_close
+        close_sumsq = self._close_sumsq[idx] + closes * closes - oldest_close * oldest_close
+        volume_sum = self._volume_sum[idx] + volumes - oldest_volume
+        return count, close_sum, close_sumsq, volume_sum
+
+    def _evaluate(self, codes, idx, closes, volumes, count, close_sum, close_sumsq, volume_sum) -> pd.DataFrame:
+        eligible = count >= self.window
+        with np.errstate(all='ignore'):
+            middle = close_sum / count
+            variance = np.maximum(close_sumsq - close_sum * close_sum / count, 0.0) / (count - 1)
+            std = np.sqrt(variance)
+            volume_ma = volume_sum / count
+        middle = np.where(eligible, middle, np.nan)
+        std = np.where(eligible, std, np.nan)
+        volume_ma = np.where(eligible, volume_ma, np.nan)
+        upper = middle + std * self.std_dev
+        lower = middle - std * self.std_dev
+
+        prev_close = self._last_close[idx]
+        prev_lower = self._last_lower[idx]
+        buy = (closes <= lower) & (prev_close > prev_lower) & (volumes > volume_ma * self.volume_factor)
+        sell = (closes >= upper) | (closes < middle)
+        signal = np.where(buy, 'buy', np.where(sell, 'sell', 'hold')).astype(object)
+        signal[~eligible] = None
+
+        return pd.DataFrame({
+            'code': codes,
+            'close': closes,
+            'volume': volumes,
+            'middle_band': middle,
+            'upper_band': upper,
+            'lower_band': lower,
+            'volume_ma': volume_ma,
+            'signal': signal,
+        })
+
+    def peek(self, codes: Iterable[str], closes: Iterable[float], volumes: Iterable[float]) -> pd.DataFrame:
+        """用盘中最新价/量作为当天K线计算布林带和信号，不修改状态"""
+        codes, idx, closes, volumes = self._prepare(codes, closes, volumes)
+        window = self._window_after(idx, closes, volumes)
+        return self._evaluate(codes, idx, closes, volumes, *window)
+
+    def update(self, codes: Iterable[str], closes: Iterable[float], volumes: Iterable[float]) -> pd.DataFrame:
+        """提交一根已收盘的K线，返回以它为最新K线的布林带和信号"""
+        codes, idx, closes, volumes = self._prepare(codes, closes, volumes)
+        count, close_sum, close_sumsq, volume_sum = self._window_after(idx, closes, volumes)
+        result = self._evaluate(codes, idx, closes, volumes, count, close_sum, close_sumsq, volume_sum)
+
+        pos = self._pos[idx]
+        self._close_buf[idx, pos] = closes
+        self._volume_buf[idx, pos] = volumes
+        self._pos[idx] = (pos + 1) % self.window
+        self._count[idx] = count
+        self._close_sum[idx] = close_sum
+        self._close_sumsq[idx] = close_sumsq
+        self._volume_sum[idx] = volume_sum
+        self._last_close[idx] = closes
+        self._last_lower[idx] = result['lower_band'].to_numpy()
+
+        self._updates += 1
+        if self._updates % self.RESYNC_INTERVAL == 0:
+            self._resync()
+        return result
+
+    def _resync(self):
+        """用缓冲区中的原始数据重新计算累计和"""
+        filled = np.arange(self.window)[None, :] < self._count[:, None]
+        close_buf = np.where(filled, self._close_buf, 0.0)
+        self._close_sum = close_buf.sum(axis=1)
+        self._close_sumsq = (close_buf * close_buf).sum(axis=1)
+        self._volume_sum = np.where(filled, self._volume_buf, 0.0).sum(axis=1)
+
+    def seed(self, history: pd.DataFrame) -> pd.DataFrame:
+        """用历史日线（包含 code/date/close/volume 列）初始化状态
+
+        每只股票只需要最近 window + 1 根K线（最后一根的前一根用于判断下轨穿越）。
+        按K线位置右对齐后逐列调用 update，共 window + 1 次向量运算。
+
+        Returns:
+            每只股票最后一根K线的布林带和信号
+        """
+        if history.empty:
+            return pd.DataFrame()
+
+        history = history.sort_values(['code', 'date'], kind='stable')
+        tail = history.groupby('code', sort=False).tail(self.window + 1)
+        tail = tail.assign(bars_ago=tail.groupby('code', sort=False).cumcount(ascending=False))
+        closes = tail.pivot(index='code', columns='bars_ago', values='close')
+        volumes = tail.pivot(index='code', columns='bars_ago', values='volume')
+
+        latest = pd.DataFrame()
+        for bars_ago in sorted(closes.columns, reverse=True):
+            latest = self.update(closes.index, closes[bars_ago].to_numpy(), volumes[bars_ago].to_numpy())
+        return latest
+
+    def snapshot(self) -> pd.DataFrame:
+        """当前每只股票最新已提交K线对应的布林带"""
+        count = self._count
+        with np.errstate(all='ignore'):
+            middle = np.where(count >= self.window, self._close_sum / count, np.nan)
+            std = np.sqrt(np.maximum(self._close_sumsq - self._close_sum ** 2 / count, 0.0) / (count - 1))
+        std = np.where(count >= self.window, std, np.nan)
+        return pd.DataFrame({
+            'code': self.codes,
+            'close': self._last_close,
+            'middle_band': middle,
+            'upper_band': middle + std * self.std_dev,
+            'lower_band': middle - std * self.std_dev,
+        })
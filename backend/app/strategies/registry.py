@@ -0,0 +1,23 @@
+from typing import Any, Dict, Type
+
+from .base import BaseStrategy
+from .bollinger_bands import BollingerBandsStrategy
+from .fundamental_strategy import FundamentalStrategy
+
+# 可以通过 API 按名称创建的策略
+STRATEGIES: Dict[str, Type[BaseStrategy]] = {
+    'bollinger': BollingerBandsStrategy,
+    'fundamental': FundamentalStrategy,
+}
+
+
+def get_strategy_class(name: str) -> Type[BaseStrategy]:
+    try:
+        return STRATEGIES[name]
+    except KeyError:
+        raise ValueError(f"未知的策略: {name}，可选: {list(STRATEGIES)}")
+
+
+def create_strategy(name: str, params: Dict[str, Any]) -> BaseStrategy:
+    """按名称和参数创建策略实例"""
+    return get_strategy_class(name)(**params)
@@ -0,0 +1,100 @@
+import warnings
+from typing import Callable, Dict, Union
+
+import numpy as np
+import pandas as pd
+
+Normalizer = Callable[[np.ndarray], np.ndarray]
+
+
+def _nan_stats(func, values: np.ndarray) -> np.ndarray:
+    """按列计算忽略缺失值的统计量，整列缺失时返回 NaN 且不告警"""
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        return func(values, axis=0)
+
+
+def _constant_columns(values: np.ndarray, normalized: np.ndarray, constant: np.ndarray) -> np.ndarray:
+    """整列取值相同时无法区分好坏，非缺失值统一取 0.5"""
+    return np.where(constant, np.where(np.isnan(values), np.nan, 0.5), normalized)
+
+
+def min_max_normalize(values: np.ndarray) -> np.ndarray:
+    """按列做 Min-Max 标准化到 [0,1]，忽略缺失值"""
+    min_val = _nan_stats(np.nanmin, values)
+    span = _nan_stats(np.nanmax, values) - min_val
+    with np.errstate(all='ignore'):
+        normalized = (values - min_val) / span
+    return _constant_columns(values, normalized, span == 0)
+
+
+def rank_normalize(values: np.ndarray) -> np.ndarray:
+    """按列做排名标准化到 [0,1]（并列取平均名次），对极端值不敏感"""
+    ranks = pd.DataFrame(values).rank(axis=0, method='average').to_numpy()
+    counts = np.sum(~np.isnan(values), axis=0)
+    span = _nan_stats(np.nanmax, values) - _nan_stats(np.nanmin, values)
+    with np.errstate(all='ignore'):
+        normalized = (ranks - 1) / (counts - 1)
+    return _constant_columns(values, normalized, span == 0)
+
+
+def zscore_normalize(values: np.ndarray, clip: float = 3.0) -> np.ndarray:
+    """按列做 Z-Score 标准化，截断到 [-clip, clip] 后线性映射到 [0,1]"""
+    mean = _nan_stats(np.nanmean, values)
+    std = _nan_stats(np.nanstd, values)
+    with np.errstate(all='ignore'):
+        z = (values - mean) / std
+    normalized = (np.clip(z, -clip, clip) + clip) / (2 * clip)
+    return _constant_columns(values, normalized, std == 0)
+
+
+NORMALIZERS: Dict[str, Normalizer] = {
+    'min_max': min_max_normalize,
+    'rank': rank_normalize,
+    'zscore': zscore_normalize,
+}
+
+
+def get_normalizer(normalizer: Union[str, Normalizer]) -> Normalizer:
+    if callable(normalizer):
+        return normalizer
+    try:
+        return NORMALIZERS[normalizer]
+    except KeyError:
+        raise ValueError(f"未知的标准化方法: {normalizer}，可选: {list(NORMALIZERS)}")
+
+
+def weighted_scores(
+    data: pd.DataFrame,
+    weights: Dict[str, float],
+    normalizer: Union[str, Normalizer] = 'min_max'
+) -> pd.Series:
+    """横截面加权打分
+
+    每个指标列只标准化一次；权重为负的指标先反转（1 - 标准化值），再与权重绝对值做一次矩阵乘法。
+    缺失值不参与计算，得分按每只股票实际有效的权重之和重新归一化，没有有效指标的股票得 0 分。
+
+    Args:
+        data: 以股票代码为索引、指标为列的数据
+        weights: 指标权重，正数越大越好，负数越小越好
+        normalizer: 标准化方法名（min_max/rank/zscore）或自定义函数
+
+    Returns:
+        以股票代码为索引的得分
+    """
+    columns = [column for column in weights if column in data.columns]
+    if data.empty or not columns:
+        return pd.Series(0.0, index=data.index)
+
+    values = data[columns].to_numpy(dtype=float)
+    signed = np.array([weights[column] for column in columns], dtype=float)
+    abs_weights = np.abs(signed)
+
+    normalized = get_normalizer(normalizer)(values)
+    normalized = np.where(signed < 0, 1 - normalized, normalized)
+    valid = ~np.isnan(values)
+
+    weighted = np.where(valid, normalized, 0.0) @ abs_weights
+    valid_weights = valid @ abs_weights
+    scores = np.divide(weighted, valid_weights, out=np.zeros_like(weighted), where=valid_weights > 0)
+    return pd.Series(scores, index=data.index)
@@ -1,8 +1,26 @@
+import logging
+import time
+from concurrent.futures import as_completed
 import pandas as pd
 import numpy as np
-from datetime import datetime
-import akshare as ak
-from typing import List, Dict
+from datetime import datetime, timedelta
+from typing import List, Dict, Optional, Tuple
+from app.core.concurrency import get_io_executor
+from app.services.financial_cache import financial_indicator_cache
+from app.services.stock_data import BatchFetchStats, StockDataService
+from app.strategies.scoring import weighted_scores
+
+logger = logging.getLogger(__name__)
+
+# 财务指标在 BollSignal 中对应的列
+FINANCIAL_COLUMNS = {
+    'ROE': 'roe',
+    'profit_growth': 'profit_growth',
+    'gross_margin': 'gross_margin',
+    'debt_ratio': 'debt_ratio',
+    'cash_ratio': 'cash_ratio',
+    'revenue_growth': 'revenue_growth',
+}
 
 class StockScorer:
     def __init__(self):
@@ -18,15 +36,18 @@ class StockScorer:
             'cash_ratio': 0.1         # 现金比率
         }
         
-    def get_financial_data(self, stock_code: str) -> Dict:
-        """获取股票财务指标"""
+    def get_financial_data(self, stock_code: str, date: Optional[datetime] = None) -> Dict:
+        """获取股票在 date（默认为当前时间）当天已经公布的最新一期财务指标"""
         try:
-            # 获取主要财务指标
-            financial = ak.stock_financial_analysis_indicator(stock=stock_code)
-            
-            # 获取最新一期的财务数据
+            # 按报告期从新到旧排列，只包含 date 当天已经可以获得的报告期
+            financial = financial_indicator_cache.as_of(stock_code, date)
+            if financial.empty:
+                return None
+
             latest = financial.iloc[0]
-            prev_year = financial.iloc[4]  # 去年同期
+            # 去年同期按报告期匹配，缺少时增长率为缺失值
+            prev_year = financial[financial['日期'] == latest['日期'] - pd.DateOffset(years=1)]
+            prev_year = prev_year.iloc[0] if not prev_year.empty else pd.Series(np.nan, index=financial.columns)
             
             return {
                 'ROE': latest['净资产收益率(%)'],
@@ -37,18 +58,38 @@ class StockScorer:
                 'revenue_growth': (latest['营业收入'] - prev_year['营业收入']) / abs(prev_year['营业收入']) * 100
             }
         except Exception as e:
-            print(f"获取 {stock_code} 财务数据失败: {str(e)}")
+            logger.warning(f"获取 {stock_code} 财务数据失败: {str(e)}")
             return None
 
-    def normalize_score(self, data: Dict) -> float:
-        """计算归一化后的得分"""
-        score = 0
-        for metric, weight in self.weights.items():
-            if metric in data:
-                # 将数据归一化到0-1之间
-                normalized_value = (data[metric] - min(data[metric])) / (max(data[metric]) - min(data[metric]))
-                score += normalized_value * weight
-        return score
+    def score_batch(self, financials: Dict[str, Dict], normalizer: str = 'min_max') -> pd.Series:
+        """对一批候选股票一次性打分
+
+        构造 候选股票 × 指标 矩阵，每个指标在全部候选之间横截面标准化，
+        负权重指标反转后与权重做一次矩阵-向量乘法（见 weighted_scores）。
+
+        Args:
+            financials: {股票代码: get_financial_data 返回的指标}
+            normalizer: 标准化方法（min_max/rank/zscore）
+
+        Returns:
+            以股票代码为索引的得分
+        """
+        # 接口返回的指标可能是 '--' 之类的字符串，无法解析的按缺失值处理
+        data = pd.DataFrame.from_dict(financials, orient='index').apply(pd.to_numeric, errors='coerce')
+        return weighted_scores(data, self.weights, normalizer)
+
+    @staticmethod
+    def top_n(scores: pd.Series, n: int) -> pd.Series:
+        """得分最高的 n 只股票（从高到低），用 argpartition 部分选择，只对选出的 n 个排序"""
+        if n <= 0 or scores.empty:
+            return scores.iloc[:0]
+        values = scores.to_numpy()
+        if n < len(values):
+            selected = np.argpartition(-values, n - 1)[:n]
+        else:
+            selected = np.arange(len(values))
+        selected = selected[np.argsort(-values[selected], kind='stable')]
+        return scores.iloc[selected]
 
 class BollScreener:
     def __init__(self, period=20, std_dev=2, include_cyb=False, include_kcb=False, top_n=10):
@@ -58,34 +99,37 @@ class BollScreener:
         self.include_kcb = include_kcb
         self.top_n = top_n  # 最终选取的股票数量
         self.scorer = StockScorer()
+        self.stock_data_service = StockDataService()
         
     def get_stock_list(self):
         """获取符合条件的股票列表"""
-        print("正在获取股票列表...")
+        logger.info("正在获取股票列表...")
         
-        # 获取所有A股基本信息
-        stock_info = ak.stock_zh_a_spot_em()
+        # 获取所有A股基本信息（共享的全市场快照）
+        stock_info = self.stock_data_service.load_stock_spot_data()
+        if stock_info.empty:
+            return []
         
         # 基础过滤：剔除ST和退市股票
-        df = stock_info[~stock_info['名称'].str.contains('ST|退')]
+        df = stock_info[~stock_info['name'].str.contains('ST|退')]
         
         # 板块过滤
         if not self.include_cyb:
-            df = df[~df['代码'].str.startswith('300')]
+            df = df[~df['code'].str.startswith('300')]
         if not self.include_kcb:
-            df = df[~df['代码'].str.startswith('688')]
+            df = df[~df['code'].str.startswith('688')]
             
         # 获取流通市值数据并排序
-        df['流通市值'] = df['流通市值'].astype(float)
-        df = df.nsmallest(300, '流通市值')
+        df = df.assign(circulating_value=df['circulating_value'].astype(float))
+        df = df.nsmallest(300, 'circulating_value')
         
-        return df[['代码', '名称']].to_dict('records')
+        return df[['code', 'name']].to_dict('records')
 
     def check_signals(self, data: pd.DataFrame) -> str:
         """检查布林带买卖信号"""
         # 计算布林带指标
-        data['MA'] = data['收盘'].rolling(window=self.period).mean()
-        data['STD'] = data['收盘'].rolling(window=self.period).std()
+        data['MA'] = data['close'].rolling(window=self.period).mean()
+        data['STD'] = data['close'].rolling(window=self.period).std()
         data['Upper'] = data['MA'] + (self.std_dev * data['STD'])
         data['Lower'] = data['MA'] - (self.std_dev * data['STD'])
         
@@ -94,68 +138,157 @@ class BollScreener:
         prev = data.iloc[-2]
         
         # 买入信号：价格从下轨上穿
-        if latest['收盘'] > latest['Lower'] and prev['收盘'] <= prev['Lower']:
+        if latest['close'] > latest['Lower'] and prev['close'] <= prev['Lower']:
             return 'BUY'
         # 卖出信号：价格从上轨下穿
-        elif latest['收盘'] < latest['Upper'] and prev['收盘'] >= prev['Upper']:
+        elif latest['close'] < latest['Upper'] and prev['close'] >= prev['Upper']:
             return 'SELL'
         else:
             return 'HOLD'
 
-    def run(self):
-        """主运行函数"""
-        print(f"开始布林带选股 - {datetime.now()}")
+    def calculate_signal_panel(self, stock_data: pd.DataFrame) -> pd.DataFrame:
+        """对多只股票的全部K线一次性计算 check_signals 的信号
+
+        按股票分组滚动计算，每一行的 signal 等于把截至该行的数据交给 check_signals 的结果
+        （'BUY'/'SELL'/'HOLD'），每只股票的第一根K线没有前一根可比较，signal 为 None。
+        """
+        df = stock_data.sort_values(['code', 'date'], kind='stable').reset_index(drop=True)
+        grouped = df.groupby('code', sort=False)
+        rolling_close = grouped['close'].rolling(window=self.period)
+        df['MA'] = rolling_close.mean().reset_index(level=0, drop=True)
+        df['STD'] = rolling_close.std().reset_index(level=0, drop=True)
+        df['Upper'] = df['MA'] + (self.std_dev * df['STD'])
+        df['Lower'] = df['MA'] - (self.std_dev * df['STD'])
+
+        close = df['close'].to_numpy()
+        prev_close = grouped['close'].shift(1).to_numpy()
+        lower, upper = df['Lower'].to_numpy(), df['Upper'].to_numpy()
+        prev_lower = df['Lower'].groupby(df['code'], sort=False).shift(1).to_numpy()
+        prev_upper = df['Upper'].groupby(df['code'], sort=False).shift(1).to_numpy()
+
+        buy = (close > lower) & (prev_close <= prev_lower)
+        sell = (close < upper) & (prev_close >= prev_upper)
+        signal = np.where(buy, 'BUY', np.where(sell, 'SELL', 'HOLD')).astype(object)
+        signal[grouped.cumcount().to_numpy() == 0] = None
+        df['signal'] = signal
+        return df
+
+    @property
+    def history_days(self) -> int:
+        """取最近 period + 1 根K线需要回看的自然日数（按每周 5 个交易日换算，再留出长假的余量）"""
+        return (self.period + 1) * 7 // 5 + 15
+
+    @staticmethod
+    def make_buy_signal(stock: Dict, close_price: float, score: float, financial_data: Dict) -> Dict:
+        """买入信号记录，格式与 StockScreenerTask.process_signals 的输入一致"""
+        return {
+            'stock_code': stock['code'],
+            'stock_name': stock['name'],
+            'close_price': float(close_price),
+            'score': score,
+            **{column: financial_data.get(metric) for metric, column in FINANCIAL_COLUMNS.items()},
+        }
+
+    @staticmethod
+    def make_sell_signal(stock: Dict, close_price: float) -> Dict:
+        """卖出信号记录"""
+        return {
+            'stock_code': stock['code'],
+            'stock_name': stock['name'],
+            'close_price': float(close_price),
+        }
+
+    def _check_stock(self, stock_code: str, start: pd.Timestamp, end: pd.Timestamp, trade_date: Optional[str]) -> Tuple[Optional[str], float]:
+        """获取单只股票最近 period + 1 根K线并检查信号，返回 (信号, 最新收盘价)
+
+        K线来自本地日线仓库，为前复权价格（原先直接请求数据源时为不复权价格）：
+        前复权不改变最新一根K线的价格，选股当天记录的买卖价格仍是实际收盘价；
+        布林带用复权后的历史计算，除权除息造成的价格缺口不会再被误判为跌破下轨/突破上轨。
+        历史日期选股和信号回放中记录的价格是当前复权基准下的价格，可能与当日实际报价不同。
+        """
+        stock_data = self.stock_data_service.load_daily_data(stock_code, start.strftime('%Y%m%d'), end.strftime('%Y%m%d'))
+        stock_data = stock_data.tail(self.period + 1).reset_index(drop=True)
+        # 指定历史日期时，当天停牌（没有K线）的股票不产生信号
+        if len(stock_data) < 2 or (trade_date and pd.Timestamp(stock_data['date'].iloc[-1]) != end):
+            return None, np.nan
+        return self.check_signals(stock_data), float(stock_data['close'].iloc[-1])
+
+    def score_buy_candidates(self, candidates: List[Tuple[Dict, float]], date: Optional[datetime] = None) -> List[Dict]:
+        """并发获取买入候选的财务数据（按报告期缓存），整批打分后返回得分最高的 top_n 条买入信号"""
+        financial_indicator_cache.prefetch([stock['code'] for stock, _ in candidates], date)
+
+        financials, quotes = {}, {}
+        for stock, close_price in candidates:
+            financial_data = self.scorer.get_financial_data(stock['code'], date)
+            if financial_data:
+                financials[stock['code']] = financial_data
+                quotes[stock['code']] = (stock, close_price)
+
+        # 在全部候选之间横截面打分，只保留得分最高的 top_n 只股票
+        top = self.scorer.top_n(self.scorer.score_batch(financials), self.top_n)
+        return [
+            self.make_buy_signal(quotes[code][0], quotes[code][1], float(score), financials[code])
+            for code, score in top.items()
+        ]
+
+    def run(self, trade_date: Optional[str] = None):
+        """主运行函数
+
+        股票的K线获取在共享 IO 线程池中并发执行（数据源请求数受 MAX_CONCURRENT_REQUESTS 限制），
+        每只股票只取最近 period + 1 根K线；本地日线仓库已有的部分不再请求。
+
+        Args:
+            trade_date: 选股日期（YYYY-MM-DD），默认为今天
+        """
+        end = pd.Timestamp(trade_date) if trade_date else pd.Timestamp(datetime.now().date())
+        start = end - timedelta(days=self.history_days)
+        logger.info(f"开始布林带选股 - {end.date()}")
         
         # 获取初始股票池
         stock_list = self.get_stock_list()
-        print(f"初始股票池数量: {len(stock_list)}")
+        total = len(stock_list)
+        logger.info(f"初始股票池数量: {total}")
         
         # 存储买卖信号的股票
-        buy_signals = []
+        buy_candidates = []
         sell_signals = []
+        stats = BatchFetchStats()
         
         # 布林带筛选
-        for i, stock in enumerate(stock_list, 1):
+        executor = get_io_executor()
+        futures = {
+            executor.submit(self._check_stock, stock['code'], start, end, trade_date): (stock, time.perf_counter())
+            for stock in stock_list
+        }
+        report_every = max(total // 10, 1)
+        for i, future in enumerate(as_completed(futures), 1):
+            stock, submitted = futures[future]
             try:
-                print(f"布林带筛选进度: {i}/{len(stock_list)} - {stock['代码']}")
-                stock_data = ak.stock_zh_a_hist(
-                    symbol=stock['代码'], 
-                    period="daily",
-                    start_date="20240101",
-                    end_date=datetime.now().strftime("%Y%m%d")
-                )
-                
-                signal = self.check_signals(stock_data)
-                if signal == 'BUY':
-                    # 获取财务数据并计算得分
-                    financial_data = self.scorer.get_financial_data(stock['代码'])
-                    if financial_data:
-                        score = self.scorer.normalize_score(financial_data)
-                        buy_signals.append({
-                            'code': stock['代码'],
-                            'name': stock['名称'],
-                            'score': score,
-                            'financial_data': financial_data
-                        })
-                elif signal == 'SELL':
-                    sell_signals.append({
-                        'code': stock['代码'],
-                        'name': stock['名称']
-                    })
-                    
+                signal, close_price = future.result()
+                stats.record(stock['code'], time.perf_counter() - submitted)
             except Exception as e:
-                print(f"处理股票 {stock['代码']} 时出错: {str(e)}")
+                stats.record(stock['code'], time.perf_counter() - submitted, e)
+                logger.warning(f"处理股票 {stock['code']} 时出错: {str(e)}")
                 continue
+
+            if signal == 'BUY':
+                buy_candidates.append((stock, close_price))
+            elif signal == 'SELL':
+                sell_signals.append(self.make_sell_signal(stock, close_price))
+
+            if i % report_every == 0 or i == total:
+                logger.info(f"布林带筛选进度: {i}/{total}，买入候选 {len(buy_candidates)}，卖出 {len(sell_signals)}")
+
+        logger.info(f"布林带筛选完成: {stats.summary()}")
+
+        # 获取财务数据并计算得分
+        buy_signals = self.score_buy_candidates(buy_candidates, end.to_pydatetime())
         
-        # 按得分排序买入信号
-        buy_signals.sort(key=lambda x: x['score'], reverse=True)
-        buy_signals = buy_signals[:self.top_n]  # 只保留得分最高的 top_n 只股票
-        
-        print(f"\n买入信号数量: {len(buy_signals)}")
-        print(f"卖出信号数量: {len(sell_signals)}")
+        logger.info(f"买入信号数量: {len(buy_signals)}，卖出信号数量: {len(sell_signals)}")
         
         return buy_signals, sell_signals
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
     screener = BollScreener(include_cyb=False, include_kcb=False, top_n=10)
     buy_signals, sell_signals = screener.run() 
\ No newline at end of file
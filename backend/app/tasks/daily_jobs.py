@@ -0,0 +1,79 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
+from app.core.config import settings
+from app.core.scheduler import TaskScheduler
+from app.db.session import SessionLocal
+from app.services.performance_store import PerformanceStore
+from app.tasks.boll_screener import BollScreener
+from app.tasks.stock_bollinger_score_screener import StockScreenerTask
+from app.tasks.update_trading_calendar import update_trading_calendar
+from app.utils.trading_calendar import get_trading_calendar
+
+logger = logging.getLogger(__name__)
+
+
+def warm_up_market_data():
+    """开盘前预热：刷新行情快照缓存，把选股股票池的日线补齐到上一个交易日
+
+    收盘后的选股只需再下载当天一根K线，不必在收盘后集中补历史数据。
+    """
+    screener = BollScreener(
+        include_cyb=settings.INCLUDE_CYB,
+        include_kcb=settings.INCLUDE_KCB,
+        top_n=settings.TOP_N_STOCKS
+    )
+    screener.stock_data_service.load_stock_spot_data(max_age=0)
+    stock_list = screener.get_stock_list()
+    if not stock_list:
+        raise ValueError("预热失败：股票池为空")
+
+    end = get_trading_calendar().prev_trading_day(datetime.now()) or datetime.now() - timedelta(days=1)
+    start = end - timedelta(days=screener.history_days)
+    data = asyncio.run(screener.stock_data_service.get_batch_daily_data(
+        [stock['code'] for stock in stock_list],
+        start.strftime('%Y%m%d'),
+        end.strftime('%Y%m%d')
+    ))
+    logger.info(f"预热完成：{len(stock_list)} 只股票，{len(data)} 根K线")
+
+
+def run_screener():
+    """收盘后运行布林带选股并写入信号"""
+    StockScreenerTask().execute(raise_errors=True)
+
+
+def refresh_performance():
+    """从每个策略最后一个已计算的交易日继续刷新绩效表的滚动指标"""
+    db = SessionLocal()
+    try:
+        updated = PerformanceStore(db).refresh_all()
+        db.commit()
+        logger.info(f"绩效表刷新完成：{sum(updated.values())} 行，{len(updated)} 个策略")
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def register_daily_jobs(scheduler: TaskScheduler):
+    """注册每日定时任务"""
+    scheduler.add_job(
+        'warmup', warm_up_market_data, settings.WARMUP_TIME,
+        description='开盘前预热日线仓库和行情快照'
+    )
+    scheduler.add_job(
+        'screener', run_screener, settings.SCREENER_TIME,
+        description='收盘后布林带选股'
+    )
+    scheduler.add_job(
+        'performance_refresh', refresh_performance, settings.PERFORMANCE_REFRESH_TIME,
+        description='刷新策略绩效表的滚动指标'
+    )
+    scheduler.add_job(
+        'trading_calendar', update_trading_calendar, settings.CALENDAR_UPDATE_TIME,
+        trading_days_only=False, day_of_week='sun',
+        description='更新交易日历'
+    )
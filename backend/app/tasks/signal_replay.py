@@ -0,0 +1,173 @@
+import asyncio
+import hashlib
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.models.stock import BollReplayCheckpoint
+from app.services.financial_cache import financial_indicator_cache
+from app.services.signal_store import BollSignalWriter
+from app.tasks.boll_screener import BollScreener
+from app.utils.trading_calendar import get_trading_calendar
+
+logger = logging.getLogger(__name__)
+
+
+class BollSignalReplay:
+    """布林带选股信号的历史回放
+
+    股票池中每只股票的日线只下载一次（覆盖回放区间和指标预热区间），
+    用 BollScreener.calculate_signal_panel 一次性算出每个交易日、每只股票的信号，
+    出现过买入信号的股票预先并发获取一次财务数据；之后按交易日顺序，与实盘选股一样
+    把当天的买入候选作为一批，用当天已经公布的财务报告打分取 top_n（BollScreener.score_buy_candidates），
+    批量写入 boll_signals。
+    断点保存在 boll_replay_checkpoints 表中，与每批信号在同一个事务中提交，
+    中断后用相同参数重新运行会从断点之后的交易日继续。
+    """
+
+    def __init__(
+        self,
+        start_date: str,
+        end_date: str,
+        screener: Optional[BollScreener] = None,
+        commit_every: int = 20
+    ):
+        self.start_date = pd.Timestamp(start_date)
+        self.end_date = pd.Timestamp(end_date)
+        self.screener = screener or BollScreener(
+            include_cyb=settings.INCLUDE_CYB,
+            include_kcb=settings.INCLUDE_KCB,
+            top_n=settings.TOP_N_STOCKS
+        )
+        self.commit_every = commit_every
+
+    @property
+    def params(self) -> Dict:
+        return {
+            'start_date': self.start_date.strftime('%Y-%m-%d'),
+            'end_date': self.end_date.strftime('%Y-%m-%d'),
+            'period': self.screener.period,
+            'std_dev': self.screener.std_dev,
+            'include_cyb': self.screener.include_cyb,
+            'include_kcb': self.screener.include_kcb,
+            'top_n': self.screener.top_n,
+        }
+
+    @property
+    def checkpoint_key(self) -> str:
+        return hashlib.sha1(json.dumps(self.params, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+    def load_checkpoint(self, db) -> Dict:
+        checkpoint = db.get(BollReplayCheckpoint, self.checkpoint_key)
+        if checkpoint is None:
+            return {}
+        return {
+            'last_date': checkpoint.last_date.strftime('%Y-%m-%d') if checkpoint.last_date else None,
+            'completed': bool(checkpoint.completed),
+        }
+
+    def _save_checkpoint(self, db, last_date: datetime, completed: bool = False):
+        """在当前事务中写入断点，随信号一起提交"""
+        db.merge(BollReplayCheckpoint(
+            key=self.checkpoint_key,
+            params=self.params,
+            last_date=last_date,
+            completed=completed,
+            updated_at=datetime.now(),
+        ))
+
+    def load_history(self, stock_codes: List[str]) -> pd.DataFrame:
+        """并发下载（或从本地仓库读取）全部股票的日线，每只股票只取一次"""
+        return asyncio.run(self.screener.stock_data_service.get_batch_daily_data(
+            stock_codes,
+            (self.start_date - timedelta(days=self.screener.history_days)).strftime('%Y%m%d'),
+            self.end_date.strftime('%Y%m%d')
+        ))
+
+    def iter_daily_signals(
+        self,
+        panel: pd.DataFrame,
+        names: Dict[str, str],
+        after: Optional[pd.Timestamp] = None
+    ) -> Iterator[Tuple[pd.Timestamp, List[Dict], List[Dict]]]:
+        """按交易日产出 (日期, 买入信号, 卖出信号)，格式与 process_signals 的输入一致
+
+        只回放交易日历中的交易日，数据源在休市日返回的异常K线不会产生信号。
+        """
+        trading_days = get_trading_calendar().range(self.start_date, self.end_date)
+        if after is not None:
+            trading_days = trading_days[trading_days > after]
+        panel = panel.loc[panel['date'].isin(trading_days), ['date', 'code', 'close', 'signal']]
+
+        for date, day in panel.groupby('date', sort=True):
+            sell_rows = day[day['signal'] == 'SELL']
+            sells = [
+                self.screener.make_sell_signal({'code': code, 'name': names.get(code, '')}, close)
+                for code, close in zip(sell_rows['code'], sell_rows['close'])
+            ]
+
+            buy_rows = day[day['signal'] == 'BUY']
+            buys = self.screener.score_buy_candidates(
+                [({'code': code, 'name': names.get(code, '')}, close) for code, close in zip(buy_rows['code'], buy_rows['close'])],
+                date=date.to_pydatetime()
+            ) if not buy_rows.empty else []
+            yield date, buys, sells
+
+    def run(self, session_factory: Callable = SessionLocal) -> Dict:
+        """执行回放，返回写入统计"""
+        db = session_factory()
+        try:
+            checkpoint = self.load_checkpoint(db)
+        finally:
+            db.close()
+        if checkpoint.get('completed'):
+            logger.info(f"历史回放 {self.params} 已完成，跳过")
+            return {'bought': 0, 'sold': 0, 'days': 0, 'resumed_from': checkpoint['last_date']}
+        resume_after = pd.Timestamp(checkpoint['last_date']) if checkpoint.get('last_date') else None
+        if resume_after is not None:
+            logger.info(f"从断点 {checkpoint['last_date']} 之后继续回放")
+
+        stock_list = self.screener.get_stock_list()
+        names = {stock['code']: stock['name'] for stock in stock_list}
+        history = self.load_history(list(names))
+        if history.empty:
+            logger.warning("没有获取到历史数据，回放结束")
+            return {'bought': 0, 'sold': 0, 'days': 0, 'resumed_from': None}
+        panel = self.screener.calculate_signal_panel(history)
+        logger.info(f"已计算 {panel['code'].nunique()} 只股票、{len(panel)} 根K线的信号")
+
+        in_range = panel['date'].isin(get_trading_calendar().range(self.start_date, self.end_date))
+        # 出现过买入信号的股票先整体并发获取财务数据，逐日打分时直接命中缓存
+        buy_codes = panel.loc[in_range & (panel['signal'] == 'BUY'), 'code'].unique().tolist()
+        financial_indicator_cache.prefetch(buy_codes)
+        logger.info(f"出现过买入信号的股票 {len(buy_codes)} 只")
+
+        db = session_factory()
+        days = 0
+        try:
+            writer = BollSignalWriter(db, commit_every=self.commit_every, on_commit=self._save_checkpoint)
+            writer.preload_open_positions()
+            for date, buys, sells in self.iter_daily_signals(panel, names, after=resume_after):
+                writer.write_day(buys, sells, date.to_pydatetime())
+                days += 1
+            writer.commit()
+            self._save_checkpoint(db, writer.last_signal_date or resume_after or self.start_date, completed=True)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+        logger.info(f"历史回放完成：{days} 个交易日，买入 {writer.bought} 条，卖出 {writer.sold} 条")
+        return {
+            'bought': writer.bought,
+            'sold': writer.sold,
+            'days': days,
+            'resumed_from': checkpoint.get('last_date'),
+        }
@@ -1,29 +1,27 @@
+import argparse
 import logging
 from datetime import datetime
 import traceback
-from typing import List, Dict
-from sqlalchemy import and_
+from typing import List, Dict, Optional
+
+import pandas as pd
 
 from app.core.config import settings
 from app.db.session import SessionLocal
-from app.models.stock import BollSignal
+from app.services.performance_store import record_live_day
+from app.services.signal_store import BollSignalWriter
 from app.tasks.boll_screener import BollScreener
+from app.tasks.signal_replay import BollSignalReplay
+from app.utils.trading_calendar import get_trading_calendar
 
 logger = logging.getLogger(__name__)
 
 class StockScreenerTask:
     def is_trading_day(self) -> bool:
-        """检查是否为交易日"""
-        try:
-            import akshare as ak
-            trade_cal = ak.tool_trade_date_hist_sina()
-            today = datetime.now().strftime('%Y-%m-%d')
-            return today in trade_cal['trade_date'].values
-        except Exception as e:
-            logger.error(f"检查交易日失败: {str(e)}")
-            return False
+        """检查今天是否为交易日（进程内交易日历，不再每次下载）"""
+        return get_trading_calendar().is_trading_day(datetime.now())
 
-    def process_signals(self, db, buy_signals: List[Dict], sell_signals: List[Dict], signal_date: datetime = None) -> None:
+    def process_signals(self, db, buy_signals: List[Dict], sell_signals: List[Dict], signal_date: datetime = None) -> List[Dict]:
         """处理买入和卖出信号
         
         Args:
@@ -31,67 +29,45 @@ class StockScreenerTask:
             buy_signals: 买入信号列表
             sell_signals: 卖出信号列表
             signal_date: 信号产生的日期，用于回测。默认为 None，表示使用当前时间
+
+        Returns:
+            当天的模拟买卖记录（BollSignalWriter.trades）
         """
         try:
             # 如果没有指定日期，使用当前时间
             signal_date = signal_date or datetime.now()
-            
-            # 处理卖出信号
-            sell_codes = {signal['stock_code'] for signal in sell_signals}
-            if sell_codes:
-                # 查找所有要卖出的持仓记录
-                holding_positions = db.query(BollSignal).filter(
-                    and_(
-                        BollSignal.stock_code.in_(sell_codes),
-                        BollSignal.trade_status == '持仓中'
-                    )
-                ).all()
-
-                # 更新卖出信息
-                for position in holding_positions:
-                    sell_signal = next(s for s in sell_signals if s['stock_code'] == position.stock_code)
-                    position.sell_date = signal_date
-                    position.sell_price = sell_signal['close_price']
-                    position.trade_status = '已卖出'
-                    # 计算收益率
-                    position.profit_rate = (position.sell_price - position.buy_price) / position.buy_price * 100
-                    # 计算持仓天数
-                    position.holding_period = (position.sell_date - position.buy_date).days
-                    # 计算最大回撤（如果有历史价格数据的话）
-                    # position.max_drawdown = calculate_max_drawdown(position)
-                    db.add(position)
-
-            # 处理买入信号
-            new_signals = [
-                BollSignal(
-                    stock_code=signal['stock_code'],
-                    stock_name=signal['stock_name'],
-                    score=signal.get('score'),
-                    roe=signal.get('roe'),
-                    profit_growth=signal.get('profit_growth'),
-                    gross_margin=signal.get('gross_margin'),
-                    debt_ratio=signal.get('debt_ratio'),
-                    cash_ratio=signal.get('cash_ratio'),
-                    revenue_growth=signal.get('revenue_growth'),
-                    buy_date=signal_date,
-                    buy_price=signal['close_price'],
-                    trade_status='持仓中'
-                ) for signal in buy_signals
-            ]
-            
-            if new_signals:
-                db.bulk_save_objects(new_signals)
-            
-            db.commit()
-            logger.info(f"成功处理 {len(new_signals)} 条买入信号和 {len(holding_positions)} 条卖出信号")
+
+            writer = BollSignalWriter(db)
+            bought, sold = writer.write_day(buy_signals, sell_signals, signal_date)
+            logger.info(f"成功处理 {bought} 条买入信号和 {sold} 条卖出信号")
+            return writer.trades
             
         except Exception as e:
             db.rollback()
             logger.error(f"信号处理失败: {str(e)}")
             raise
 
-    def execute(self) -> None:
-        """执行选股任务"""
+    def record_performance(self, db, screener: BollScreener, trades: List[Dict]) -> None:
+        """按模拟账户记录当天的成交和净值（持仓按行情快照的最新价盯市）"""
+        spot = screener.stock_data_service.load_stock_spot_data()
+        prices = {}
+        if not spot.empty:
+            price = pd.to_numeric(spot['price'], errors='coerce')
+            valid = price > 0
+            prices = dict(zip(spot.loc[valid, 'code'], price[valid].tolist()))
+        row = record_live_day(
+            db, settings.LIVE_STRATEGY_NAME, datetime.now(), trades, prices,
+            initial_capital=settings.DEFAULT_INITIAL_CAPITAL,
+            position_size=settings.LIVE_POSITION_SIZE
+        )
+        logger.info(f"模拟账户净值 {row['total_value']:.2f}，持仓 {row['position_count']} 只")
+
+    def execute(self, raise_errors: bool = False) -> None:
+        """执行选股任务
+
+        Args:
+            raise_errors: 失败时记录日志后继续抛出异常（由定时任务调用时用于统计失败次数）
+        """
         try:
             if not self.is_trading_day():
                 logger.info("今天不是交易日，跳过执行")
@@ -108,77 +84,73 @@ class StockScreenerTask:
                 )
                 buy_signals, sell_signals = screener.run()
                 
+                trades = []
                 if buy_signals or sell_signals:
-                    self.process_signals(db, buy_signals, sell_signals, datetime.now())
+                    trades = self.process_signals(db, buy_signals, sell_signals, datetime.now())
                     logger.info(f"选股任务完成，买入信号 {len(buy_signals)} 只，卖出信号 {len(sell_signals)} 只")
                 else:
                     logger.warning("没有符合条件的股票")
+
+                self.record_performance(db, screener, trades)
                     
             finally:
                 db.close()
                 
         except Exception as e:
             logger.error(f"选股任务执行失败: {str(e)}")
-            logger.error(traceback.format_exc()) 
+            logger.error(traceback.format_exc())
+            if raise_errors:
+                raise
 
-    def backtest_historical_data(self, start_date: str, end_date: str) -> None:
+    def backtest_historical_data(self, start_date: str, end_date: str, commit_every: int = 20) -> None:
         """回测历史数据并写入数据库
         
+        每只股票的历史数据只下载一次，全部交易日的信号一次性向量化计算后批量写库；
+        中断后用相同参数重新运行会从上次提交的交易日之后继续。
+        
         Args:
             start_date: 开始日期，格式：'YYYY-MM-DD'
             end_date: 结束日期，格式：'YYYY-MM-DD'
+            commit_every: 每处理多少个交易日批量写库并提交一次
         """
         try:
             logger.info(f"开始回测从 {start_date} 到 {end_date} 的历史数据")
             
-            # 获取交易日历
-            import akshare as ak
-            trade_cal = ak.tool_trade_date_hist_sina()
-            trading_days = trade_cal[
-                (trade_cal['trade_date'] >= start_date) & 
-                (trade_cal['trade_date'] <= end_date)
-            ]['trade_date'].values
-            
-            db = SessionLocal()
-            try:
-                screener = BollScreener(
-                    include_cyb=settings.INCLUDE_CYB,
-                    include_kcb=settings.INCLUDE_KCB,
-                    top_n=settings.TOP_N_STOCKS
-                )
-                
-                # 遍历每个交易日
-                for trade_date in trading_days:
-                    logger.info(f"正在处理交易日: {trade_date}")
-                    
-                    # 设置当前日期为回测日期
-                    current_date = datetime.strptime(trade_date, '%Y-%m-%d')
-                    
-                    # 运行策略获取信号
-                    buy_signals, sell_signals = screener.run(trade_date=trade_date)
-                    
-                    if buy_signals or sell_signals:
-                        # 处理信号时使用历史日期
-                        with db.begin():
-                            self.process_signals(
-                                db, 
-                                buy_signals, 
-                                sell_signals, 
-                                signal_date=current_date
-                            )
-                        logger.info(f"{trade_date} 处理完成：买入信号 {len(buy_signals)} 只，卖出信号 {len(sell_signals)} 只")
-                    
-                logger.info("历史数据回测完成")
-                
-            finally:
-                db.close()
+            screener = BollScreener(
+                include_cyb=settings.INCLUDE_CYB,
+                include_kcb=settings.INCLUDE_KCB,
+                top_n=settings.TOP_N_STOCKS
+            )
+            result = BollSignalReplay(start_date, end_date, screener=screener, commit_every=commit_every).run()
+            logger.info(f"历史数据回测完成：{result}")
                 
         except Exception as e:
             logger.error(f"历史数据回测失败: {str(e)}")
             logger.error(traceback.format_exc()) 
 
-# 回测过去一年的数据
-screener_task = StockScreenerTask()
-start_date = '2023-03-20'  # 一年前的日期
-end_date = '2024-03-20'    # 当前日期
-screener_task.backtest_historical_data(start_date, end_date)
\ No newline at end of file
+
+def main(argv: Optional[List[str]] = None):
+    """命令行入口
+
+    python -m app.tasks.stock_bollinger_score_screener run
+    python -m app.tasks.stock_bollinger_score_screener replay --start 2023-03-20 --end 2024-03-20
+    """
+    parser = argparse.ArgumentParser(description="布林带选股任务")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("run", help="执行当天的选股任务")
+    replay = subparsers.add_parser("replay", help="回放历史区间的选股信号并写入数据库")
+    replay.add_argument("--start", required=True, help="开始日期，格式 YYYY-MM-DD")
+    replay.add_argument("--end", required=True, help="结束日期，格式 YYYY-MM-DD")
+    replay.add_argument("--commit-every", type=int, default=20, help="每处理多少个交易日提交一次")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    task = StockScreenerTask()
+    if args.command == "run":
+        task.execute()
+    else:
+        task.backtest_historical_data(args.start, args.end, commit_every=args.commit_every)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,7 @@ from logging import getLogger
 import pandas as pd
 from app.models import TradingHoliday
 from app.db.session import SessionLocal
+from app.utils.trading_calendar import refresh_trading_calendar
 
 logger = getLogger(__name__)
 
@@ -48,6 +49,7 @@ def update_trading_calendar():
             
             db.bulk_save_objects(holiday_records)
             db.commit()
+            refresh_trading_calendar()
             
             logger.info(f"成功更新交易日历，共更新 {len(holiday_records)} 条节假日记录")
             
@@ -1,25 +1,141 @@
-from datetime import datetime
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from app.models.holiday import TradingHoliday
-from app.models.database import get_db
+import logging
+import threading
+import time
+from datetime import date, datetime
+from typing import Iterable, Optional, Union
 
-async def is_trading_day(date: datetime, db: AsyncSession = None) -> bool:
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+DateLike = Union[str, date, datetime, pd.Timestamp, np.datetime64]
+
+# 日历覆盖的默认起点；终点默认到明年年底
+CALENDAR_START = '1990-01-01'
+
+# 数据库不可用时按工作日降级，之后至少间隔这么多秒才重新尝试加载
+DEGRADED_RETRY_SECONDS = 60
+
+
+def _to_day(value: DateLike) -> np.datetime64:
+    if isinstance(value, datetime):  # 包括 pd.Timestamp
+        value = value.date()
+    elif not isinstance(value, date):
+        value = pd.Timestamp(value).date()
+    return np.datetime64(value, 'D')
+
+
+class TradingCalendar:
+    """A股交易日历
+
+    覆盖区间内的每个自然日在布尔数组 _is_open 中对应一个元素（周末和 trading_holidays 中的非交易日为 False），
+    is_trading_day 只需按与起点的天数差取一个元素；全部交易日另存为有序的 datetime64 数组，
+    next/prev/range/offset 在该数组上二分查找。
+    节假日表没有覆盖的年份只排除周末，与按工作日（freq='B'）计算一致。
+    degraded 为 True 表示节假日表加载失败、只排除了周末。
     """
-    判断是否为A股交易日
-    - 排除周末
-    - 排除法定节假日
+
+    def __init__(self, holidays: Iterable[DateLike] = (), start: DateLike = CALENDAR_START, end: Optional[DateLike] = None,
+                 degraded: bool = False):
+        self.degraded = degraded
+        self.start = _to_day(start)
+        self.end = _to_day(end) if end is not None else np.datetime64(f"{datetime.now().year + 1}-12-31", 'D')
+
+        days = np.arange(self.start, self.end + 1, dtype='datetime64[D]')
+        self._is_open = np.is_busday(days)
+        holidays = np.array([_to_day(d) for d in holidays], dtype='datetime64[D]')
+        holidays = holidays[(holidays >= self.start) & (holidays <= self.end)]
+        self._is_open[(holidays - self.start).astype(np.int64)] = False
+
+        self.days = days[self._is_open]  # 有序的全部交易日
+
+    @classmethod
+    def from_database(cls, session_factory=None) -> 'TradingCalendar':
+        """从 trading_holidays 表加载节假日"""
+        # 延迟导入，导入本模块时不创建数据库引擎
+        from app.db.session import SessionLocal
+        from app.models.holiday import TradingHoliday
+
+        db = (session_factory or SessionLocal)()
+        try:
+            holidays = db.query(TradingHoliday.date).all()
+        finally:
+            db.close()
+        return cls(row[0] for row in holidays)
+
+    def _offset_of(self, value: DateLike) -> int:
+        return int((_to_day(value) - self.start).astype(np.int64))
+
+    def is_trading_day(self, value: DateLike) -> bool:
+        """O(1) 判断是否为交易日；超出日历区间的日期按是否为工作日判断"""
+        offset = self._offset_of(value)
+        if 0 <= offset < len(self._is_open):
+            return bool(self._is_open[offset])
+        return bool(np.is_busday(_to_day(value)))
+
+    def next_trading_day(self, value: DateLike, inclusive: bool = False) -> Optional[pd.Timestamp]:
+        """value 之后（inclusive 时包含当天）的第一个交易日，超出日历区间时返回 None"""
+        i = np.searchsorted(self.days, _to_day(value), side='left' if inclusive else 'right')
+        return pd.Timestamp(self.days[i]) if i < len(self.days) else None
+
+    def prev_trading_day(self, value: DateLike, inclusive: bool = False) -> Optional[pd.Timestamp]:
+        """value 之前（inclusive 时包含当天）的最后一个交易日，超出日历区间时返回 None"""
+        i = np.searchsorted(self.days, _to_day(value), side='right' if inclusive else 'left') - 1
+        return pd.Timestamp(self.days[i]) if i >= 0 else None
+
+    def range(self, start: DateLike, end: DateLike) -> pd.DatetimeIndex:
+        """[start, end] 内的全部交易日"""
+        lo = np.searchsorted(self.days, _to_day(start), side='left')
+        hi = np.searchsorted(self.days, _to_day(end), side='right')
+        return pd.DatetimeIndex(self.days[lo:hi].astype('datetime64[ns]'))
+
+    def offset(self, value: DateLike, n: int) -> Optional[pd.Timestamp]:
+        """从 value 起第 n 个交易日（n 为负数时向前）
+
+        value 本身是交易日时 offset(value, 0) 返回当天，否则 n=0 返回下一个交易日；超出日历区间时返回 None。
+        """
+        i = np.searchsorted(self.days, _to_day(value), side='left')
+        # value 不是交易日时 days[i] 已经是它之后的第 1 个交易日
+        i += n - 1 if n > 0 and not self.is_trading_day(value) else n
+        return pd.Timestamp(self.days[i]) if 0 <= i < len(self.days) else None
+
+
+_calendar: Optional[TradingCalendar] = None
+_calendar_guard = threading.Lock()
+
+
+_degraded_at = 0.0
+
+
+def get_trading_calendar() -> TradingCalendar:
+    """进程内共享的交易日历，首次使用时从数据库加载
+
+    数据库不可用时返回只排除周末的降级日历（degraded=True），不当作正常结果缓存：
+    之后的调用间隔 DEGRADED_RETRY_SECONDS 秒重新尝试加载，成功后替换。
     """
-    # 检查是否为周末
-    if date.weekday() >= 5:
-        return False
-        
-    # 检查数据库中的节假日
-    if db is None:
-        db = next(get_db())
-    
-    query = select(TradingHoliday).where(TradingHoliday.date == date.date())
-    result = await db.execute(query)
-    holiday = result.scalar_one_or_none()
-    
-    return holiday is None 
\ No newline at end of file
+    global _calendar, _degraded_at
+    with _calendar_guard:
+        if _calendar is None or (_calendar.degraded and time.monotonic() - _degraded_at >= DEGRADED_RETRY_SECONDS):
+            try:
+                _calendar = TradingCalendar.from_database()
+            except Exception as e:
+                logger.warning(f"从数据库加载交易日历失败，暂时按工作日计算: {e}")
+                _degraded_at = time.monotonic()
+                if _calendar is None:
+                    _calendar = TradingCalendar(degraded=True)
+        return _calendar
+
+
+def refresh_trading_calendar(session_factory=None) -> TradingCalendar:
+    """重新从数据库加载交易日历（节假日表更新后调用）"""
+    global _calendar
+    calendar = TradingCalendar.from_database(session_factory)
+    with _calendar_guard:
+        _calendar = calendar
+    return calendar
+
+
+def is_trading_day(value: DateLike) -> bool:
+    """判断是否为A股交易日（排除周末和法定节假日）"""
+    return get_trading_calendar().is_trading_day(value)
@@ -0,0 +1,61 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# 测试直接导入 backend 下的 app 包，且不连接 MySQL
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DATABASE_URL_OVERRIDE', 'sqlite://')
+os.environ.setdefault('ASYNC_DATABASE_URL_OVERRIDE', 'sqlite+aiosqlite://')
+
+
+def make_daily_bars(seed: int, n_codes: int = 12, n_days: int = 120, suspend_prob: float = 0.0) -> pd.DataFrame:
+    """随机生成多只股票的日线（code/date/close/volume），可随机去掉部分K线模拟停牌"""
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range('2023-01-02', periods=n_days)
+    frames = []
+    for i in range(n_codes):
+        close = 10 * np.exp(np.cumsum(rng.normal(0, 0.03, n_days)))
+        volume = rng.lognormal(10, 0.6, n_days)
+        frame = pd.DataFrame({'code': f'{600000 + i:06d}', 'date': dates, 'close': close, 'volume': volume})
+        if suspend_prob:
+            frame = frame[rng.random(n_days) >= suspend_prob]
+        frames.append(frame)
+    # 与 get_batch_daily_data 相同，按股票依次拼接
+    return pd.concat(frames, ignore_index=True)
+
+
+@pytest.fixture
+def daily_bars():
+    return make_daily_bars
+
+
+def make_session_factory():
+    """内存 sqlite 上建好全部表的会话工厂，返回 (engine, 会话工厂)"""
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from sqlalchemy.pool import StaticPool
+
+    import app.models  # noqa: F401  注册全部模型
+    from app.models.database import Base
+
+    # 所有会话共用同一个连接，否则每个连接看到的是各自独立的内存数据库
+    engine = create_engine('sqlite://', connect_args={'check_same_thread': False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    return engine, sessionmaker(bind=engine)
+
+
+@pytest.fixture
+def session_factory():
+    engine, factory = make_session_factory()
+    yield factory
+    engine.dispose()
+
+
+@pytest.fixture
+def db(session_factory):
+    session = session_factory()
+    yield session
+    session.close()
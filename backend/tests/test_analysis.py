@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.services.analysis import EquityStream, PerformanceAnalyzer
+
+
+def reference_metrics(values: np.ndarray, risk_free_rate: float = 0.03, window: int = 63):
+    """流式实现之前基于 pandas 的指标口径"""
+    series = pd.Series(values)
+    returns = series.pct_change().fillna(0)
+    total_return = (values[-1] - values[0]) / values[0]
+    excess = returns - risk_free_rate / 252
+    recent = returns.iloc[-window:]
+    return {
+        'total_return': total_return,
+        'annual_return': (1 + total_return) ** (252 / len(values)) - 1,
+        'max_drawdown': (series / series.expanding().max() - 1).min(),
+        'sharpe_ratio': np.sqrt(252) * excess.mean() / returns.std(),
+        'rolling_sharpe': np.sqrt(252) * (recent.mean() - risk_free_rate / 252) / recent.std(),
+    }
+
+
+def random_equity(seed: int, n: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    return 1e6 * np.exp(np.cumsum(rng.normal(0.0003, 0.012, n)))
+
+
+@pytest.mark.parametrize('seed', range(3))
+@pytest.mark.parametrize('chunk_size', [1, 7, 64, 1 << 20])
+def test_streaming_metrics_match_pandas(seed, chunk_size):
+    values = random_equity(seed, 500)
+    metrics = PerformanceAnalyzer(1e6).calculate_metrics_arrays(values, chunk_size=chunk_size)
+    expected = reference_metrics(values)
+    for key, value in expected.items():
+        assert metrics[key] == pytest.approx(value, rel=1e-9), key
+
+
+def test_rolling_sharpe_series_matches_pandas():
+    values = random_equity(7, 200)
+    analyzer = PerformanceAnalyzer(1e6, rolling_window=20)
+    returns = pd.Series(values).pct_change().fillna(0)
+    expected = np.sqrt(252) * (returns.rolling(20).mean() - 0.03 / 252) / returns.rolling(20).std()
+    np.testing.assert_allclose(analyzer.rolling_sharpe(values), expected.to_numpy(), rtol=1e-7, equal_nan=True)
+
+
+def test_state_round_trip_continues_stream():
+    values = random_equity(3, 300)
+    whole = EquityStream(30)
+    whole.update(values, values * 0.5)
+
+    first = EquityStream(30)
+    first.update(values[:120], values[:120] * 0.5)
+    resumed = EquityStream.from_state(first.to_state())
+    resumed.update(values[120:], values[120:] * 0.5)
+
+    analyzer = PerformanceAnalyzer(1e6, rolling_window=30)
+    assert analyzer.equity_metrics(resumed) == pytest.approx(analyzer.equity_metrics(whole), rel=1e-12)
+
+
+def test_fifo_trade_matching():
+    trades = pd.DataFrame({
+        'date': ['d1', 'd2', 'd3', 'd4', 'd5'],
+        'code': ['A', 'A', 'B', 'A', 'B'],
+        'type': ['buy', 'buy', 'buy', 'sell', 'sell'],
+        'price': [10.0, 12.0, 5.0, 11.0, 4.0],
+        'shares': [100, 100, 200, 200, 200],
+    })
+    metrics = PerformanceAnalyzer(1e6).calculate_metrics_arrays(np.full(5, 1e6), trades)
+    # A 卖出 200 股冲销两批买入：(11-10)*100 + (11-12)*100 = 0；B 亏损 200
+    assert metrics['total_trades'] == 5
+    assert metrics['win_rate'] == 0
+    assert metrics['avg_profit'] == pytest.approx(-100)
+
+
+def test_cash_by_day_deducts_commission():
+    analyzer = PerformanceAnalyzer(initial_capital=10_000)
+    dates = np.array(['20230102', '20230103', '20230104'])
+    transactions = [
+        {'code': 'A', 'type': 'buy', 'price': 10.0, 'shares': 400, 'date': '20230102', 'commission': 5.0},
+        {'code': 'A', 'type': 'sell', 'price': 12.0, 'shares': 400, 'date': '20230104', 'commission': 5.0},
+    ]
+    np.testing.assert_allclose(analyzer._cash_by_day(dates, transactions), [5_995, 5_995, 10_790])
+    # 没有 commission 字段的成交按不收手续费计算
+    for t in transactions:
+        del t['commission']
+    np.testing.assert_allclose(analyzer._cash_by_day(dates, pd.DataFrame(transactions)), [6_000, 6_000, 10_800])
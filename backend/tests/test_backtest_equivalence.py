@@ -0,0 +1,88 @@
+import asyncio
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.services.backtest import BacktestService
+from app.services.vectorized_backtest import SignalMatrix, simulate
+from app.strategies.bollinger_bands import BollingerBandsStrategy
+
+
+def run(bars: pd.DataFrame, trading_days: pd.DatetimeIndex, **modes):
+    strategy = BollingerBandsStrategy(window=10, std_dev=1.5, volume_factor=1.0)
+    service = BacktestService(initial_capital=1_000_000)
+    metrics = asyncio.run(service.run_on_data(
+        strategy, bars, trading_days[0].strftime('%Y%m%d'), trading_days[-1].strftime('%Y%m%d'),
+        trading_days=trading_days, **modes
+    ))
+    return service, metrics
+
+
+def assert_same_result(a, b):
+    service_a, metrics_a = a
+    service_b, metrics_b = b
+    trades_a, trades_b = service_a.ledger.trades_frame(), service_b.ledger.trades_frame()
+    assert len(trades_a) > 0
+    pd.testing.assert_frame_equal(trades_a, trades_b)
+    assert service_a.ledger.dates == service_b.ledger.dates
+    np.testing.assert_allclose(service_a.ledger.values, service_b.ledger.values)
+    np.testing.assert_allclose(service_a.ledger.invested, service_b.ledger.invested)
+    assert service_a.positions == service_b.positions
+    assert service_a.current_capital == pytest.approx(service_b.current_capital)
+    assert metrics_a == pytest.approx(metrics_b, nan_ok=True)
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_vectorized_matches_precomputed(daily_bars, seed):
+    bars = daily_bars(seed, n_codes=20, n_days=150, suspend_prob=0.08)
+    trading_days = pd.bdate_range('2023-03-01', '2023-07-20')
+    assert_same_result(
+        run(bars, trading_days, precompute=True, vectorized=True),
+        run(bars, trading_days, precompute=True, vectorized=False)
+    )
+
+
+@pytest.mark.parametrize('seed', range(2))
+def test_precomputed_matches_daily(daily_bars, seed):
+    # 逐日回测只截取最近 30 天数据，没有停牌时足够覆盖 window + 1 根K线，结果应与预计算一致
+    bars = daily_bars(seed, n_codes=10, n_days=120)
+    trading_days = pd.bdate_range('2023-03-01', '2023-06-15')
+    assert_same_result(
+        run(bars, trading_days, precompute=True, vectorized=False),
+        run(bars, trading_days, precompute=False)
+    )
+
+
+def test_simulate_rules():
+    """simulate 的撮合规则：持仓中不重复买入、资金不足放弃、卖出全部持仓、同一天按股票列顺序成交"""
+    days = pd.bdate_range('2023-01-02', periods=5)
+    panel = pd.DataFrame({
+        'code': ['A', 'B', 'A', 'B', 'A', 'B', 'A', 'B', 'A', 'B'],
+        'date': np.repeat(days, 2),
+        'close': [10.0, 20.0, 11.0, 21.0, 12.0, 22.0, 13.0, 23.0, 14.0, 24.0],
+        'signal': ['buy', 'buy', 'buy', 'hold', 'sell', 'buy', 'hold', 'sell', 'buy', None],
+    })
+    # 每次买入 400 股，每笔成交手续费为最低的 5 元：第一天 A 用掉 4005，B 需要 8005 超过剩余的 5995 而放弃；
+    # 第三天先卖出 A（列顺序在前）回笼 4795，再买入 B
+    ledger = simulate(SignalMatrix(panel, days), 10_000, lambda capital, price: 400, commission_rate=0.0003, min_commission=5)
+    trades = ledger.trades_frame()
+    assert trades[['date', 'code', 'type', 'price', 'shares', 'commission']].values.tolist() == [
+        ['20230102', 'A', 'buy', 10.0, 400.0, 5.0],
+        ['20230104', 'A', 'sell', 12.0, 400.0, 5.0],
+        ['20230104', 'B', 'buy', 22.0, 400.0, 5.0],
+        ['20230105', 'B', 'sell', 23.0, 400.0, 5.0],
+        ['20230106', 'A', 'buy', 14.0, 400.0, 5.0],
+    ]
+    assert ledger.cash == pytest.approx(5575)
+    np.testing.assert_allclose(ledger.values, [9995, 10395, 10785, 11180, 11175])
+    assert ledger.positions() == {'A': 400.0}
+
+
+def test_simulate_skips_buy_without_cash_for_commission():
+    """资金只够成交金额、不够手续费时放弃买入"""
+    days = pd.bdate_range('2023-01-02', periods=1)
+    panel = pd.DataFrame({'code': ['A'], 'date': days, 'close': [10.0], 'signal': ['buy']})
+    ledger = simulate(SignalMatrix(panel, days), 1_000, lambda capital, price: 100, commission_rate=0.0003, min_commission=5)
+    assert len(ledger.trades) == 0
+    assert ledger.cash == 1_000
@@ -0,0 +1,17 @@
+from app.services.backtest_jobs import make_job_id, normalize_params
+from app.strategies.fundamental_strategy import ModelComplexity
+
+
+def job_id(params):
+    return make_job_id('fundamental', normalize_params('fundamental', params), '20240101', '20240601', 1_000_000)
+
+
+def test_enum_params_hash_like_their_values():
+    assert normalize_params('fundamental', {})['complexity'] == 'medium'
+    assert job_id({}) == job_id({'complexity': 'medium'}) == job_id({'complexity': ModelComplexity.MEDIUM})
+    assert job_id({'complexity': 'simple'}) != job_id({})
+
+
+def test_default_params_hash_like_omitted():
+    assert make_job_id('bollinger', normalize_params('bollinger', {}), '20240101', '20240601', 1_000_000) == \
+        make_job_id('bollinger', normalize_params('bollinger', {'window': 20}), '20240101', '20240601', 1_000_000)
@@ -0,0 +1,53 @@
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.strategies.bollinger_bands import BollingerBandsStrategy
+
+
+def loop_signals(strategy: BollingerBandsStrategy, stock_data: pd.DataFrame) -> Dict[str, str]:
+    """向量化之前逐只股票计算信号的实现，作为对照"""
+    signals = {}
+    for stock_code in stock_data['code'].unique():
+        df = stock_data[stock_data['code'] == stock_code].copy()
+        if len(df) < strategy.window:
+            continue
+        df = strategy.calculate_bollinger_bands(df)
+        latest = df.iloc[-1]
+        prev = df.iloc[-2]
+        if (
+            latest['close'] <= latest['lower_band'] and
+            prev['close'] > prev['lower_band'] and
+            strategy.check_volume_surge(df)
+        ):
+            signals[stock_code] = 'buy'
+        elif latest['close'] >= latest['upper_band'] or latest['close'] < latest['middle_band']:
+            signals[stock_code] = 'sell'
+        else:
+            signals[stock_code] = 'hold'
+    return signals
+
+
+@pytest.mark.parametrize('seed', range(6))
+@pytest.mark.parametrize('window,std_dev,volume_factor', [(20, 2.0, 2.0), (10, 1.5, 1.2), (5, 1.0, 0.8)])
+def test_generate_signals_matches_per_stock_loop(daily_bars, seed, window, std_dev, volume_factor):
+    strategy = BollingerBandsStrategy(window=window, std_dev=std_dev, volume_factor=volume_factor)
+    bars = daily_bars(seed, suspend_prob=0.1)
+    dates = np.sort(bars['date'].unique())
+    for end in dates[window - 2::7]:
+        history = bars[bars['date'] <= end]
+        assert strategy.generate_signals(history) == loop_signals(strategy, history)
+
+
+def test_signal_panel_rows_match_loop_on_each_prefix(daily_bars):
+    strategy = BollingerBandsStrategy(window=10, volume_factor=1.2)
+    bars = daily_bars(42, n_codes=4, n_days=60, suspend_prob=0.15)
+    panel = strategy.calculate_signal_panel(bars)
+    for end in np.sort(bars['date'].unique()):
+        expected = loop_signals(strategy, bars[bars['date'] <= end])
+        today = panel[(panel['date'] == end) & panel['signal'].notna()]
+        assert dict(zip(today['code'], today['signal'])) == {
+            code: signal for code, signal in expected.items() if code in set(today['code'])
+        }
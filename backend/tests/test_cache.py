@@ -0,0 +1,53 @@
+import threading
+
+import pytest
+
+from app.core.cache import TTLSnapshotCache
+
+
+def _run_with_timeout(func, timeout=5):
+    result = {}
+
+    def target():
+        try:
+            result['value'] = func()
+        except Exception as e:
+            result['error'] = e
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), "调用未在超时时间内返回（死锁）"
+    return result
+
+
+def test_instant_loader_does_not_deadlock():
+    cache = TTLSnapshotCache(lambda: 42, ttl=0)
+    for _ in range(20):
+        assert _run_with_timeout(cache.get_sync) == {'value': 42}
+    assert cache.version >= 1
+
+
+def test_failing_loader_is_not_cached():
+    calls = []
+
+    def loader():
+        calls.append(1)
+        if len(calls) == 1:
+            raise ValueError("boom")
+        return 'ok'
+
+    cache = TTLSnapshotCache(loader, ttl=60)
+    result = _run_with_timeout(cache.get_sync)
+    assert isinstance(result['error'], ValueError)
+    assert _run_with_timeout(cache.get_sync) == {'value': 'ok'}
+    # 快照新鲜时不再调用 loader
+    assert _run_with_timeout(cache.get_sync) == {'value': 'ok'}
+    assert len(calls) == 2
+
+
+@pytest.mark.parametrize('ttl', [0, 60])
+def test_concurrent_callers_share_result(ttl):
+    cache = TTLSnapshotCache(lambda: object(), ttl=ttl)
+    results = [_run_with_timeout(cache.get_sync) for _ in range(5)]
+    assert all('value' in r for r in results)
@@ -0,0 +1,95 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.models.strategy import Performance, Transaction
+from app.services.performance_store import PerformanceStore, record_live_day
+
+
+def make_rows(n_days: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    values = 100_000 * np.exp(np.cumsum(rng.normal(0, 0.01, n_days)))
+    dates = pd.bdate_range('2024-01-02', periods=n_days).to_pydatetime()
+    return [
+        {'date': date, 'total_value': value, 'cash_balance': value * 0.4, 'position_count': 3}
+        for date, value in zip(dates, values)
+    ]
+
+
+def performance_rows(db, strategy_id: int):
+    return db.execute(
+        select(Performance.date, Performance.daily_return, Performance.cumulative_return,
+               Performance.drawdown, Performance.metrics)
+        .where(Performance.strategy_id == strategy_id)
+        .order_by(Performance.date)
+    ).all()
+
+
+@pytest.mark.parametrize('chunk', [1, 7, 40])
+def test_incremental_refresh_matches_full_recompute(db, chunk):
+    rows = make_rows(90)
+    store = PerformanceStore(db)
+    full_id = store.get_or_create_strategy('full', 'backtest')
+    incremental_id = store.get_or_create_strategy('incremental', 'backtest')
+
+    store.write_daily(full_id, rows)
+    store.refresh(full_id, rolling_window=20)
+    for start in range(0, len(rows), chunk):
+        store.write_daily(incremental_id, rows[start:start + chunk])
+        # 第一次没有检查点时按 rolling_window 建立，之后从检查点恢复
+        store.refresh(incremental_id, rolling_window=20)
+    db.commit()
+
+    full, incremental = performance_rows(db, full_id), performance_rows(db, incremental_id)
+    assert [row.date for row in full] == [row.date for row in incremental]
+    for column in ('daily_return', 'cumulative_return', 'drawdown'):
+        np.testing.assert_allclose(
+            [getattr(row, column) for row in incremental], [getattr(row, column) for row in full], rtol=1e-9
+        )
+
+    full_metrics = {k: v for k, v in full[-1].metrics.items() if k != 'state'}
+    incremental_metrics = {k: v for k, v in incremental[-1].metrics.items() if k != 'state'}
+    assert incremental_metrics == pytest.approx(full_metrics, nan_ok=True)
+
+
+def test_refresh_without_new_rows_is_noop(db):
+    store = PerformanceStore(db)
+    strategy_id = store.get_or_create_strategy('s', 'backtest')
+    store.write_daily(strategy_id, make_rows(10))
+    assert store.refresh(strategy_id) == 10
+    assert store.refresh(strategy_id) == 0
+
+
+@pytest.fixture
+def fees(monkeypatch):
+    monkeypatch.setattr(settings, 'COMMISSION_RATE', 0.0003)
+    monkeypatch.setattr(settings, 'MIN_COMMISSION', 5.0)
+
+
+def test_record_live_day_cash_and_commission(db, fees):
+    day1, day2, day3 = datetime(2024, 1, 2), datetime(2024, 1, 3), datetime(2024, 1, 4)
+    buys = [{'code': 'A', 'type': 'buy', 'price': 10.0}, {'code': 'B', 'type': 'buy', 'price': 20.0}]
+
+    # A 买入 1000 股：10000 + 手续费 5；B 需要 10000 + 5，超过剩余的 4995 而放弃
+    row = record_live_day(db, 'live', day1, buys, {'A': 10.0, 'B': 20.0}, 15_000, 10_000)
+    assert row['cash_balance'] == pytest.approx(4_995)
+    assert row['total_value'] == pytest.approx(14_995)
+    assert row['position_count'] == 1
+
+    # 同一天重复运行结果不变
+    row = record_live_day(db, 'live', day1, buys, {'A': 10.0, 'B': 20.0}, 15_000, 10_000)
+    assert row['cash_balance'] == pytest.approx(4_995)
+    assert db.execute(select(Transaction.stock_code)).scalars().all() == ['A']
+
+    # 行情缺少 A 时按最近一次成交价估值
+    row = record_live_day(db, 'live', day2, [], {}, 15_000, 10_000)
+    assert row['total_value'] == pytest.approx(14_995)
+
+    # 卖出 1000 股 × 30 = 30000，手续费按费率 9
+    row = record_live_day(db, 'live', day3, [{'code': 'A', 'type': 'sell', 'price': 30.0}], {}, 15_000, 10_000)
+    assert row['cash_balance'] == pytest.approx(4_995 + 30_000 - 9)
+    assert row['position_count'] == 0
@@ -0,0 +1,111 @@
+import pandas as pd
+import pytest
+from sqlalchemy import select
+
+from app.models.stock import BollReplayCheckpoint, BollSignal
+from app.services.financial_cache import financial_indicator_cache
+from app.services.signal_store import BollSignalWriter
+from app.tasks import signal_replay
+from app.tasks.boll_screener import BollScreener, StockScorer
+from app.tasks.signal_replay import BollSignalReplay
+from app.utils.trading_calendar import TradingCalendar
+from conftest import make_session_factory
+
+START, END = '2023-02-15', '2023-06-15'
+
+
+class FakeDataService:
+    def __init__(self, bars: pd.DataFrame):
+        self.bars = bars
+
+    async def get_batch_daily_data(self, codes, start_date, end_date):
+        bars = self.bars
+        in_range = (bars['date'] >= pd.Timestamp(start_date)) & (bars['date'] <= pd.Timestamp(end_date))
+        return bars[in_range & bars['code'].isin(codes)].reset_index(drop=True)
+
+
+class FakeScorer(StockScorer):
+    """财务指标随信号日期所在季度变化，每只股票固定"""
+
+    def get_financial_data(self, stock_code, date=None):
+        seed, quarter = int(stock_code) % 97, pd.Timestamp(date).quarter
+        return {
+            'ROE': seed % 13 + quarter, 'profit_growth': seed % 11, 'gross_margin': 20.0,
+            'debt_ratio': seed % 5 * 10.0, 'cash_ratio': 1.0, 'revenue_growth': float(quarter),
+        }
+
+
+@pytest.fixture
+def make_replay(daily_bars, monkeypatch):
+    bars = daily_bars(3, n_codes=30, n_days=120, suspend_prob=0.05)
+    monkeypatch.setattr(financial_indicator_cache, 'prefetch', lambda *args, **kwargs: None)
+    monkeypatch.setattr(signal_replay, 'get_trading_calendar', lambda: TradingCalendar())
+
+    def make_replay():
+        screener = BollScreener(top_n=3)
+        screener.stock_data_service = FakeDataService(bars)
+        screener.scorer = FakeScorer()
+        screener.get_stock_list = lambda: [{'code': code, 'name': f'n{code}'} for code in bars['code'].unique()]
+        return BollSignalReplay(START, END, screener=screener, commit_every=5)
+
+    return make_replay
+
+
+def signal_rows(session_factory):
+    db = session_factory()
+    try:
+        return sorted(db.execute(select(
+            BollSignal.stock_code, BollSignal.buy_date, BollSignal.buy_price, BollSignal.sell_date,
+            BollSignal.sell_price, BollSignal.trade_status, BollSignal.score,
+        )).all())
+    finally:
+        db.close()
+
+
+def test_resume_after_interruption_matches_uninterrupted_run(make_replay, session_factory, monkeypatch):
+    # 不中断的回放（独立的内存数据库）
+    engine, reference_factory = make_session_factory()
+    reference = make_replay().run(reference_factory)
+    expected = signal_rows(reference_factory)
+    assert reference['bought'] > 0 and reference['sold'] > 0
+
+    # 第 23 个交易日写入时中断：前 20 个交易日已分 4 批提交，之后的 2 天尚未提交
+    write_day = BollSignalWriter.write_day
+    calls = []
+
+    def interrupted(self, buys, sells, signal_date):
+        calls.append(signal_date)
+        if len(calls) == 23:
+            raise RuntimeError('interrupted')
+        return write_day(self, buys, sells, signal_date)
+
+    monkeypatch.setattr(BollSignalWriter, 'write_day', interrupted)
+    with pytest.raises(RuntimeError):
+        make_replay().run(session_factory)
+    monkeypatch.setattr(BollSignalWriter, 'write_day', write_day)
+
+    # 断点与信号在同一事务中提交：已提交的行正好是不中断结果截至断点当天的部分
+    db = session_factory()
+    checkpoint = db.get(BollReplayCheckpoint, make_replay().checkpoint_key)
+    db.close()
+    assert checkpoint.last_date == calls[19] and not checkpoint.completed
+    cutoff = checkpoint.last_date
+    committed = [
+        (code, buy_date, buy_price, sell_date, sell_price, status, score)
+        if sell_date is not None and sell_date <= cutoff else (code, buy_date, buy_price, None, None, '持仓中', score)
+        for code, buy_date, buy_price, sell_date, sell_price, status, score in expected
+        if buy_date <= cutoff
+    ]
+    assert [tuple(row) for row in signal_rows(session_factory)] == sorted(committed)
+
+    # 从断点之后继续：没有重复或遗漏的交易日，结果与不中断的回放一致
+    resumed = make_replay().run(session_factory)
+    assert resumed['resumed_from'] == cutoff.strftime('%Y-%m-%d')
+    assert resumed['days'] == reference['days'] - 20
+    rows = signal_rows(session_factory)
+    assert rows == expected
+    assert len({(row.stock_code, row.buy_date) for row in rows}) == len(rows)
+
+    # 已完成的回放再次运行直接跳过
+    assert make_replay().run(session_factory)['days'] == 0
+    engine.dispose()
@@ -0,0 +1,96 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import func, select
+
+from app.models.stock import BollSignal
+from app.services.signal_store import HOLDING, SOLD, BollSignalWriter
+
+
+def buy(code: str, price: float, score: float = 1.0):
+    return {'stock_code': code, 'stock_name': f'n{code}', 'close_price': price, 'score': score}
+
+
+def sell(code: str, price: float):
+    return {'stock_code': code, 'stock_name': f'n{code}', 'close_price': price}
+
+
+def day(n: int) -> datetime:
+    return datetime(2024, 1, n, 15, 0, 0, 123456)
+
+
+def rows(db):
+    return db.execute(
+        select(BollSignal.stock_code, BollSignal.buy_date, BollSignal.buy_price, BollSignal.sell_date,
+               BollSignal.sell_price, BollSignal.profit_rate, BollSignal.holding_period, BollSignal.trade_status)
+        .order_by(BollSignal.stock_code, BollSignal.buy_date)
+    ).all()
+
+
+@pytest.mark.parametrize('commit_every', [1, 10])
+def test_buy_sell_pairing_and_rebuy(db, commit_every):
+    # commit_every=1 时卖出走已写入持仓的 executemany UPDATE，=10 时在未写入的买入记录上就地配对
+    writer = BollSignalWriter(db, commit_every=commit_every)
+    writer.write_day([buy('A', 10.0), buy('B', 20.0)], [], day(2))
+    writer.write_day([], [sell('A', 12.0)], day(4))
+    writer.write_day([buy('A', 11.0)], [], day(5))
+    writer.write_day([], [sell('A', 9.9), sell('C', 1.0)], day(8))
+    writer.commit()
+
+    assert [tuple(row) for row in rows(db)] == [
+        ('A', day(2).replace(microsecond=0), 10.0, day(4).replace(microsecond=0), 12.0, pytest.approx(20.0), 2, SOLD),
+        ('A', day(5).replace(microsecond=0), 11.0, day(8).replace(microsecond=0), 9.9, pytest.approx(-10.0), 3, SOLD),
+        ('B', day(2).replace(microsecond=0), 20.0, None, None, None, None, HOLDING),
+    ]
+    assert (writer.bought, writer.sold) == (3, 2)
+    assert [(t['code'], t['type'], t['price'], t['buy_price']) for t in writer.trades] == [
+        ('A', 'buy', 10.0, 10.0), ('B', 'buy', 20.0, 20.0),
+        ('A', 'sell', 12.0, 10.0), ('A', 'buy', 11.0, 11.0), ('A', 'sell', 9.9, 11.0),
+    ]
+
+
+@pytest.mark.parametrize('preload', [False, True])
+def test_sell_closes_positions_written_by_earlier_runs(session_factory, preload):
+    db = session_factory()
+    writer = BollSignalWriter(db)
+    writer.write_day([buy('A', 10.0)], [], day(2))
+    db.close()
+
+    # 新的写入器从数据库补齐持仓（按代码查询或一次性预加载）
+    db = session_factory()
+    writer = BollSignalWriter(db)
+    if preload:
+        writer.preload_open_positions()
+    writer.write_day([], [sell('A', 15.0)], day(3))
+    assert rows(db)[0].trade_status == SOLD
+    assert rows(db)[0].profit_rate == pytest.approx(50.0)
+    db.close()
+
+
+def test_batch_and_checkpoint_commit_in_one_transaction(session_factory):
+    db = session_factory()
+    checkpoints = []
+
+    def on_commit(session, last_date):
+        # 回调时这一批信号已经写入当前事务，尚未提交
+        checkpoints.append((last_date, session.execute(select(func.count()).select_from(BollSignal)).scalar()))
+
+    writer = BollSignalWriter(db, commit_every=2, on_commit=on_commit)
+    writer.write_day([buy('A', 10.0)], [], day(2))
+    # 未满 commit_every 个交易日时只缓冲在内存中
+    assert checkpoints == []
+    assert db.execute(select(func.count()).select_from(BollSignal)).scalar() == 0
+    writer.write_day([buy('B', 10.0)], [], day(3))
+    assert checkpoints == [(day(3).replace(microsecond=0), 2)]
+
+    def failing(session, last_date):
+        raise RuntimeError('checkpoint failed')
+
+    # 断点写入失败时这一批信号随事务一起回滚
+    writer.on_commit = failing
+    writer.write_day([buy('C', 10.0)], [], day(4))
+    with pytest.raises(RuntimeError):
+        writer.write_day([], [sell('A', 12.0)], day(5))
+    db.rollback()
+    assert [(row.stock_code, row.trade_status) for row in rows(db)] == [('A', HOLDING), ('B', HOLDING)]
+    db.close()
@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.services.bar_store import DailyBarStore
+from app.services.stock_data import StockDataService
+
+
+class FakeSource:
+    """按请求区间返回 bars 中的K线，published_until 之后的K线模拟数据源尚未发布"""
+
+    def __init__(self, bars: pd.DataFrame):
+        self.bars = bars
+        self.published_until = bars['date'].max()
+        self.requests = []
+
+    def __call__(self, stock_code, start, end):
+        self.requests.append((start, end))
+        rows = self.bars[(self.bars['date'] >= start) & (self.bars['date'] <= min(end, self.published_until))]
+        return rows.assign(code=stock_code).reset_index(drop=True)
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    dates = pd.bdate_range('2024-03-01', '2024-03-29')
+    close = np.linspace(10, 12, len(dates))
+    bars = pd.DataFrame({
+        'date': dates, 'open': close, 'close': close, 'high': close, 'low': close,
+        'volume': 1000.0, 'amount': close * 1000,
+    })
+    service = StockDataService()
+    service.bar_store = DailyBarStore(str(tmp_path))
+    service.source = FakeSource(bars)
+    monkeypatch.setattr(service, '_fetch_daily_data', service.source)
+    monkeypatch.setattr(service, '_last_complete_day', lambda: pd.Timestamp('2024-03-29'))
+    return service
+
+
+def test_unpublished_trailing_bar_is_fetched_again(service):
+    service.source.published_until = pd.Timestamp('2024-03-28')
+    df = service.load_daily_data('000001', '20240301', '20240329')
+    assert df['date'].max() == pd.Timestamp('2024-03-28')
+    # 最后一个交易日还没有K线，覆盖区间只到返回的最后一根K线
+    assert service.bar_store.coverage('000001')[1] == pd.Timestamp('2024-03-28')
+
+    service.source.published_until = pd.Timestamp('2024-03-29')
+    df = service.load_daily_data('000001', '20240301', '20240329')
+    assert df['date'].max() == pd.Timestamp('2024-03-29')
+    assert service.bar_store.coverage('000001')[1] == pd.Timestamp('2024-03-29')
+
+
+def test_past_gap_without_bars_is_marked_synced(service):
+    # 区间早于最近收盘日，没有K线的日期（这里的周末）按停牌/休市标记为已同步
+    service.load_daily_data('000001', '20240301', '20240317')
+    assert service.bar_store.coverage('000001') == (pd.Timestamp('2024-03-01'), pd.Timestamp('2024-03-17'))
+    requests = len(service.source.requests)
+    service.load_daily_data('000001', '20240304', '20240317')
+    assert len(service.source.requests) == requests
@@ -0,0 +1,110 @@
+import pandas as pd
+import pytest
+
+from app.utils import trading_calendar
+from app.utils.trading_calendar import TradingCalendar
+
+# 2024-10-01 ~ 10-07 国庆休市；调休上班的周末A股同样不开市
+HOLIDAYS = pd.date_range('2024-10-01', '2024-10-07')
+
+
+@pytest.fixture
+def calendar():
+    return TradingCalendar(HOLIDAYS, start='2024-09-02', end='2024-10-31')
+
+
+def test_is_trading_day(calendar):
+    assert calendar.is_trading_day('2024-09-30')
+    assert not calendar.is_trading_day('2024-10-01')
+    assert not calendar.is_trading_day('2024-10-12')
+    assert calendar.is_trading_day(pd.Timestamp('2024-10-08 10:30'))
+    # 超出日历区间时按工作日判断
+    assert calendar.is_trading_day('2024-08-30') and not calendar.is_trading_day('2024-08-31')
+    assert calendar.is_trading_day('2024-11-01') and not calendar.is_trading_day('2024-11-02')
+
+
+def test_next_and_prev_trading_day(calendar):
+    # 非交易日输入
+    assert calendar.next_trading_day('2024-10-01') == pd.Timestamp('2024-10-08')
+    assert calendar.prev_trading_day('2024-10-07') == pd.Timestamp('2024-09-30')
+    # 交易日输入，inclusive 决定是否包含当天
+    assert calendar.next_trading_day('2024-09-30') == pd.Timestamp('2024-10-08')
+    assert calendar.next_trading_day('2024-09-30', inclusive=True) == pd.Timestamp('2024-09-30')
+    assert calendar.prev_trading_day('2024-10-08', inclusive=True) == pd.Timestamp('2024-10-08')
+    # 第一个交易日之前、最后一个交易日之后
+    assert calendar.prev_trading_day('2024-09-02') is None
+    assert calendar.prev_trading_day('2024-08-01') is None
+    assert calendar.next_trading_day('2024-08-01') == pd.Timestamp('2024-09-02')
+    assert calendar.next_trading_day('2024-10-31') is None
+    assert calendar.prev_trading_day('2024-12-01') == pd.Timestamp('2024-10-31')
+
+
+def test_range_and_offset(calendar):
+    assert list(calendar.range('2024-09-28', '2024-10-09')) == [
+        pd.Timestamp('2024-09-30'), pd.Timestamp('2024-10-08'), pd.Timestamp('2024-10-09')
+    ]
+    assert calendar.range('2024-10-01', '2024-10-07').empty
+    assert len(calendar.range('2024-01-01', '2025-01-01')) == len(calendar.days)
+
+    assert calendar.offset('2024-09-30', 0) == pd.Timestamp('2024-09-30')
+    assert calendar.offset('2024-09-30', 1) == pd.Timestamp('2024-10-08')
+    assert calendar.offset('2024-10-08', -1) == pd.Timestamp('2024-09-30')
+    # 非交易日：n=0 为下一个交易日，n=1 同样是下一个交易日，n=-1 为上一个交易日
+    assert calendar.offset('2024-10-03', 0) == pd.Timestamp('2024-10-08')
+    assert calendar.offset('2024-10-03', 1) == pd.Timestamp('2024-10-08')
+    assert calendar.offset('2024-10-03', -1) == pd.Timestamp('2024-09-30')
+    # 超出日历区间
+    assert calendar.offset('2024-09-02', -1) is None
+    assert calendar.offset('2024-10-31', 1) is None
+
+
+@pytest.fixture
+def shared_calendar(monkeypatch):
+    """替换数据库加载和单调时钟，重置进程内共享的日历"""
+    state = {'fail': True, 'loads': 0, 'now': 1000.0}
+
+    def from_database(cls, session_factory=None):
+        state['loads'] += 1
+        if state['fail']:
+            raise RuntimeError('database unavailable')
+        return cls(HOLIDAYS)
+
+    monkeypatch.setattr(TradingCalendar, 'from_database', classmethod(from_database))
+    monkeypatch.setattr(trading_calendar.time, 'monotonic', lambda: state['now'])
+    monkeypatch.setattr(trading_calendar, '_calendar', None)
+    monkeypatch.setattr(trading_calendar, '_degraded_at', 0.0)
+    return state
+
+
+def test_degraded_calendar_retries_after_interval(shared_calendar):
+    state = shared_calendar
+    degraded = trading_calendar.get_trading_calendar()
+    assert degraded.degraded and degraded.is_trading_day('2024-10-01')
+    assert state['loads'] == 1
+
+    # 间隔内不重复请求数据库，仍返回降级日历
+    state['fail'] = False
+    state['now'] += trading_calendar.DEGRADED_RETRY_SECONDS - 1
+    assert trading_calendar.get_trading_calendar() is degraded
+    assert state['loads'] == 1
+
+    # 间隔到期后重新加载，成功后替换并不再重试
+    state['now'] += 1
+    calendar = trading_calendar.get_trading_calendar()
+    assert not calendar.degraded and not calendar.is_trading_day('2024-10-01')
+    assert state['loads'] == 2
+    state['now'] += 10 * trading_calendar.DEGRADED_RETRY_SECONDS
+    assert trading_calendar.get_trading_calendar() is calendar
+    assert state['loads'] == 2
+
+
+def test_failed_retry_keeps_degraded_calendar(shared_calendar):
+    state = shared_calendar
+    degraded = trading_calendar.get_trading_calendar()
+    state['now'] += trading_calendar.DEGRADED_RETRY_SECONDS
+    assert trading_calendar.get_trading_calendar() is degraded
+    assert state['loads'] == 2
+    # 重试失败后重新计时
+    state['now'] += trading_calendar.DEGRADED_RETRY_SECONDS - 1
+    trading_calendar.get_trading_calendar()
+    assert state['loads'] == 2